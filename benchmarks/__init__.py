@@ -0,0 +1,11 @@
+"""
+Benchmarks for the Git MCP server
+
+    python -m benchmarks.generate /tmp/fixture --preset large
+    python -m benchmarks.harness --preset small --output results.json
+    python -m benchmarks.harness --repo /tmp/fixture --baseline results.json
+
+`generate` builds fixture repositories with `git fast-import`; `harness` times
+every tool against one and compares the results with a saved baseline. The
+`bench_*.py` scripts measure individual subsystems.
+"""
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Benchmark: git_commit through git plumbing against GitPython's index
+
+Builds a wide repository with `git fast-import`. Each round modifies
+--changed files and commits them twice: once the way git_commit used to,
+with GitPython's `repo.index.add` and `repo.index.commit`, and once
+through git_commit's update-index / write-tree / commit-tree / update-ref
+path. Wall time and the Python process's peak RSS growth are reported.
+
+    python benchmarks/bench_commit.py --files 200000 --changed 1 1000
+"""
+
+import argparse
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.generate import file_path, make_repo  # noqa: E402
+from git_mcp import GitCommitArgs, create_commit  # noqa: E402
+
+
+def gitpython_commit(path: str, files: list, message: str):
+    from git import Repo
+
+    with Repo(path) as repo:
+        repo.index.add(files)
+        repo.index.commit(message)
+
+
+def plumbing_commit(path: str, files: list, message: str):
+    create_commit(path, GitCommitArgs(path=path, message=message, files=files))
+
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def measure(engine, path: str, total: int, changed: int, runs: int, round_: list) -> tuple:
+    timings = []
+    rss_before = peak_rss_mb()
+    for _ in range(runs):
+        round_[0] += 1
+        files = [file_path((round_[0] * 7919 + i * 104729) % total) for i in range(changed)]
+        for name in files:
+            with open(os.path.join(path, name), "a") as f:
+                f.write(f"bench round {round_[0]}\n")
+        started = time.perf_counter()
+        engine(path, files, f"Benchmark round {round_[0]}")
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings), peak_rss_mb() - rss_before
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files", type=int, default=200000)
+    parser.add_argument("--changed", type=int, nargs="+", default=[1, 100])
+    parser.add_argument("--runs", type=int, default=3)
+    options = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "repo")
+        started = time.perf_counter()
+        make_repo(path, files=options.files)
+        print(f"generated {options.files} files in {time.perf_counter() - started:.1f}s")
+
+        round_ = [0]
+        for changed in options.changed:
+            # Plumbing first, so GitPython's larger peak does not hide its growth.
+            for name, engine in (("plumbing", plumbing_commit), ("GitPython", gitpython_commit)):
+                median, rss = measure(engine, path, options.files, changed, options.runs, round_)
+                print(f"{changed:>6} files  {name:>10}: {median * 1000:9.1f} ms  peak RSS +{rss:7.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Benchmark: git_log response size and encode time per output format
+
+Builds a linear history with `git fast-import`, then asks `_git_log` for one
+large page in every `format`, with and without abbreviated hashes and commit
+bodies. It reports bytes, milliseconds per call, and milliseconds spent in the
+encoder alone. Whether orjson is used for the non-indented formats is printed
+first.
+
+    python benchmarks/bench_formats.py --commits 1000
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import git_mcp  # noqa: E402
+from benchmarks.generate import make_repo  # noqa: E402
+from git_mcp import OUTPUT_FORMATS, GitLogArgs, _git_log, encode_result  # noqa: E402
+
+
+def median_time(fn, runs: int) -> float:
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def measure(path: str, runs: int, **options) -> tuple:
+    args = GitLogArgs(path=path, **options)
+    size = len(_git_log(args)[0].encode())
+    records = json.loads(_git_log(args.model_copy(update={"format": "json"}))[0])
+    return (
+        size,
+        median_time(lambda: _git_log(args), runs),
+        median_time(lambda: encode_result(records, args.format), runs),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--commits", type=int, default=1000)
+    parser.add_argument("--runs", type=int, default=10)
+    options = parser.parse_args()
+
+    print(f"orjson: {'yes' if git_mcp.orjson is not None else 'no'}")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "repo")
+        make_repo(path, commits=options.commits, checkout=False)
+        baseline = None
+        for extra, label in (({}, ""), ({"abbrev": 7, "body": False}, " abbrev=7 body=false")):
+            for fmt in OUTPUT_FORMATS:
+                size, elapsed, encode = measure(path, options.runs, limit=options.commits, format=fmt, **extra)
+                baseline = baseline or size
+                print(
+                    f"{fmt + label:<34} {size:>10,d} bytes ({size / baseline:6.1%})"
+                    f"   call {elapsed * 1000:7.2f} ms   encode {encode * 1000:6.2f} ms"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Benchmark: commit metadata throughput of the cat-file reader vs GitPython
+
+Builds a linear history with `git fast-import` and walks it with both the
+old `repo.iter_commits` path and `git_mcp.iter_commits`, reporting commits/sec.
+
+    python benchmarks/bench_object_reader.py --commits 100000
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from git import Repo  # noqa: E402
+
+from benchmarks.generate import make_repo  # noqa: E402
+from git_mcp import RepoCache, iter_commits  # noqa: E402
+
+
+def gitpython_walk(path: str) -> int:
+    repo = Repo(path)
+    count = 0
+    for commit in repo.iter_commits():
+        commit.hexsha, str(commit.author), commit.committed_datetime.isoformat(), commit.message.strip()
+        count += 1
+    repo.close()
+    return count
+
+
+def reader_walk(path: str) -> int:
+    cache = RepoCache()
+    count = 0
+    with cache.object_reader(path) as reader:
+        for commit in iter_commits(reader, ["HEAD"]):
+            commit.hexsha, commit.author_name, commit.committed_datetime.isoformat(), commit.message.strip()
+            count += 1
+    cache.clear()
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--commits", type=int, default=100000)
+    parser.add_argument("--repo", help="Existing repository to walk instead of generating one")
+    options = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = options.repo
+        if path is None:
+            path = os.path.join(tmp, "repo")
+            started = time.perf_counter()
+            make_repo(path, commits=options.commits, checkout=False)
+            print(f"generated {options.commits} commits in {time.perf_counter() - started:.1f}s")
+
+        for name, walk in (("gitpython", gitpython_walk), ("cat-file reader", reader_walk)):
+            started = time.perf_counter()
+            count = walk(path)
+            elapsed = time.perf_counter() - started
+            print(f"{name:>16}: {count} commits in {elapsed:.2f}s ({count / elapsed:,.0f} commits/sec)")
+
+
+if __name__ == "__main__":
+    main()
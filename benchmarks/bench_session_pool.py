@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Benchmark: end-to-end tool call latency with and without the session pool
+
+"before" is what the examples used to do for every call: spawn a stdio
+server, initialize a session, call one tool and tear everything down.
+"after" sends the same calls through examples/session_pool.py, which keeps
+warm sessions and hands them to concurrent callers.
+
+    python benchmarks/bench_session_pool.py --calls 200 --concurrency 4
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "examples"))
+
+from mcp import ClientSession, StdioServerParameters  # noqa: E402
+from mcp.client.stdio import stdio_client  # noqa: E402
+from session_pool import SERVER_PATH, MCPSessionPool  # noqa: E402
+
+
+def percentile(timings: list, fraction: float) -> float:
+    timings = sorted(timings)
+    return timings[min(len(timings) - 1, int(len(timings) * fraction))]
+
+
+def report(name: str, timings: list, elapsed: float):
+    print(
+        f"{name:<8} {len(timings):5d} calls  {len(timings) / elapsed:8.1f} calls/s"
+        f"   p50 {statistics.median(timings) * 1000:8.1f} ms"
+        f"   p99 {percentile(timings, 0.99) * 1000:8.1f} ms"
+    )
+
+
+async def fan_out(call, calls: int, concurrency: int) -> tuple:
+    gate = asyncio.Semaphore(concurrency)
+    timings = []
+
+    async def timed():
+        async with gate:
+            started = time.perf_counter()
+            await call()
+            timings.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(timed() for _ in range(calls)))
+    return timings, time.perf_counter() - started
+
+
+async def run(options):
+    arguments = {"path": options.repo}
+    params = StdioServerParameters(command=sys.executable, args=[SERVER_PATH])
+
+    async def spawn_call():
+        async with stdio_client(params) as (read, write):
+            async with ClientSession(read, write) as session:
+                await session.initialize()
+                await session.call_tool(options.tool, arguments)
+
+    report("before", *await fan_out(spawn_call, options.spawn_calls, options.concurrency))
+
+    async with MCPSessionPool(size=options.concurrency) as pool:
+        report("after", *await fan_out(
+            lambda: pool.call_tool(options.tool, arguments), options.calls, options.concurrency
+        ))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repo", default=ROOT)
+    parser.add_argument("--tool", default="git_status")
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--spawn-calls", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=4)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Benchmark: cold start of a stdio server, up to its first tool response
+
+Spawns `git_mcp.py` the way a per-session client does and speaks
+newline-delimited JSON-RPC to it directly, so no client library is timed. For
+each run it records the time from spawn to the initialize response, to the
+tools/list response and to the first tools/call response. The import cost of
+git_mcp alone is measured separately, along with how much of it is the mcp
+package itself.
+
+    python benchmarks/bench_startup.py --runs 20 --tool git_log
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVER = os.path.join(ROOT, "git_mcp.py")
+
+
+def request(proc, message_id: int, method: str, params: dict):
+    proc.stdin.write(json.dumps({"jsonrpc": "2.0", "id": message_id, "method": method, "params": params}) + "\n")
+    proc.stdin.flush()
+    while True:
+        message = json.loads(proc.stdout.readline())
+        if message.get("id") == message_id:
+            if "error" in message:
+                raise RuntimeError(message["error"])
+            return message["result"]
+
+
+def cold_start(tool: str, arguments: dict) -> dict:
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, SERVER], stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, cwd=ROOT
+    )
+    try:
+        request(proc, 1, "initialize", {
+            "protocolVersion": "2025-06-18",
+            "capabilities": {},
+            "clientInfo": {"name": "bench-startup", "version": "0"},
+        })
+        initialized = time.perf_counter()
+        proc.stdin.write(json.dumps({"jsonrpc": "2.0", "method": "notifications/initialized"}) + "\n")
+        request(proc, 2, "tools/list", {})
+        listed = time.perf_counter()
+        result = request(proc, 3, "tools/call", {"name": tool, "arguments": arguments})
+        called = time.perf_counter()
+        if result.get("isError") or result["content"][0]["text"].startswith("Error:"):
+            raise RuntimeError(result["content"][0]["text"])
+    finally:
+        proc.stdin.close()
+        proc.wait()
+    return {
+        "initialize": initialized - started,
+        "tools/list": listed - started,
+        "first call": called - started,
+    }
+
+
+def import_time() -> tuple:
+    """Seconds to import git_mcp, and the part of that spent importing mcp."""
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import git_mcp"],
+        capture_output=True, text=True, cwd=ROOT, check=True,
+    ).stderr
+    total = mcp = 0
+    for line in out.splitlines():
+        fields = line.split("|")
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            continue
+        if fields[2].strip() == "git_mcp":
+            total = int(fields[1])
+        elif fields[2].strip() == "mcp":
+            mcp = max(mcp, int(fields[1]))
+    return total / 1e6, mcp / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repo", default=ROOT)
+    parser.add_argument("--tool", default="git_log")
+    parser.add_argument("--runs", type=int, default=10)
+    options = parser.parse_args()
+
+    arguments = {"path": options.repo, "limit": 1} if options.tool == "git_log" else {"path": options.repo}
+    imports = [import_time() for _ in range(options.runs)]
+    total, mcp = statistics.median(t for t, _ in imports), statistics.median(m for _, m in imports)
+    print(f"import git_mcp        {total * 1000:8.1f} ms   (mcp package {mcp * 1000:.1f} ms)")
+
+    runs = [cold_start(options.tool, arguments) for _ in range(options.runs)]
+    for phase in runs[0]:
+        timings = sorted(run[phase] for run in runs)
+        print(f"spawn -> {phase:<12} {statistics.median(timings) * 1000:8.1f} ms   max {timings[-1] * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Benchmark: structured git_status with and without status accelerations
+
+Builds a wide worktree with `git fast-import` and times the porcelain-v2
+status engine plain, with core.untrackedCache, and with the builtin
+fsmonitor where the platform supports it.
+
+    python benchmarks/bench_status.py --files 200000
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.generate import make_repo  # noqa: E402
+from git_mcp import GitStatusArgs, _git_status, fsmonitor_supported  # noqa: E402
+
+
+def time_status(path: str, runs: int, **settings) -> float:
+    _git_status(GitStatusArgs(path=path, structured=True, **settings))
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        _git_status(GitStatusArgs(path=path, structured=True))
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files", type=int, default=200000)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--repo", help="Existing repository to measure instead of generating one")
+    options = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = options.repo
+        if path is None:
+            path = os.path.join(tmp, "repo")
+            started = time.perf_counter()
+            make_repo(path, files=options.files, untracked=20)
+            print(f"generated {options.files} files in {time.perf_counter() - started:.1f}s")
+
+        configs = [
+            ("plain", {"untracked_cache": False, "fsmonitor": False}),
+            ("untracked cache", {"untracked_cache": True, "fsmonitor": False}),
+        ]
+        if fsmonitor_supported():
+            configs.append(("untracked cache + fsmonitor", {"untracked_cache": True, "fsmonitor": True}))
+        else:
+            print("builtin fsmonitor is not supported on this platform; skipping")
+
+        for name, settings in configs:
+            median = time_status(path, options.runs, **settings)
+            print(f"{name:>28}: {median * 1000:8.1f} ms (median of {options.runs})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Benchmark: per-call stdio server processes vs one long-lived HTTP server
+
+Times the same tool call made the way the examples used to make it (spawn
+the server over stdio, initialize, call, tear down) against persistent
+streamable HTTP sessions to a single server on loopback.
+
+    python benchmarks/bench_transport.py --calls 200 --concurrency 8
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.stdio import stdio_client
+from mcp.client.streamable_http import streamable_http_client
+
+SERVER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "git_mcp.py")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def spawn_per_call(tool: str, arguments: dict, calls: int, concurrency: int) -> list:
+    params = StdioServerParameters(command=sys.executable, args=[SERVER])
+    gate = asyncio.Semaphore(concurrency)
+    timings = []
+
+    async def call():
+        async with gate:
+            started = time.perf_counter()
+            async with stdio_client(params) as (read, write):
+                async with ClientSession(read, write) as session:
+                    await session.initialize()
+                    await session.call_tool(tool, arguments)
+            timings.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(call() for _ in range(calls)))
+    return timings
+
+
+async def persistent_http(url: str, tool: str, arguments: dict, calls: int, concurrency: int) -> list:
+    timings = []
+
+    async def client(count: int):
+        async with streamable_http_client(url) as (read, write, _):
+            async with ClientSession(read, write) as session:
+                await session.initialize()
+                for _ in range(count):
+                    started = time.perf_counter()
+                    await session.call_tool(tool, arguments)
+                    timings.append(time.perf_counter() - started)
+
+    shares = [calls // concurrency + (i < calls % concurrency) for i in range(concurrency)]
+    await asyncio.gather(*(client(count) for count in shares if count))
+    return timings
+
+
+def report(name: str, timings: list, elapsed: float):
+    timings = sorted(timings)
+    p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+    print(
+        f"{name:<24} {len(timings) / elapsed:8.1f} calls/s"
+        f"   p50 {statistics.median(timings) * 1000:7.1f} ms   p99 {p99 * 1000:7.1f} ms"
+    )
+
+
+async def run(options):
+    arguments = {"path": options.repo}
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, SERVER, "--transport", "http", "--port", str(port)]
+    )
+    try:
+        url = f"http://127.0.0.1:{port}/mcp"
+        for _ in range(100):
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+                break
+            except OSError:
+                await asyncio.sleep(0.1)
+
+        started = time.perf_counter()
+        timings = await spawn_per_call(options.tool, arguments, options.spawn_calls, options.concurrency)
+        report("stdio, spawn per call", timings, time.perf_counter() - started)
+
+        started = time.perf_counter()
+        timings = await persistent_http(url, options.tool, arguments, options.calls, options.concurrency)
+        report("http, persistent", timings, time.perf_counter() - started)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repo", default=os.path.dirname(SERVER))
+    parser.add_argument("--tool", default="git_status")
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--spawn-calls", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=8)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Time every Git MCP tool against a fixture repository
+
+Each scenario runs in a freshly spawned interpreter. The first ("cold") call
+therefore starts without repo handles, cat-file readers or watchers, as it
+would in a newly started server, and peak RSS is measured per scenario. The
+next --runs calls are "warm" and summarized as p50/p95/p99.
+git_search_commits builds its index inside the fixture's .git directory, so
+its cold time includes indexing only the first time a fixture is used. Results are written as JSON; pass --baseline to compare a run
+against an earlier results file and exit non-zero on regressions.
+
+    python -m benchmarks.harness --preset small --output baseline.json
+    python -m benchmarks.harness --preset small --baseline baseline.json
+    python -m benchmarks.harness --repo /tmp/fixture --only git_log git_diff
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.generate import PRESETS, make_repo  # noqa: E402
+
+
+def _commit_args(repo: str, i: int) -> dict:
+    with open(os.path.join(repo, "bench-commit.txt"), "w") as f:
+        f.write(f"change {i}\n")
+    return {"path": repo, "message": f"Benchmark commit {i}", "files": ["bench-commit.txt"]}
+
+
+def _checkout_args(repo: str, i: int) -> dict:
+    return {"path": repo, "branch": "branch-0" if i % 2 == 0 else "main"}
+
+
+# name -> (tool, arguments or a function (repo, iteration) -> arguments, options)
+# "write" scenarios get a private clone; "env" is applied before git_mcp is imported.
+SCENARIOS = {
+    "git_status": ("git_status", {}, {}),
+    "git_status_structured": ("git_status", {"structured": True}, {}),
+    "git_status_watched": ("git_status", {"structured": True}, {"env": {"GIT_MCP_WATCH": "1"}}),
+    "git_log": ("git_log", {"limit": 100}, {}),
+    "git_log_filtered": ("git_log", {"limit": 100, "author": "Developer 3", "format": "compact"}, {}),
+    "git_diff_patch": ("git_diff", {}, {}),
+    "git_diff_stat": ("git_diff", {"mode": "stat"}, {}),
+    "git_diff_files": ("git_diff", {"mode": "files"}, {}),
+    "git_diff_revs": ("git_diff_revs", {"base": "HEAD~100"}, {}),
+    "git_diff_revs_merge_base": ("git_diff_revs", {"base": "branch-0", "merge_base": True, "max_files": 20}, {}),
+    "git_search_commits": ("git_search_commits", {"query": "cache", "touched_path": "dir0"}, {}),
+    "git_blame": ("git_blame", {"file": "dir0/sub0/file0.txt"}, {}),
+    "git_show_file": ("git_show_file", {"file": "dir0/sub0/file0.txt"}, {}),
+    "git_show_files": ("git_show_files", {"files": [f"dir0/sub0/file{i}.txt" for i in range(50)]}, {}),
+    "git_grep": ("git_grep", {"pattern": "revision [0-9]+7$"}, {}),
+    "git_grep_rev": ("git_grep", {"pattern": "file 12", "mode": "fixed", "rev": "HEAD", "max_results": None}, {}),
+    "git_branch": ("git_branch", {}, {}),
+    "git_branch_all": ("git_branch", {"remotes": True, "tags": True, "track": False}, {}),
+    "git_workspace_status": ("git_workspace_status", {"untracked_files": "no"}, {"root": True}),
+    "git_batch": ("git_batch", {"operations": [
+        {"tool": "git_status"}, {"tool": "git_branch"}, {"tool": "git_log", "arguments": {"limit": 5}},
+    ]}, {}),
+    "git_commit": ("git_commit", _commit_args, {"write": True}),
+    "git_checkout": ("git_checkout", _checkout_args, {"write": True}),
+}
+
+
+def percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run_scenario(name: str, repo: str, runs: int) -> dict:
+    """Worker entry point; runs in a fresh interpreter."""
+    tool, arguments, options = SCENARIOS[name]
+    os.environ.update(options.get("env", {}))
+    import_started = time.perf_counter()
+    from git_mcp import handle_call_tool
+    import_ms = (time.perf_counter() - import_started) * 1000
+    path = os.path.dirname(repo) if options.get("root") else repo
+
+    def args_for(i: int) -> dict:
+        return arguments(path, i) if callable(arguments) else {"path": path, **arguments}
+
+    async def timed(i: int) -> float:
+        call_args = args_for(i)
+        started = time.perf_counter()
+        result = await handle_call_tool(tool, call_args)
+        elapsed = (time.perf_counter() - started) * 1000
+        if result[0].text.startswith("Error:"):
+            raise RuntimeError(result[0].text)
+        return elapsed
+
+    async def measure():
+        cold = await timed(0)
+        warm = [await timed(i) for i in range(1, runs + 1)]
+        return cold, warm
+
+    cold, warm = asyncio.run(measure())
+    return {
+        "tool": tool,
+        "import_ms": round(import_ms, 3),
+        "cold_ms": round(cold, 3),
+        "p50_ms": round(percentile(warm, 0.50), 3),
+        "p95_ms": round(percentile(warm, 0.95), 3),
+        "p99_ms": round(percentile(warm, 0.99), 3),
+        "runs": runs,
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "peak_child_rss_mb": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1),
+    }
+
+
+def run_all(repo: str, names: list, runs: int) -> dict:
+    results = {}
+    context = get_context("spawn")
+    for name in names:
+        target = repo
+        scratch = None
+        if SCENARIOS[name][2].get("write"):
+            scratch = tempfile.mkdtemp(prefix="git-mcp-bench-")
+            target = os.path.join(scratch, "repo")
+            subprocess.run(["git", "clone", "-q", "--shared", "--no-checkout", repo, target], check=True)
+            subprocess.run(["git", "-C", target, "checkout", "-q", "main"], check=True)
+            subprocess.run(["git", "-C", target, "branch", "-q", "branch-0", "origin/branch-0"], check=True)
+        try:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                results[name] = pool.submit(run_scenario, name, target, runs).result()
+        except Exception as e:
+            results[name] = {"tool": SCENARIOS[name][0], "error": str(e)}
+        finally:
+            if scratch is not None:
+                shutil.rmtree(scratch, ignore_errors=True)
+        result = results[name]
+        if "error" in result:
+            print(f"{name:<24} ERROR {result['error'][:100]}")
+        else:
+            print(
+                f"{name:<24} cold {result['cold_ms']:9.2f} ms   p50 {result['p50_ms']:9.2f}"
+                f"   p95 {result['p95_ms']:9.2f}   p99 {result['p99_ms']:9.2f} ms"
+                f"   rss {result['peak_rss_mb']:7.1f} MB"
+            )
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float, floor_ms: float = 1.0) -> list:
+    """Print per-scenario changes against ``baseline``; return regressed scenario names."""
+    regressions = []
+    print(f"\n{'scenario':<24} {'metric':<12} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name, current in results.items():
+        previous = baseline.get("results", {}).get(name)
+        if previous is None or "error" in previous or "error" in current:
+            continue
+        for metric in ("cold_ms", "p50_ms", "p95_ms", "peak_rss_mb"):
+            old, new = previous[metric], current[metric]
+            change = (new - old) / old if old else 0.0
+            slower = change > threshold and (metric == "peak_rss_mb" or new - old > floor_ms)
+            flag = "  REGRESSION" if slower and metric in ("p50_ms", "peak_rss_mb") else ""
+            print(f"{name:<24} {metric:<12} {old:10.2f} {new:10.2f} {change:+8.1%}{flag}")
+            if flag:
+                regressions.append(name)
+    return sorted(set(regressions))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repo", help="Existing fixture repository (see benchmarks.generate)")
+    parser.add_argument("--preset", choices=sorted(PRESETS), default="small", help="Fixture to generate when --repo is not given")
+    parser.add_argument("--runs", type=int, default=20, help="Warm calls per scenario")
+    parser.add_argument("--only", nargs="+", choices=sorted(SCENARIOS), help="Run only these scenarios")
+    parser.add_argument("--output", help="Write results JSON here")
+    parser.add_argument("--baseline", help="Results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative slowdown counted as a regression")
+    options = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="git-mcp-fixture-") as tmp:
+        repo = options.repo and os.path.realpath(options.repo)
+        fixture = {"repo": repo}
+        if repo is None:
+            repo = os.path.join(tmp, "repo")
+            started = time.perf_counter()
+            make_repo(repo, **PRESETS[options.preset])
+            fixture = {"preset": options.preset, **PRESETS[options.preset]}
+            print(f"generated {options.preset} fixture in {time.perf_counter() - started:.1f}s")
+
+        results = run_all(repo, options.only or list(SCENARIOS), options.runs)
+
+    report = {
+        "meta": {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "git": subprocess.run(["git", "--version"], capture_output=True, text=True).stdout.strip(),
+            "fixture": fixture,
+            "runs": options.runs,
+        },
+        "results": results,
+    }
+    if options.output:
+        with open(options.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if options.baseline:
+        with open(options.baseline) as f:
+            regressions = compare(results, json.load(f), options.threshold)
+        if regressions:
+            print(f"\nregressed: {', '.join(regressions)}")
+            sys.exit(1)
+    if any("error" in result for result in results.values()):
+        sys.exit(2)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,14 +4,27 @@ REST API wrapper for Git MCP Server
 Provides HTTP endpoints for Git operations
 """
 
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
 from typing import Optional, List
-import asyncio
-from mcp import ClientSession, StdioServerParameters
-from mcp.client.stdio import stdio_client
+import os
+from session_pool import MCPSessionPool
 
-app = FastAPI(title="Git MCP API", version="0.1.0")
+# Warm sessions shared by all requests. With GIT_MCP_URL set they connect to a
+# server started with `python git_mcp.py --transport http`; otherwise each
+# session runs its own stdio server process.
+pool = MCPSessionPool(size=int(os.environ.get("GIT_MCP_POOL_SIZE", 4)))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Keep the session pool open for the lifetime of the API process"""
+    async with pool:
+        yield
+
+
+app = FastAPI(title="Git MCP API", version="0.1.0", lifespan=lifespan)
 
 # Request models
 class GitStatusRequest(BaseModel):
@@ -41,17 +54,9 @@ class GitCheckoutRequest(BaseModel):
 
 async def call_git_tool(tool_name: str, arguments: dict):
     """Call Git MCP server tool"""
-    server_params = StdioServerParameters(
-        command="python",
-        args=["/Users/lokesh/git/MCP-Servers/git-mcp/git_mcp.py"]
-    )
-    
     try:
-        async with stdio_client(server_params) as (read, write):
-            async with ClientSession(read, write) as session:
-                await session.initialize()
-                result = await session.call_tool(tool_name, arguments)
-                return {"success": True, "data": result.content[0].text}
+        result = await pool.call_tool(tool_name, arguments)
+        return {"success": True, "data": result.content[0].text}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -3,18 +3,20 @@
 Example integration with various GenAI APIs (OpenAI, Anthropic, Google, etc.)
 """
 
-import asyncio
 import json
-from typing import Dict, Any, List
-from mcp import ClientSession, StdioServerParameters
-from mcp.client.stdio import stdio_client
+from typing import Dict, Any, List, Optional
+from session_pool import BackgroundSessionPool
 
 
 class GitMCPToolkit:
     """Toolkit for integrating Git MCP with GenAI APIs"""
     
-    def __init__(self, mcp_server_path: str = "/Users/lokesh/git/MCP-Servers/git-mcp/git_mcp.py"):
-        self.server_path = mcp_server_path
+    def __init__(self, server_url: Optional[str] = None, pool_size: int = 2):
+        # Sessions stay warm between tool calls. Pass server_url (or set
+        # GIT_MCP_URL) to use a server started with `python git_mcp.py --transport http`.
+        self.server_url = server_url
+        self.pool_size = pool_size
+        self._pool = None
         self.tools = self._define_tools()
     
     def _define_tools(self) -> List[Dict[str, Any]]:
@@ -152,22 +154,18 @@ class GitMCPToolkit:
             }
         ]
     
-    async def call_tool(self, tool_name: str, arguments: dict) -> str:
-        """Call a Git MCP tool and return the result"""
-        server_params = StdioServerParameters(
-            command="python",
-            args=[self.server_path]
-        )
-        
-        async with stdio_client(server_params) as (read, write):
-            async with ClientSession(read, write) as session:
-                await session.initialize()
-                result = await session.call_tool(tool_name, arguments)
-                return result.content[0].text
-    
     def execute_tool(self, tool_name: str, arguments: dict) -> str:
-        """Synchronous wrapper for calling tools"""
-        return asyncio.run(self.call_tool(tool_name, arguments))
+        """Call a Git MCP tool on a pooled session and return the result"""
+        if self._pool is None:
+            self._pool = BackgroundSessionPool(size=self.pool_size, server_url=self.server_url)
+        result = self._pool.call_tool(tool_name, arguments)
+        return result.content[0].text
+    
+    def close(self):
+        """Shut down the pooled sessions"""
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
 
 
 # Example: OpenAI Integration
@@ -277,4 +275,6 @@ if __name__ == "__main__":
     # Example: Get git log
     print("\nTesting git_log...")
     result = toolkit.execute_tool("git_log", {"path": "/Users/lokesh/git/MCP-Servers/git-mcp", "limit": 3})
-    print(result)
\ No newline at end of file
+    print(result)
+    
+    toolkit.close()
\ No newline at end of file
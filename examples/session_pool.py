@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+Reusable pool of warm Git MCP client sessions
+
+Each slot owns one initialized ClientSession, either to its own stdio server
+process or to a shared HTTP server (set GIT_MCP_URL). Callers borrow a free
+session per tool call, so N concurrent calls run on N warm sessions without
+paying for process startup or the initialize handshake. A session that fails
+(e.g. its server crashed) is restarted in the background and the call is
+retried once on another session, except a write tool whose request was
+already sent, which may have taken effect. Idle sessions are pinged periodically so
+dead servers are replaced before a caller picks them up. A slot whose server
+fails to start max_failures times in a row gives up; start() raises if the
+pool cannot come up within start_timeout, and call_timeout bounds waiting for
+a free session as well as the call itself.
+
+    pool = MCPSessionPool(size=4)
+    await pool.start()
+    result = await pool.call_tool("git_status", {"path": "."})
+    await pool.close()
+
+BackgroundSessionPool runs the same pool on a dedicated event loop thread for
+synchronous callers.
+"""
+
+import asyncio
+import contextlib
+import logging
+import os
+import sys
+import threading
+import time
+from typing import Optional
+
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.stdio import stdio_client
+from mcp.client.streamable_http import streamable_http_client
+
+logger = logging.getLogger(__name__)
+
+SERVER_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "git_mcp.py")
+
+# Tools that change the repository. Once a call to one of them was sent it may
+# have been applied, so it is never retried.
+WRITE_TOOLS = frozenset(("git_commit", "git_checkout", "git_worktree_lease", "git_worktree_release", "git_batch"))
+
+# Queued in place of a session once every slot has given up, so waiting
+# callers fail instead of blocking.
+_GAVE_UP = -1
+
+
+class _Slot:
+    def __init__(self, index: int):
+        self.index = index
+        self.session: Optional[ClientSession] = None
+        self.generation = 0
+        self.failures = 0
+        self.gave_up = False
+        self.failed = asyncio.Event()
+
+
+class MCPSessionPool:
+    """Keeps `size` initialized MCP sessions and hands them out to callers."""
+
+    def __init__(
+        self,
+        size: int = 4,
+        server_url: Optional[str] = None,
+        server_command: Optional[list] = None,
+        call_timeout: float = 60.0,
+        health_interval: float = 30.0,
+        start_timeout: float = 30.0,
+        max_failures: int = 5,
+    ):
+        self.size = size
+        self.server_url = server_url or os.environ.get("GIT_MCP_URL")
+        self.server_command = server_command or [sys.executable, SERVER_PATH]
+        self.call_timeout = call_timeout
+        self.health_interval = health_interval
+        self.start_timeout = start_timeout
+        self.max_failures = max_failures
+        self.restarts = 0
+        self.error: Optional[BaseException] = None
+        self._idle: Optional[asyncio.Queue] = None
+        self._slots = []
+        self._tasks = []
+        self._closing = False
+
+    def _connect(self):
+        if self.server_url:
+            return streamable_http_client(self.server_url)
+        params = StdioServerParameters(command=self.server_command[0], args=self.server_command[1:])
+        return stdio_client(params)
+
+    async def _supervise(self, slot: _Slot):
+        """Own one session for its whole life, reconnecting after failures."""
+        backoff = 0.1
+        while not self._closing:
+            slot.failed = asyncio.Event()
+            try:
+                async with self._connect() as streams:
+                    async with ClientSession(streams[0], streams[1]) as session:
+                        await asyncio.wait_for(session.initialize(), self.start_timeout)
+                        slot.session = session
+                        slot.generation += 1
+                        slot.failures = 0
+                        backoff = 0.1
+                        self._idle.put_nowait((slot, slot.generation))
+                        await slot.failed.wait()
+            except Exception as e:
+                logger.exception("MCP session %d failed", slot.index)
+                self.error = e
+            slot.session = None
+            if self._closing:
+                break
+            slot.failures += 1
+            if slot.failures >= self.max_failures:
+                logger.error("MCP session %d failed %d times in a row, giving up", slot.index, slot.failures)
+                slot.gave_up = True
+                if all(other.gave_up for other in self._slots):
+                    self._idle.put_nowait((slot, _GAVE_UP))
+                break
+            self.restarts += 1
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 5.0)
+
+    def _startup_error(self) -> RuntimeError:
+        return RuntimeError(f"MCP server failed to start {self.max_failures} times in a row: {self.error!r}")
+
+    async def _health_check(self):
+        while True:
+            await asyncio.sleep(self.health_interval)
+            for _ in range(self._idle.qsize()):
+                slot, generation = self._idle.get_nowait()
+                if slot.generation != generation or slot.session is None:
+                    continue
+                try:
+                    await asyncio.wait_for(slot.session.send_ping(), self.call_timeout)
+                except Exception:
+                    slot.failed.set()
+                else:
+                    self._idle.put_nowait((slot, generation))
+
+    async def start(self, wait: bool = True):
+        """Start the sessions; with wait, return once all of them are ready."""
+        self._idle = asyncio.Queue()
+        self._slots = [_Slot(i) for i in range(self.size)]
+        self._tasks = [asyncio.create_task(self._supervise(slot)) for slot in self._slots]
+        self._tasks.append(asyncio.create_task(self._health_check()))
+        deadline = asyncio.get_running_loop().time() + self.start_timeout
+        while wait and self._idle.qsize() < self.size:
+            if any(slot.gave_up for slot in self._slots):
+                await self.close()
+                raise self._startup_error()
+            if asyncio.get_running_loop().time() > deadline:
+                await self.close()
+                raise TimeoutError(f"MCP sessions not ready after {self.start_timeout}s")
+            await asyncio.sleep(0.01)
+
+    async def close(self):
+        self._closing = True
+        for slot, task in zip(self._slots, self._tasks):
+            slot.failed.set()
+            if slot.session is None:
+                # Still connecting or backing off; nothing to shut down cleanly.
+                task.cancel()
+        self._tasks[-1].cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def _acquire(self):
+        while True:
+            slot, generation = await self._idle.get()
+            if generation == _GAVE_UP:
+                self._idle.put_nowait((slot, generation))
+                raise self._startup_error()
+            if slot.generation == generation and slot.session is not None:
+                return slot, generation
+
+    @contextlib.asynccontextmanager
+    async def session(self, timeout: Optional[float] = None):
+        """Borrow a live session, waiting at most ``timeout`` (default call_timeout) for one.
+
+        The session is restarted if the caller's work fails.
+        """
+        slot, generation = await asyncio.wait_for(self._acquire(), timeout or self.call_timeout)
+        try:
+            yield slot.session
+        except BaseException:
+            slot.failed.set()
+            raise
+        self._idle.put_nowait((slot, generation))
+
+    async def call_tool(self, name: str, arguments: dict, retries: int = 1):
+        """Call a tool; call_timeout covers both waiting for a session and the call."""
+        loop = asyncio.get_running_loop()
+        for attempt in range(retries + 1):
+            deadline = loop.time() + self.call_timeout
+            sent = False
+            try:
+                async with self.session() as session:
+                    sent = True
+                    return await asyncio.wait_for(session.call_tool(name, arguments), deadline - loop.time())
+            except Exception:
+                # Once a write was sent it may have been applied, whatever failed afterwards.
+                if attempt == retries or (sent and name in WRITE_TOOLS):
+                    raise
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size,
+            "idle": self._idle.qsize() if self._idle else 0,
+            "live": sum(1 for slot in self._slots if slot.session is not None),
+            "restarts": self.restarts,
+        }
+
+
+class BackgroundSessionPool:
+    """Runs an MCPSessionPool on its own event loop thread for synchronous code."""
+
+    def __init__(self, **kwargs):
+        self.pool = MCPSessionPool(**kwargs)
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="mcp-session-pool", daemon=True)
+        self._thread.start()
+        try:
+            self._run(self.pool.start())
+        except BaseException:
+            self._stop()
+            raise
+
+    def _run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    def call_tool(self, name: str, arguments: dict):
+        return self._run(self.pool.call_tool(name, arguments))
+
+    def _stop(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    def close(self):
+        self._run(self.pool.close())
+        self._stop()
+
+
+if __name__ == "__main__":
+    async def demo():
+        async with MCPSessionPool(size=2) as pool:
+            started = time.perf_counter()
+            results = await asyncio.gather(*(
+                pool.call_tool("git_branch", {"path": os.path.dirname(SERVER_PATH)}) for _ in range(10)
+            ))
+            print(results[0].content[0].text)
+            print(f"10 calls in {time.perf_counter() - started:.3f}s", pool.stats())
+
+    asyncio.run(demo())
@@ -1,38 +1,198 @@
 #!/usr/bin/env python3
 
 import asyncio
+import base64
+import binascii
+import collections
+import contextlib
+import contextvars
+import ctypes
+import ctypes.util
+import errno
+import fnmatch
+import functools
+import getpass
+import hashlib
+import importlib
 import json
-from typing import Optional, List, Union
+import mmap
+import os
+import re
+import socket
+import sqlite3
+import stat
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Iterable, Iterator, NamedTuple, Optional, List, Tuple, Union
 from mcp.server import Server, NotificationOptions
 from mcp.server.models import InitializationOptions
 import mcp.server.stdio
 import mcp.types as types
-from git import Repo
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, ValidationError
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class _LazyModule:
+    """Stands in for a module that is imported on first attribute access.
+
+    The import runs under a lock and each attribute is then cached here:
+    importlib's LazyLoader is not thread-safe before Python 3.12.3, and the
+    first access can come from several scheduler threads at once.
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+        self._lock = threading.Lock()
+
+    def __getattr__(self, attr: str):
+        with self._lock:
+            value = getattr(importlib.import_module(self._name), attr)
+            setattr(self, attr, value)
+        return value
+
+
+# GitPython is only needed for its exception types; every tool runs git
+# itself, so a server that answers without errors never pays for importing it.
+git = _LazyModule("git")
+
+
+_FORMAT_DESCRIPTION = (
+    "Output encoding: 'json' (indented), 'compact' (minified JSON), 'ndjson' (one record per line) "
+    "or 'columnar' ({fields, rows})"
+)
 
 
 class GitStatusArgs(BaseModel):
     path: str = Field(description="Path to the git repository")
+    structured: Optional[bool] = Field(default=False, description="Return typed JSON (branch, staged, unstaged, untracked, conflicted) instead of git's text")
+    untracked_files: Optional[str] = Field(default="normal", description="Untracked file scan: 'no', 'normal' or 'all'")
+    untracked_cache: Optional[bool] = Field(default=None, description="Turn core.untrackedCache on or off for this repository")
+    fsmonitor: Optional[bool] = Field(default=None, description="Turn the builtin filesystem monitor (core.fsmonitor) on or off for this repository")
+    format: Optional[str] = Field(default="json", description=_FORMAT_DESCRIPTION)
 
 
 class GitLogArgs(BaseModel):
     path: str = Field(description="Path to the git repository")
-    limit: Optional[int] = Field(default=10, description="Number of commits to show")
+    limit: Optional[int] = Field(default=10, description="Number of commits to show (page size)")
+    rev: Optional[str] = Field(default=None, description="Revision or range to walk, e.g. 'main' or 'v1.0..HEAD' (default: HEAD)")
+    since: Optional[str] = Field(default=None, description="Only commits more recent than this date")
+    until: Optional[str] = Field(default=None, description="Only commits older than this date")
+    author: Optional[str] = Field(default=None, description="Only commits whose author matches this pattern")
+    cursor: Optional[str] = Field(default=None, description="Continuation cursor returned by a previous page")
+    abbrev: Optional[int] = Field(default=None, description="Shorten commit hashes to at least this many characters (unique in the repository)")
+    body: Optional[bool] = Field(default=True, description="Include full commit messages; false returns only the subject line")
+    format: Optional[str] = Field(default="json", description=_FORMAT_DESCRIPTION)
 
 
 class GitDiffArgs(BaseModel):
     path: str = Field(description="Path to the git repository")
     staged: Optional[bool] = Field(default=False, description="Show staged changes")
+    mode: Optional[str] = Field(default="patch", description="'patch' (unified diff), 'files' (per-file patches, paged), 'stat' (numstat per file) or 'name-only'")
+    paths: Optional[List[str]] = Field(default=None, description="Only diff these paths")
+    max_bytes: Optional[int] = Field(default=1_000_000, description="Maximum bytes of patch text to return")
+    offset: Optional[int] = Field(default=0, description="Index of the first changed file to return in 'files' mode")
+    max_files: Optional[int] = Field(default=50, description="Maximum files per page in 'files' mode")
+    include_generated: Optional[bool] = Field(default=False, description="Include patches for generated files such as lockfiles")
+    format: Optional[str] = Field(default="json", description=_FORMAT_DESCRIPTION)
+
+
+class GitDiffRevsArgs(BaseModel):
+    path: str = Field(description="Path to the git repository")
+    base: str = Field(description="Base revision, e.g. 'main'")
+    head: Optional[str] = Field(default="HEAD", description="Revision to compare against base")
+    merge_base: Optional[bool] = Field(default=False, description="Diff from the merge base of base and head, like 'base...head' (what a pull request shows)")
+    paths: Optional[List[str]] = Field(default=None, description="Only diff these paths")
+    renames: Optional[int] = Field(default=50, description="Similarity in percent for rename detection; 0 turns it off")
+    copies: Optional[int] = Field(default=None, description="Also detect copies from modified files at this similarity in percent")
+    context: Optional[int] = Field(default=3, description="Lines of context around each hunk")
+    offset: Optional[int] = Field(default=0, description="Index of the first changed file to return")
+    max_files: Optional[int] = Field(default=50, description="Maximum files per page")
+    max_bytes: Optional[int] = Field(default=1_000_000, description="Maximum bytes of hunk lines per page")
+    include_generated: Optional[bool] = Field(default=False, description="Include hunks for generated files such as lockfiles")
+    format: Optional[str] = Field(default="json", description=_FORMAT_DESCRIPTION)
+
+
+class GitSearchCommitsArgs(BaseModel):
+    path: str = Field(description="Path to the git repository")
+    query: Optional[str] = Field(default=None, description="Full-text search over commit messages (SQLite FTS5 syntax, e.g. 'fix AND login')")
+    author: Optional[str] = Field(default=None, description="Only commits whose author name or email contains this text")
+    since: Optional[str] = Field(default=None, description="Only commits more recent than this date")
+    until: Optional[str] = Field(default=None, description="Only commits older than this date")
+    touched_path: Optional[str] = Field(default=None, description="Only commits that changed this file or directory")
+    limit: Optional[int] = Field(default=20, description="Maximum number of commits to return")
+    update: Optional[bool] = Field(default=True, description="Index new commits before searching")
+    abbrev: Optional[int] = Field(default=None, description="Shorten commit hashes to at least this many characters (unique in the repository)")
+    body: Optional[bool] = Field(default=True, description="Include full commit messages; false returns only the subject line")
+    format: Optional[str] = Field(default="json", description=_FORMAT_DESCRIPTION)
+
+
+class GitBlameArgs(BaseModel):
+    path: str = Field(description="Path to the git repository")
+    file: str = Field(description="File to blame, relative to the repository root")
+    rev: Optional[str] = Field(default="HEAD", description="Commit to blame at; uncommitted changes are not included")
+    start_line: Optional[int] = Field(default=None, description="First line to blame (1-based, default 1)")
+    end_line: Optional[int] = Field(default=None, description="Last line to blame, inclusive (default: end of file)")
+    format: Optional[str] = Field(default="json", description=_FORMAT_DESCRIPTION)
+
+
+class GitShowFileArgs(BaseModel):
+    path: str = Field(description="Path to the git repository")
+    file: str = Field(description="File to read, relative to the repository root")
+    rev: Optional[str] = Field(default="HEAD", description="Commit to read the file from")
+    offset: Optional[int] = Field(default=0, description="Byte offset to start reading at")
+    length: Optional[int] = Field(default=1_000_000, description="Maximum bytes to return")
+    format: Optional[str] = Field(default="json", description=_FORMAT_DESCRIPTION)
+
+
+class GitShowFilesArgs(BaseModel):
+    path: str = Field(description="Path to the git repository")
+    files: List[str] = Field(description="Files to read, relative to the repository root")
+    rev: Optional[str] = Field(default="HEAD", description="Commit to read the files from")
+    max_bytes: Optional[int] = Field(default=100_000, description="Maximum bytes to return per file")
+    format: Optional[str] = Field(default="json", description=_FORMAT_DESCRIPTION)
+
+
+class GitGrepArgs(BaseModel):
+    path: str = Field(description="Path to the git repository")
+    pattern: str = Field(description="Pattern to search for")
+    rev: Optional[str] = Field(default=None, description="Search the tree of this revision instead of the worktree")
+    mode: Optional[str] = Field(default="extended", description="'extended' (POSIX ERE), 'basic' (POSIX BRE), 'perl' (PCRE) or 'fixed' (literal string)")
+    ignore_case: Optional[bool] = Field(default=False, description="Match case-insensitively")
+    paths: Optional[List[str]] = Field(default=None, description="Only search these pathspecs, e.g. 'src/' or '*.py'")
+    max_per_file: Optional[int] = Field(default=None, description="Stop after this many matches in one file")
+    max_results: Optional[int] = Field(default=200, description="Stop searching after this many matches in total")
+    format: Optional[str] = Field(default="json", description=_FORMAT_DESCRIPTION)
 
 
 class GitCommitArgs(BaseModel):
     path: str = Field(description="Path to the git repository")
     message: str = Field(description="Commit message")
-    files: Optional[List[str]] = Field(default=None, description="Specific files to commit")
+    files: Optional[List[str]] = Field(default=None, description="Files, directories or globs to stage before committing, deletions included; otherwise the index is committed as it is")
+    all: Optional[bool] = Field(default=False, description="Stage every modified and deleted tracked file first, like 'git commit -a'")
+    amend: Optional[bool] = Field(default=False, description="Replace the HEAD commit, keeping its parents and author")
+    author: Optional[str] = Field(default=None, description="Author as 'Name <email>' (default: the configured identity)")
+    hooks: Optional[bool] = Field(default=False, description="Run the pre-commit, prepare-commit-msg, commit-msg and post-commit hooks")
 
 
 class GitBranchArgs(BaseModel):
     path: str = Field(description="Path to the git repository")
+    pattern: Optional[str] = Field(default=None, description="Only refs whose short name matches this glob, e.g. 'feature/*'")
+    sort: Optional[str] = Field(default="refname", description="for-each-ref sort key, e.g. '-committerdate' for most recently updated first")
+    limit: Optional[int] = Field(default=None, description="Maximum number of refs to return")
+    remotes: Optional[bool] = Field(default=False, description="Include remote-tracking branches")
+    tags: Optional[bool] = Field(default=False, description="Include tags")
+    track: Optional[bool] = Field(default=True, description="Compute ahead/behind counts against each branch's upstream")
+    format: Optional[str] = Field(default="json", description=_FORMAT_DESCRIPTION)
 
 
 class GitCheckoutArgs(BaseModel):
@@ -41,141 +201,4546 @@ class GitCheckoutArgs(BaseModel):
     create: Optional[bool] = Field(default=False, description="Create new branch")
 
 
-server = Server("git-mcp")
+class GitWorktreeLeaseArgs(BaseModel):
+    path: str = Field(description="Path to the git repository")
+    branch: Optional[str] = Field(default=None, description="Branch to check out in the worktree; HEAD is detached when omitted")
+    rev: Optional[str] = Field(default=None, description="Commit to check out detached, or the start point of a new branch (default: HEAD)")
+    create: Optional[bool] = Field(default=False, description="Create branch at rev")
+    sparse: Optional[List[str]] = Field(default=None, description="Directories to check out (cone-mode sparse checkout); the whole tree when omitted")
+    format: Optional[str] = Field(default="json", description=_FORMAT_DESCRIPTION)
 
 
-@server.list_tools()
-async def handle_list_tools() -> List[types.Tool]:
-    return [
-        types.Tool(
-            name="git_status",
-            description="Get git repository status",
-            inputSchema=GitStatusArgs.model_json_schema(),
-        ),
-        types.Tool(
-            name="git_log",
-            description="Get git commit history",
-            inputSchema=GitLogArgs.model_json_schema(),
-        ),
-        types.Tool(
-            name="git_diff",
-            description="Show git diff",
-            inputSchema=GitDiffArgs.model_json_schema(),
-        ),
-        types.Tool(
-            name="git_commit",
-            description="Create a git commit",
-            inputSchema=GitCommitArgs.model_json_schema(),
-        ),
-        types.Tool(
-            name="git_branch",
-            description="List git branches",
-            inputSchema=GitBranchArgs.model_json_schema(),
-        ),
-        types.Tool(
-            name="git_checkout",
-            description="Checkout a git branch",
-            inputSchema=GitCheckoutArgs.model_json_schema(),
-        ),
-    ]
+class GitWorktreeReleaseArgs(BaseModel):
+    path: str = Field(description="Path of the leased worktree")
+    remove: Optional[bool] = Field(default=False, description="Delete the worktree instead of returning it to the pool")
 
 
-@server.call_tool()
-async def handle_call_tool(
-    name: str, arguments: dict
-) -> List[Union[types.TextContent, types.ImageContent, types.EmbeddedResource]]:
-    try:
-        if name == "git_status":
-            args = GitStatusArgs(**arguments)
-            repo = Repo(args.path)
-            status = repo.git.status()
-            
-            return [types.TextContent(type="text", text=status)]
-        
-        elif name == "git_log":
-            args = GitLogArgs(**arguments)
-            repo = Repo(args.path)
-            
-            commits = []
-            for commit in repo.iter_commits(max_count=args.limit):
-                commits.append({
-                    "hash": commit.hexsha,
-                    "author": str(commit.author),
-                    "date": commit.committed_datetime.isoformat(),
-                    "message": commit.message.strip(),
-                })
-            
-            return [types.TextContent(type="text", text=json.dumps(commits, indent=2))]
-        
-        elif name == "git_diff":
-            args = GitDiffArgs(**arguments)
-            repo = Repo(args.path)
-            
-            if args.staged:
-                diff = repo.git.diff("--staged")
-            else:
-                diff = repo.git.diff()
-            
-            return [types.TextContent(type="text", text=diff or "No changes")]
-        
-        elif name == "git_commit":
-            args = GitCommitArgs(**arguments)
-            repo = Repo(args.path)
-            
-            if args.files:
-                repo.index.add(args.files)
-            
-            commit = repo.index.commit(args.message)
-            
-            return [types.TextContent(type="text", text=f"Commit created: {commit.hexsha}")]
-        
-        elif name == "git_branch":
-            args = GitBranchArgs(**arguments)
-            repo = Repo(args.path)
-            
-            branches = []
-            for branch in repo.branches:
-                branches.append({
-                    "name": branch.name,
-                    "current": branch == repo.active_branch,
-                })
-            
-            return [types.TextContent(type="text", text=json.dumps(branches, indent=2))]
-        
-        elif name == "git_checkout":
-            args = GitCheckoutArgs(**arguments)
-            repo = Repo(args.path)
-            
-            if args.create:
-                new_branch = repo.create_head(args.branch)
-                new_branch.checkout()
-            else:
-                repo.git.checkout(args.branch)
-            
-            return [types.TextContent(type="text", text=f"Checked out branch: {args.branch}")]
-        
+class GitWorkspaceStatusArgs(BaseModel):
+    path: str = Field(description="Directory to search for git repositories")
+    max_depth: Optional[int] = Field(default=3, description="How many directory levels below path to search")
+    ignore: Optional[List[str]] = Field(default=None, description="Glob patterns for directories to skip, matched against the name and the path relative to the root (default: node_modules)")
+    untracked_files: Optional[str] = Field(default="normal", description="How to count untracked files: 'no' (fastest), 'normal' or 'all'")
+    timeout: Optional[float] = Field(default=10.0, description="Seconds each repository may take before it is reported as timed out")
+    max_repos: Optional[int] = Field(default=1000, description="Maximum number of repositories to check")
+    format: Optional[str] = Field(default="json", description=_FORMAT_DESCRIPTION)
+
+
+class GitServerStatsArgs(BaseModel):
+    openmetrics: Optional[bool] = Field(default=False, description="Return OpenMetrics text exposition instead of JSON")
+    format: Optional[str] = Field(default="json", description=_FORMAT_DESCRIPTION)
+
+
+class GitMaintenanceStatusArgs(BaseModel):
+    path: Optional[str] = Field(default=None, description="Only report this repository")
+    format: Optional[str] = Field(default="json", description=_FORMAT_DESCRIPTION)
+
+
+class GitBatchOperation(BaseModel):
+    tool: str = Field(description="Name of the tool to run, e.g. git_status")
+    arguments: dict = Field(default_factory=dict, description="Arguments for the tool; 'path' defaults to the batch path")
+
+
+class GitBatchArgs(BaseModel):
+    path: str = Field(description="Path to the git repository")
+    operations: List[GitBatchOperation] = Field(description="Operations to run. Reads run in parallel; writes run in order and see the effect of earlier operations")
+    format: Optional[str] = Field(default="json", description=_FORMAT_DESCRIPTION)
+
+
+class ToolSpec(NamedTuple):
+    name: str
+    description: str
+    args: type
+    handler: Callable
+    # True, or a predicate on the parsed arguments, to take the repo's write lock
+    write: Union[bool, Callable] = False
+    # Run the handler on the scheduler; otherwise call it on the event loop
+    scheduled: bool = True
+
+    def writes(self, args: BaseModel) -> bool:
+        return self.write(args) if callable(self.write) else self.write
+
+
+# Tool name -> ToolSpec, in the order tools are listed.
+TOOLS = {}
+
+
+def tool(name: str, description: str, args: type, write: Union[bool, Callable] = False, scheduled: bool = True):
+    """Register the decorated function as the handler of an MCP tool."""
+    def register(handler: Callable) -> Callable:
+        TOOLS[name] = ToolSpec(name, description, args, handler, write, scheduled)
+        return handler
+    return register
+
+
+GIT_MCP_OBJECT_READERS = int(os.environ.get("GIT_MCP_OBJECT_READERS", 2))
+
+# Bytes of requests written to cat-file before reading the answers back; kept
+# well below the smallest common pipe buffer so pipelining can never deadlock.
+_PIPELINE_BYTES = 8192
+
+
+_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+_BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+_GIT_VALUE_OPTIONS = frozenset(("-C", "-c", "--git-dir", "--work-tree", "--namespace"))
+
+
+class Histogram:
+    """Fixed-bucket histogram; ``counts[i]`` holds observations <= ``bounds[i]``, the last slot overflow."""
+
+    def __init__(self, bounds: tuple):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        index = 0
+        for index, bound in enumerate(self.bounds):
+            if value <= bound:
+                break
         else:
-            raise ValueError(f"Unknown tool: {name}")
-    
-    except Exception as e:
-        return [types.TextContent(type="text", text=f"Error: {str(e)}")]
-
-
-async def main():
-    async with mcp.server.stdio.stdio_server() as (read_stream, write_stream):
-        await server.run(
-            read_stream,
-            write_stream,
-            InitializationOptions(
-                server_name="git-mcp",
-                server_version="0.1.0",
-                capabilities=server.get_capabilities(
-                    notification_options=NotificationOptions(),
-                    experimental_capabilities={},
-                ),
-            ),
+            index = len(self.bounds)
+        self.counts[index] += 1
+        self.total += value
+        self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate a quantile by interpolating inside the bucket that contains it."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = self.bounds[index - 1] if index else 0.0
+                if index == len(self.bounds):
+                    return lower
+                return lower + (self.bounds[index] - lower) * (rank - seen) / count
+            seen += count
+        return self.bounds[-1]
+
+
+class CallTiming:
+    """Per-call accumulator; the scheduler and git_popen add to the active one."""
+
+    __slots__ = ("wait", "run", "subprocesses")
+
+    def __init__(self):
+        self.wait = 0.0
+        self.run = 0.0
+        self.subprocesses = 0
+
+
+_call_timing: contextvars.ContextVar = contextvars.ContextVar("git_mcp_call_timing", default=None)
+
+
+class _ToolMetrics:
+    def __init__(self):
+        self.calls = 0
+        self.errors = collections.Counter()
+        self.latency = Histogram(_LATENCY_BUCKETS)
+        self.output_bytes = Histogram(_BYTES_BUCKETS)
+        self.wait = 0.0
+        self.run = 0.0
+        self.subprocesses = 0
+
+
+class Metrics:
+    """Process-wide counters behind git_server_stats and the OpenMetrics dump."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self.tools = {}
+        self.subprocesses = collections.Counter()
+
+    def count_subprocess(self, args: List[str]):
+        command = "?"
+        skip = False
+        for arg in args:
+            if skip:
+                skip = False
+            elif arg in _GIT_VALUE_OPTIONS:
+                skip = True
+            elif not arg.startswith("-"):
+                command = arg
+                break
+        timing = _call_timing.get()
+        with self._lock:
+            self.subprocesses[command] += 1
+            if timing is not None:
+                timing.subprocesses += 1
+
+    def add_time(self, timing: Optional[CallTiming], wait: float, run: float):
+        if timing is None:
+            return
+        with self._lock:
+            timing.wait += wait
+            timing.run += run
+
+    def record(self, tool: str, elapsed: float, output_bytes: int, timing: CallTiming,
+               error: Optional[str] = None):
+        with self._lock:
+            entry = self.tools.get(tool)
+            if entry is None:
+                entry = self.tools[tool] = _ToolMetrics()
+            entry.calls += 1
+            entry.latency.observe(elapsed)
+            entry.output_bytes.observe(output_bytes)
+            entry.wait += timing.wait
+            entry.run += timing.run
+            entry.subprocesses += timing.subprocesses
+            if error is not None:
+                entry.errors[error] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            tools = {}
+            for name, entry in sorted(self.tools.items()):
+                tools[name] = {
+                    "calls": entry.calls,
+                    "errors": dict(entry.errors),
+                    "latency_ms": {
+                        "avg": entry.latency.total / entry.calls * 1000,
+                        "p50": entry.latency.quantile(0.50) * 1000,
+                        "p95": entry.latency.quantile(0.95) * 1000,
+                        "p99": entry.latency.quantile(0.99) * 1000,
+                    },
+                    "output_bytes_total": int(entry.output_bytes.total),
+                    "output_bytes_avg": entry.output_bytes.total / entry.calls,
+                    "wait_time_total": entry.wait,
+                    "run_time_total": entry.run,
+                    "git_subprocesses": entry.subprocesses,
+                }
+            return {
+                "uptime": time.time() - self.started,
+                "tools": tools,
+                "git_subprocesses": dict(self.subprocesses),
+            }
+
+    def openmetrics(self, gauges: dict) -> str:
+        """Render counters, histograms and the given ``{family: {key: value}}`` gauges."""
+        lines = []
+
+        def histogram(name: str, unit: str, label: str, hist: Histogram):
+            cumulative = 0
+            for bound, count in zip(list(hist.bounds) + ["+Inf"], hist.counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{label},le="{bound}"}} {cumulative}')
+            lines.append(f"{name}_sum{{{label}}} {hist.total}")
+            lines.append(f"{name}_count{{{label}}} {hist.count}")
+
+        with self._lock:
+            tools = sorted(self.tools.items())
+            lines += ["# TYPE git_mcp_tool_calls counter", "# HELP git_mcp_tool_calls Tool calls handled"]
+            lines += [f'git_mcp_tool_calls_total{{tool="{name}"}} {entry.calls}' for name, entry in tools]
+            lines += ["# TYPE git_mcp_tool_errors counter", "# HELP git_mcp_tool_errors Tool calls that failed, by exception type"]
+            lines += [
+                f'git_mcp_tool_errors_total{{tool="{name}",type="{kind}"}} {count}'
+                for name, entry in tools for kind, count in sorted(entry.errors.items())
+            ]
+            lines += ["# TYPE git_mcp_tool_latency_seconds histogram", "# UNIT git_mcp_tool_latency_seconds seconds"]
+            for name, entry in tools:
+                histogram("git_mcp_tool_latency_seconds", "seconds", f'tool="{name}"', entry.latency)
+            lines += ["# TYPE git_mcp_tool_output_bytes histogram", "# UNIT git_mcp_tool_output_bytes bytes"]
+            for name, entry in tools:
+                histogram("git_mcp_tool_output_bytes", "bytes", f'tool="{name}"', entry.output_bytes)
+            for field, help_text in (("wait", "waiting for a repo lock or worker"), ("run", "executing on a worker")):
+                family = f"git_mcp_tool_{field}_seconds"
+                lines += [f"# TYPE {family} counter", f"# UNIT {family} seconds", f"# HELP {family} Time spent {help_text}"]
+                lines += [f'{family}_total{{tool="{name}"}} {getattr(entry, field)}' for name, entry in tools]
+            lines += ["# TYPE git_mcp_git_subprocesses counter", "# HELP git_mcp_git_subprocesses git processes started, by subcommand"]
+            lines += [
+                f'git_mcp_git_subprocesses_total{{command="{command}"}} {count}'
+                for command, count in sorted(self.subprocesses.items())
+            ]
+        for family, values in gauges.items():
+            for key, value in values.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    lines += [f"# TYPE git_mcp_{family}_{key} gauge", f"git_mcp_{family}_{key} {value}"]
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+def git_popen(args: List[str], **kwargs) -> subprocess.Popen:
+    metrics.count_subprocess(args)
+    return subprocess.Popen(["git", *args], **kwargs)
+
+
+def git_output(args: List[str], cwd: Optional[str] = None, input: Optional[bytes] = None,
+               timeout: Optional[float] = None, env: Optional[dict] = None) -> bytes:
+    proc = git_popen(
+        args,
+        cwd=cwd,
+        env=env,
+        stdin=subprocess.PIPE if input is not None else subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    try:
+        out, err = proc.communicate(input, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.communicate()
+        raise
+    if proc.returncode:
+        raise git.GitCommandError(["git", *args], proc.returncode, err, out)
+    return out
+
+
+@contextlib.contextmanager
+def git_stream(args: List[str], **kwargs) -> Iterator[subprocess.Popen]:
+    """Start git with its output on a pipe; on exit git is killed if still running and its pipes closed."""
+    kwargs.setdefault("stdin", subprocess.DEVNULL)
+    kwargs.setdefault("stderr", subprocess.PIPE)
+    proc = git_popen(args, stdout=subprocess.PIPE, **kwargs)
+    try:
+        yield proc
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        for pipe in (proc.stdin, proc.stdout, proc.stderr):
+            if pipe is not None:
+                pipe.close()
+
+
+def _literal(paths: Iterable[str]) -> List[str]:
+    return [":(literal)" + path for path in paths]
+
+
+_HEADER_OID_RE = re.compile(rb"[0-9a-f]{40}|[0-9a-f]{64}")
+_OBJECT_TYPES = frozenset((b"blob", b"tree", b"commit", b"tag"))
+
+
+class CatFileReader:
+    """A long-lived ``git cat-file --batch`` (or ``--batch-check``) process."""
+
+    def __init__(self, git_dir: str, check: bool = False):
+        self.git_dir = git_dir
+        self.check = check
+        self._broken = False
+        self._proc = git_popen(
+            ["--git-dir", git_dir, "cat-file", "--batch-check" if check else "--batch"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
         )
 
+    @property
+    def alive(self) -> bool:
+        return not self._broken and self._proc.poll() is None
+
+    def _read_one(self):
+        header = self._proc.stdout.readline()
+        if not header:
+            raise git.GitCommandError(["git", "cat-file"], self._proc.poll(), b"cat-file exited")
+        parts = header.split()
+        # "<name> missing" and "<name> ambiguous" echo the name, which may
+        # itself contain spaces.
+        if parts[-1] in (b"missing", b"ambiguous"):
+            return None
+        if (len(parts) != 3 or not _HEADER_OID_RE.fullmatch(parts[0])
+                or parts[1] not in _OBJECT_TYPES or not parts[2].isdigit()):
+            raise git.GitCommandError(["git", "cat-file"], None, b"unexpected header: " + header)
+        oid, kind, size = parts[0].decode(), parts[1].decode(), int(parts[2])
+        if self.check:
+            return oid, kind, size
+        data = self._proc.stdout.read(size + 1)[:size]
+        return oid, kind, data
+
+    def _exchange(self, lines: List[bytes]) -> list:
+        # A request chunk is always answered in full so an abandoned caller
+        # never leaves unread output behind for the next user of the process.
+        try:
+            self._proc.stdin.write(b"".join(lines))
+            self._proc.stdin.flush()
+            return [self._read_one() for _ in lines]
+        except BaseException:
+            self._broken = True
+            raise
+
+    def read_many(self, names: Iterable[str]) -> Iterator[Optional[tuple]]:
+        """Yield ``(oid, type, data)`` (``size`` for batch-check) per name, None if missing."""
+        chunk = []
+        size = 0
+        for name in names:
+            if "\n" in name:
+                raise ValueError(f"Invalid object name: {name!r}")
+            line = name.encode() + b"\n"
+            chunk.append(line)
+            size += len(line)
+            if size >= _PIPELINE_BYTES:
+                yield from self._exchange(chunk)
+                chunk, size = [], 0
+        if chunk:
+            yield from self._exchange(chunk)
+
+    def read(self, name: str) -> Optional[tuple]:
+        return self._exchange([name.encode() + b"\n"])[0]
+
+    def close(self):
+        if self._proc.poll() is None:
+            try:
+                self._proc.stdin.close()
+            except OSError:
+                pass
+            try:
+                self._proc.wait(timeout=1)
+            except subprocess.TimeoutExpired:
+                self._proc.kill()
+                self._proc.wait()
+        self._proc.stdout.close()
+
+
+class ObjectReaderPool:
+    """A small per-repo pool of cat-file readers handed out one thread at a time."""
+
+    def __init__(self, git_dir: str, size: int = GIT_MCP_OBJECT_READERS):
+        self.git_dir = git_dir
+        self.size = size
+        self._cond = threading.Condition()
+        self._idle = {False: [], True: []}
+        self._count = {False: 0, True: 0}
+        self._closed = False
+
+    @contextlib.contextmanager
+    def acquire(self, check: bool = False):
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError(f"Object reader pool for {self.git_dir} is closed")
+                idle = self._idle[check]
+                if idle:
+                    reader = idle.pop()
+                    break
+                if self._count[check] < self.size:
+                    self._count[check] += 1
+                    reader = None
+                    break
+                self._cond.wait()
+        if reader is None or not reader.alive:
+            if reader is not None:
+                reader.close()
+            try:
+                reader = CatFileReader(self.git_dir, check)
+            except BaseException:
+                with self._cond:
+                    self._count[check] -= 1
+                    self._cond.notify()
+                raise
+        try:
+            yield reader
+        finally:
+            with self._cond:
+                keep = not self._closed and reader.alive
+                if keep:
+                    self._idle[check].append(reader)
+                else:
+                    self._count[check] -= 1
+                self._cond.notify()
+            if not keep:
+                reader.close()
+
+    @property
+    def live(self) -> int:
+        """Reader processes started and not yet closed, idle or in use."""
+        with self._cond:
+            return self._count[False] + self._count[True]
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            readers = self._idle[False] + self._idle[True]
+            self._idle = {False: [], True: []}
+            self._cond.notify_all()
+        for reader in readers:
+            reader.close()
+
+
+class CommitInfo(NamedTuple):
+    hexsha: str
+    tree: str
+    parents: List[str]
+    author_name: str
+    author_email: str
+    authored_datetime: datetime
+    committer_name: str
+    committer_email: str
+    committed_datetime: datetime
+    message: str
+
+
+def parse_timestamp(seconds: bytes, offset: bytes) -> datetime:
+    """Turn git's ``<epoch seconds> <+hhmm>`` pair into an aware datetime."""
+    try:
+        minutes = int(offset[1:3] or 0) * 60 + int(offset[3:5] or 0)
+        tz = timezone(timedelta(minutes=-minutes if offset[:1] == b"-" else minutes))
+        return datetime.fromtimestamp(int(seconds), tz)
+    except (ValueError, OverflowError, OSError):
+        return datetime.fromtimestamp(0, timezone.utc)
+
+
+def _parse_person(value: bytes, encoding: str):
+    ident, _, stamp = value.rpartition(b"> ")
+    name, _, email = ident.partition(b" <")
+    seconds, _, offset = stamp.partition(b" ")
+    return name.decode(encoding, "replace"), email.decode(encoding, "replace"), parse_timestamp(seconds, offset)
+
+
+def parse_commit(oid: str, data: bytes) -> CommitInfo:
+    header, _, message = data.partition(b"\n\n")
+    tree = ""
+    parents = []
+    author = committer = b""
+    encoding = "utf-8"
+    for line in header.split(b"\n"):
+        if line[:1] == b" ":
+            continue
+        key, _, value = line.partition(b" ")
+        if key == b"tree":
+            tree = value.decode()
+        elif key == b"parent":
+            parents.append(value.decode())
+        elif key == b"author":
+            author = value
+        elif key == b"committer":
+            committer = value
+        elif key == b"encoding":
+            encoding = value.decode("ascii", "replace")
+    try:
+        b"".decode(encoding)
+    except LookupError:
+        encoding = "utf-8"
+    author_name, author_email, authored = _parse_person(author, encoding)
+    committer_name, committer_email, committed = _parse_person(committer, encoding)
+    return CommitInfo(
+        hexsha=oid,
+        tree=tree,
+        parents=parents,
+        author_name=author_name,
+        author_email=author_email,
+        authored_datetime=authored,
+        committer_name=committer_name,
+        committer_email=committer_email,
+        committed_datetime=committed,
+        message=message.decode(encoding, "replace"),
+    )
+
+
+GIT_MCP_REPO_CACHE_SIZE = int(os.environ.get("GIT_MCP_REPO_CACHE_SIZE", 64))
+
+
+def find_git_dir(path: str) -> str:
+    """Resolve the git dir of a worktree or bare repo without spawning git."""
+    path = os.path.realpath(path)
+    if not os.path.exists(path):
+        raise git.NoSuchPathError(path)
+    dotgit = os.path.join(path, ".git")
+    if os.path.isdir(dotgit):
+        return dotgit
+    if os.path.isfile(dotgit):
+        with open(dotgit) as f:
+            line = f.readline().strip()
+        if line.startswith("gitdir:"):
+            return os.path.realpath(os.path.join(path, line[len("gitdir:"):].strip()))
+    elif all(os.path.exists(os.path.join(path, name)) for name in ("HEAD", "objects", "refs")):
+        return path
+    raise git.InvalidGitRepositoryError(path)
+
+
+def _repo_key(path: str) -> str:
+    try:
+        return find_git_dir(path)
+    except (git.InvalidGitRepositoryError, git.NoSuchPathError, OSError):
+        return os.path.realpath(path)
+
+
+def _common_dir(git_dir: str) -> str:
+    try:
+        with open(os.path.join(git_dir, "commondir")) as f:
+            return os.path.realpath(os.path.join(git_dir, f.read().strip()))
+    except OSError:
+        return git_dir
+
+
+def repo_signature(git_dir: str) -> tuple:
+    """Cheap change stamp for a repo: mtimes of HEAD, index and the ref stores."""
+    common = _common_dir(git_dir)
+    paths = (
+        os.path.join(git_dir, "HEAD"),
+        os.path.join(git_dir, "index"),
+        os.path.join(common, "packed-refs"),
+        os.path.join(common, "refs", "heads"),
+        os.path.join(common, "refs", "tags"),
+        os.path.join(common, "refs", "remotes"),
+    )
+    return tuple(_stat_signature(p) for p in paths)
+
+
+def _stat_signature(path: str) -> Optional[tuple]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size, st.st_ino
+
+
+class _CachedRepo:
+    __slots__ = ("git_dir", "signature", "readers")
+
+    def __init__(self, git_dir: str, signature: tuple):
+        self.git_dir = git_dir
+        self.signature = signature
+        self.readers = ObjectReaderPool(git_dir)
+
+    def close(self):
+        self.readers.close()
+
+
+class RepoCache:
+    """Process-wide LRU cache of per-repo cat-file reader pools keyed by resolved git dir.
+
+    A repo's readers are closed when it is evicted, or when HEAD, the index or
+    the refs change on disk.
+    """
+
+    def __init__(self, max_size: int = GIT_MCP_REPO_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _entry(self, path: str) -> _CachedRepo:
+        git_dir = find_git_dir(path)
+        signature = repo_signature(git_dir)
+        stale = []
+        with self._lock:
+            entry = self._entries.get(git_dir)
+            if entry is not None and entry.signature != signature:
+                del self._entries[git_dir]
+                stale.append(entry)
+                self.invalidations += 1
+                entry = None
+            if entry is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+                entry = self._entries[git_dir] = _CachedRepo(git_dir, signature)
+                while len(self._entries) > self.max_size:
+                    _, evicted = self._entries.popitem(last=False)
+                    stale.append(evicted)
+                    self.evictions += 1
+            self._entries.move_to_end(git_dir)
+        for old in stale:
+            old.close()
+        return entry
+
+    @contextlib.contextmanager
+    def object_reader(self, path: str, check: bool = False):
+        with self._entry(path).readers.acquire(check) as reader:
+            yield reader
+
+    def clear(self):
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+        for entry in entries:
+            entry.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "readers": sum(e.readers.live for e in self._entries.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+repo_cache = RepoCache()
+
+
+GIT_MCP_WORKERS = int(os.environ.get("GIT_MCP_WORKERS", min(32, (os.cpu_count() or 1) + 4)))
+
+
+class RepoLock:
+    """Per-repository read/write lock: reads share the repo, writes are exclusive."""
+
+    def __init__(self):
+        self.readers = 0
+        self.writer = False
+        self._waiters = collections.deque()
+
+    @property
+    def idle(self) -> bool:
+        return not self.readers and not self.writer and not self._waiters
+
+    def _can_grant(self, write: bool) -> bool:
+        if write:
+            return not self.writer and not self.readers
+        return not self.writer
+
+    def _grant(self, write: bool):
+        if write:
+            self.writer = True
+        else:
+            self.readers += 1
+
+    async def acquire(self, write: bool = False):
+        if not self._waiters and self._can_grant(write):
+            self._grant(write)
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append((waiter, write))
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.cancelled():
+                self._wake()
+            else:
+                self.release(write)
+            raise
+
+    def release(self, write: bool = False):
+        if write:
+            self.writer = False
+        else:
+            self.readers -= 1
+        self._wake()
+
+    def _wake(self):
+        while self._waiters:
+            waiter, write = self._waiters[0]
+            if waiter.done():
+                self._waiters.popleft()
+                continue
+            if not self._can_grant(write):
+                break
+            self._waiters.popleft()
+            self._grant(write)
+            waiter.set_result(None)
+
+
+class RepoScheduler:
+    """Runs blocking git work on a bounded thread pool under per-repo locks."""
+
+    def __init__(self, max_workers: int = GIT_MCP_WORKERS):
+        self.max_workers = max_workers
+        self._executor = None
+        self._locks = {}
+        self._stats_lock = threading.Lock()
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.queued = 0
+        self.running = 0
+        self.max_queued = 0
+        self.wait_time = 0.0
+        self.max_wait = 0.0
+        self.run_time = 0.0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="git-mcp"
+            )
+        return self._executor
+
+    def _lock_for(self, key: str) -> RepoLock:
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = RepoLock()
+        return lock
+
+    def _release(self, key: str, lock: RepoLock, write: bool):
+        lock.release(write)
+        if lock.idle and self._locks.get(key) is lock:
+            del self._locks[key]
+
+    def _execute(self, enqueued: float, fn, args):
+        started = time.perf_counter()
+        waited = started - enqueued
+        with self._stats_lock:
+            self.queued -= 1
+            self.running += 1
+            self.wait_time += waited
+            self.max_wait = max(self.max_wait, waited)
+        ok = False
+        try:
+            result = fn(*args)
+            ok = True
+            return result
+        finally:
+            ran = time.perf_counter() - started
+            metrics.add_time(_call_timing.get(), waited, ran)
+            with self._stats_lock:
+                self.running -= 1
+                self.run_time += ran
+                if ok:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+
+    async def run(self, path: str, fn, *args, write: bool = False):
+        key = _repo_key(path)
+        if maintenance is not None:
+            maintenance.note(key)
+        lock = self._lock_for(key)
+        enqueued = time.perf_counter()
+        with self._stats_lock:
+            self.submitted += 1
+            self.queued += 1
+            self.max_queued = max(self.max_queued, self.queued)
+        try:
+            await lock.acquire(write)
+        except BaseException:
+            with self._stats_lock:
+                self.queued -= 1
+            if lock.idle and self._locks.get(key) is lock:
+                del self._locks[key]
+            raise
+        try:
+            future = asyncio.wrap_future(
+                self._get_executor().submit(contextvars.copy_context().run, self._execute, enqueued, fn, args)
+            )
+        except BaseException:
+            with self._stats_lock:
+                self.queued -= 1
+            self._release(key, lock, write)
+            raise
+        try:
+            return await asyncio.shield(future)
+        finally:
+            if future.done():
+                self._release(key, lock, write)
+            else:
+                # The caller went away but the worker is still touching the
+                # repo; keep it locked until the thread actually finishes.
+                future.add_done_callback(lambda _: self._release(key, lock, write))
+
+    async def run_locked(self, keys: Iterable[str], executor: ThreadPoolExecutor, fn, *args):
+        """Run ``fn`` on ``executor`` holding read locks on ``keys``, outside the call accounting.
+
+        Background work uses this so that it waits for running writes and
+        never overlaps one.
+        """
+        held = []
+        future = None
+
+        def release(_=None):
+            for key, lock in held:
+                self._release(key, lock, False)
+
+        try:
+            for key in sorted(set(keys)):
+                lock = self._lock_for(key)
+                try:
+                    await lock.acquire()
+                except BaseException:
+                    if lock.idle and self._locks.get(key) is lock:
+                        del self._locks[key]
+                    raise
+                held.append((key, lock))
+            future = asyncio.wrap_future(executor.submit(fn, *args))
+            return await asyncio.shield(future)
+        finally:
+            if future is None or future.done():
+                release()
+            else:
+                future.add_done_callback(release)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            finished = self.completed + self.failed
+            return {
+                "workers": self.max_workers,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "queue_depth": self.queued,
+                "max_queue_depth": self.max_queued,
+                "running": self.running,
+                "active_repos": len(self._locks),
+                "wait_time_total": self.wait_time,
+                "wait_time_max": self.max_wait,
+                "wait_time_avg": self.wait_time / finished if finished else 0.0,
+                "run_time_total": self.run_time,
+            }
+
+
+scheduler = RepoScheduler()
+
+
+OUTPUT_FORMATS = ("json", "compact", "ndjson", "columnar")
+
+
+def _dumps_compact(value) -> str:
+    if orjson is not None:
+        try:
+            return orjson.dumps(value).decode()
+        except orjson.JSONEncodeError:
+            # e.g. paths that are not valid UTF-8 and were decoded with surrogateescape
+            pass
+    return json.dumps(value, separators=(",", ":"))
+
+
+def columnar(records: List[dict]) -> dict:
+    """Turn a list of dicts into ``{"fields": [...], "rows": [[...], ...]}``."""
+    fields = list(dict.fromkeys(key for record in records for key in record))
+    return {"fields": fields, "rows": [[record.get(field) for field in fields] for record in records]}
+
+
+def check_format(fmt: Optional[str]) -> str:
+    fmt = fmt or "json"
+    if fmt not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown format: {fmt}")
+    return fmt
+
+
+def encode_result(value, fmt: Optional[str] = "json", records: Optional[str] = None) -> str:
+    """Serialize a structured tool result in one of OUTPUT_FORMATS.
+
+    ``records`` names the list of records inside a dict result (e.g. "repos");
+    list results are records themselves. ndjson writes the remaining keys of a
+    dict result on the first line, then one record per line. Results without
+    records are written as compact JSON by ndjson and columnar.
+    """
+    fmt = check_format(fmt)
+    if fmt == "json":
+        return json.dumps(value, indent=2)
+    if isinstance(value, list):
+        items = value
+    elif records is not None:
+        items = value[records]
+    else:
+        return _dumps_compact(value)
+    if fmt == "compact":
+        return _dumps_compact(value)
+    if fmt == "ndjson":
+        lines = [] if items is value else [_dumps_compact({k: v for k, v in value.items() if k != records})]
+        lines.extend(map(_dumps_compact, items))
+        return "\n".join(lines)
+    table = columnar(items)
+    return _dumps_compact(table if items is value else {**value, records: table})
+
+
+GIT_MCP_RESPONSE_CACHE_BYTES = int(os.environ.get("GIT_MCP_RESPONSE_CACHE_BYTES", 64 << 20))
+GIT_MCP_RESPONSE_CACHE_DIR = os.environ.get("GIT_MCP_RESPONSE_CACHE_DIR")
+GIT_MCP_RESPONSE_CACHE_DISK_BYTES = int(os.environ.get("GIT_MCP_RESPONSE_CACHE_DISK_BYTES", 1 << 30))
+
+_RESPONSE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, used REAL NOT NULL);
+CREATE INDEX IF NOT EXISTS responses_used ON responses (used);
+"""
+
+
+class ResponseCache:
+    """Results of immutable queries, keyed on the object ids they were computed from.
+
+    Callers resolve refs, HEAD and other mutable inputs to object ids first and
+    build the key from those ids plus every other argument, so an entry never
+    goes stale; it is only dropped to stay within budget. Entries live in a
+    memory LRU bounded by serialized bytes and, when ``directory`` is set, in
+    a SQLite file there that survives restarts and is shared between servers.
+    Concurrent callers of the same key wait for the first one's result instead
+    of computing it again.
+    """
+
+    def __init__(self, max_bytes: int = GIT_MCP_RESPONSE_CACHE_BYTES,
+                 directory: Optional[str] = GIT_MCP_RESPONSE_CACHE_DIR,
+                 max_disk_bytes: int = GIT_MCP_RESPONSE_CACHE_DISK_BYTES):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self._entries = collections.OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._db = None
+        self._db_lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.shared = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(tool: str, git_dir: str, *parts) -> str:
+        payload = json.dumps([tool, _common_dir(git_dir), *parts], separators=(",", ":"))
+        return hashlib.sha256(payload.encode("utf-8", "surrogateescape")).hexdigest()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            os.makedirs(self.directory, exist_ok=True)
+            db = sqlite3.connect(os.path.join(self.directory, "responses.sqlite3"), timeout=30, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.executescript(_RESPONSE_SCHEMA)
+            self._db = db
+        return self._db
+
+    def _disk_get(self, key: str) -> Optional[str]:
+        with self._db_lock:
+            db = self._connect()
+            row = db.execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                with db:
+                    db.execute("UPDATE responses SET used = ? WHERE key = ?", (time.time(), key))
+        return row[0] if row is not None else None
+
+    def _disk_put(self, key: str, text: str, size: int):
+        with self._db_lock:
+            db = self._connect()
+            with db:
+                db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)", (key, text, size, time.time()))
+                excess = db.execute("SELECT total(size) FROM responses").fetchone()[0] - self.max_disk_bytes
+                if excess > 0:
+                    stale = []
+                    for old_key, old_size in db.execute("SELECT key, size FROM responses ORDER BY used"):
+                        if excess <= 0:
+                            break
+                        stale.append((old_key,))
+                        excess -= old_size
+                    db.executemany("DELETE FROM responses WHERE key = ?", stale)
+
+    def _remember(self, key: str, value, size: int):
+        with self._lock:
+            if size > self.max_bytes or key in self._entries:
+                return
+            self._entries[key] = (value, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.bytes -= evicted
+                self.evictions += 1
+
+    def get_or_compute(self, key: str, compute: Callable):
+        """Return the cached value for ``key``, computing and storing it on a miss.
+
+        Values must be JSON-serializable; they are shared between callers, so
+        callers must not modify them.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+            else:
+                self.shared += 1
+        if not owner:
+            return future.result()
+
+        try:
+            text = self._disk_get(key) if self.directory else None
+            if text is not None:
+                value = json.loads(text)
+                with self._lock:
+                    self.disk_hits += 1
+            else:
+                value = compute()
+                text = json.dumps(value, separators=(",", ":"))
+                with self._lock:
+                    self.misses += 1
+                if self.directory:
+                    self._disk_put(key, text, len(text))
+            self._remember(key, value, len(text))
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "disk": self.directory is not None,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "shared": self.shared,
+                "evictions": self.evictions,
+            }
+
+
+response_cache = ResponseCache()
+
+
+def abbreviate(git_dir: str, oids: List[str], length: int) -> dict:
+    """Map full commit names to the shortest unique prefix of at least ``length``."""
+    if not oids:
+        return {}
+    out = git_output(
+        ["--git-dir", git_dir, "log", "--no-walk=unsorted", "--stdin", f"--abbrev={max(length, 4)}", "--format=%H %h"],
+        input="".join(f"{oid}\n" for oid in oids).encode(),
+    )
+    return dict(line.split(" ", 1) for line in out.decode().splitlines())
+
+
+def commit_records(git_dir: str, records: List[dict], abbrev: Optional[int], body: bool) -> List[dict]:
+    """Apply the abbrev/body output options to commit records in place."""
+    if abbrev:
+        short = abbreviate(git_dir, [record["hash"] for record in records], abbrev)
+        for record in records:
+            record["hash"] = short[record["hash"]]
+    if not body:
+        for record in records:
+            record["message"] = record["message"].split("\n\n", 1)[0].replace("\n", " ")
+    return records
+
+
+_STATUS_CODES = {
+    "M": "modified",
+    "T": "type changed",
+    "A": "added",
+    "D": "deleted",
+    "R": "renamed",
+    "C": "copied",
+}
+_CONFLICT_CODES = {
+    "DD": "both deleted",
+    "AU": "added by us",
+    "UD": "deleted by them",
+    "UA": "added by them",
+    "DU": "deleted by us",
+    "AA": "both added",
+    "UU": "both modified",
+}
+
+
+@functools.lru_cache(maxsize=None)
+def fsmonitor_supported() -> bool:
+    proc = git_popen(
+        ["fsmonitor--daemon", "status"],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+    )
+    _, err = proc.communicate()
+    return b"not supported" not in err and b"is not a git command" not in err
+
+
+def configure_status(path: str, untracked_cache: Optional[bool], fsmonitor: Optional[bool]) -> dict:
+    """Persist the status accelerations a repository opted into."""
+    settings = {}
+    if untracked_cache is not None:
+        git_output(["config", "core.untrackedCache", "true" if untracked_cache else "false"], cwd=path)
+        git_output(["update-index", "--untracked-cache" if untracked_cache else "--no-untracked-cache"], cwd=path)
+        settings["untracked_cache"] = untracked_cache
+    if fsmonitor is not None:
+        if fsmonitor and not fsmonitor_supported():
+            settings["fsmonitor"] = "unsupported"
+        else:
+            git_output(["config", "core.fsmonitor", "true" if fsmonitor else "false"], cwd=path)
+            if not fsmonitor and fsmonitor_supported():
+                git_popen(["fsmonitor--daemon", "stop"], cwd=path, stdin=subprocess.DEVNULL,
+                          stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).wait()
+            settings["fsmonitor"] = fsmonitor
+    return settings
+
+
+def parse_status_v2(data: bytes) -> dict:
+    """Parse ``git status --porcelain=v2 --branch -z`` output."""
+    status = {
+        "branch": {
+            "head": None,
+            "oid": None,
+            "detached": False,
+            "upstream": None,
+            "ahead": None,
+            "behind": None,
+        },
+        "staged": [],
+        "unstaged": [],
+        "untracked": [],
+        "conflicted": [],
+    }
+    branch = status["branch"]
+    fields = iter(data.split(b"\0"))
+    for raw in fields:
+        if not raw:
+            continue
+        entry = raw.decode("utf-8", "surrogateescape")
+        kind = entry[0]
+        if kind == "#":
+            _, key, value = entry.split(" ", 2)
+            if key == "branch.oid":
+                branch["oid"] = None if value == "(initial)" else value
+            elif key == "branch.head":
+                if value == "(detached)":
+                    branch["detached"] = True
+                else:
+                    branch["head"] = value
+            elif key == "branch.upstream":
+                branch["upstream"] = value
+            elif key == "branch.ab":
+                ahead, behind = value.split()
+                branch["ahead"], branch["behind"] = int(ahead), -int(behind)
+        elif kind in "12":
+            parts = entry.split(" ", 9 if kind == "2" else 8)
+            xy, path = parts[1], parts[-1]
+            item = {"path": path}
+            if kind == "2":
+                item["orig_path"] = next(fields).decode("utf-8", "surrogateescape")
+                item["score"] = parts[8]
+            if parts[2] != "N...":
+                item["submodule"] = parts[2]
+            if xy[0] != ".":
+                status["staged"].append(dict(item, status=_STATUS_CODES.get(xy[0], xy[0])))
+            if xy[1] != ".":
+                status["unstaged"].append(dict(item, status=_STATUS_CODES.get(xy[1], xy[1])))
+        elif kind == "u":
+            parts = entry.split(" ", 10)
+            status["conflicted"].append({"path": parts[-1], "status": _CONFLICT_CODES.get(parts[1], parts[1])})
+        elif kind == "?":
+            status["untracked"].append(entry[2:])
+    status["clean"] = not (status["staged"] or status["unstaged"] or status["untracked"] or status["conflicted"])
+    return status
+
+
+GIT_MCP_WATCH = os.environ.get("GIT_MCP_WATCH", "").lower() in ("1", "true", "yes", "on")
+GIT_MCP_WATCH_IDLE = float(os.environ.get("GIT_MCP_WATCH_IDLE", 600))
+GIT_MCP_WATCH_MAX_REPOS = int(os.environ.get("GIT_MCP_WATCH_MAX_REPOS", 16))
+GIT_MCP_WATCH_MAX_DIRTY = int(os.environ.get("GIT_MCP_WATCH_MAX_DIRTY", 4096))
+GIT_MCP_WATCH_MAX_DIRS = int(os.environ.get("GIT_MCP_WATCH_MAX_DIRS", 65536))
+GIT_MCP_WATCH_MAX_FILES = int(os.environ.get("GIT_MCP_WATCH_MAX_FILES", 100000))
+GIT_MCP_WATCH_POLL = float(os.environ.get("GIT_MCP_WATCH_POLL", 2.0))
+
+# Above this many changed paths a partial re-check costs more than a full scan.
+_MAX_PARTIAL_PATHS = 512
+
+_IN_MODIFY = 0x2
+_IN_ATTRIB = 0x4
+_IN_CLOSE_WRITE = 0x8
+_IN_MOVED_FROM = 0x40
+_IN_MOVED_TO = 0x80
+_IN_CREATE = 0x100
+_IN_DELETE = 0x200
+_IN_DELETE_SELF = 0x400
+_IN_MOVE_SELF = 0x800
+_IN_Q_OVERFLOW = 0x4000
+_IN_IGNORED = 0x8000
+_IN_ONLYDIR = 0x1000000
+_IN_DONT_FOLLOW = 0x2000000
+_IN_EXCL_UNLINK = 0x4000000
+_IN_ISDIR = 0x40000000
+_IN_WATCH_MASK = (
+    _IN_MODIFY | _IN_ATTRIB | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE
+    | _IN_DELETE | _IN_DELETE_SELF | _IN_MOVE_SELF | _IN_ONLYDIR | _IN_DONT_FOLLOW | _IN_EXCL_UNLINK
+)
+_INOTIFY_EVENT = struct.Struct("iIII")
+
+
+class WatchOverflow(Exception):
+    pass
+
+
+@functools.lru_cache(maxsize=None)
+def _libc():
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+def scan_worktree(worktree: str, max_dirs: int) -> tuple:
+    """Breadth-first list of watchable directories, skipping .git, ignored and nested repos.
+
+    Returns ``(dirs, nested)`` as worktree-relative paths; ``""`` is the root.
+    """
+    dirs = []
+    nested = set()
+    level = [""]
+    while level:
+        dirs.extend(level)
+        if len(dirs) > max_dirs:
+            raise WatchOverflow(f"more than {max_dirs} directories")
+        children = []
+        for rel in level:
+            try:
+                with os.scandir(os.path.join(worktree, rel)) as it:
+                    for entry in it:
+                        if entry.name == ".git" or not entry.is_dir(follow_symlinks=False):
+                            continue
+                        child = f"{rel}/{entry.name}" if rel else entry.name
+                        if os.path.lexists(os.path.join(entry.path, ".git")):
+                            nested.add(child)
+                        else:
+                            children.append(child)
+            except OSError:
+                continue
+        if children:
+            out = check_ignored(worktree, children)
+            children = [child for child in children if child not in out]
+        level = children
+    return dirs, nested
+
+
+def check_ignored(worktree: str, paths: List[str]) -> set:
+    proc = git_popen(
+        ["check-ignore", "-z", "--stdin"],
+        cwd=worktree,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+    )
+    out, _ = proc.communicate(b"".join(p.encode("utf-8", "surrogateescape") + b"/\0" for p in paths))
+    return {p.decode("utf-8", "surrogateescape").rstrip("/") for p in out.split(b"\0") if p}
+
+
+class _InotifyBackend:
+    def __init__(self, worktree: str, max_dirs: int):
+        self.worktree = worktree
+        self.max_dirs = max_dirs
+        self.degraded = False
+        self._libc = _libc()
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._dirs = {}
+        try:
+            dirs, self.nested = scan_worktree(worktree, max_dirs)
+            for rel in dirs:
+                self._add(rel)
+        except BaseException:
+            os.close(self.fd)
+            raise
+
+    def _add(self, rel: str):
+        if len(self._dirs) >= self.max_dirs:
+            raise WatchOverflow(f"more than {self.max_dirs} directories")
+        path = os.path.join(self.worktree, rel).encode("utf-8", "surrogateescape")
+        wd = self._libc.inotify_add_watch(self.fd, path, _IN_WATCH_MASK)
+        if wd < 0:
+            errno_ = ctypes.get_errno()
+            if errno_ in (errno.ENOENT, errno.ENOTDIR):
+                return
+            raise WatchOverflow(os.strerror(errno_))
+        self._dirs[wd] = rel
+
+    def read(self) -> set:
+        """Drain pending events into a set of changed worktree-relative paths."""
+        changed = set()
+        created = []
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = _INOTIFY_EVENT.unpack_from(data, offset)
+                offset += _INOTIFY_EVENT.size
+                name = data[offset:offset + length].rstrip(b"\0").decode("utf-8", "surrogateescape")
+                offset += length
+                if mask & _IN_Q_OVERFLOW:
+                    raise WatchOverflow("inotify queue overflow")
+                if mask & _IN_IGNORED:
+                    self._dirs.pop(wd, None)
+                    continue
+                parent = self._dirs.get(wd)
+                if parent is None:
+                    continue
+                if not name:
+                    if parent:
+                        changed.add(parent)
+                    continue
+                rel = f"{parent}/{name}" if parent else name
+                changed.add(rel)
+                if mask & _IN_ISDIR and mask & (_IN_CREATE | _IN_MOVED_TO):
+                    created.append(rel)
+        if created:
+            try:
+                self._watch_new(created)
+            except (WatchOverflow, OSError):
+                # Part of the tree is now unwatched; only a rebuild can recover.
+                self.degraded = True
+                raise WatchOverflow("cannot watch new directories")
+        return changed
+
+    def _watch_new(self, created: List[str]):
+        ignored = check_ignored(self.worktree, created)
+        for rel in created:
+            if rel in ignored:
+                continue
+            if os.path.lexists(os.path.join(self.worktree, rel, ".git")):
+                self.nested.add(rel)
+                continue
+            dirs, nested = scan_worktree(os.path.join(self.worktree, rel), self.max_dirs)
+            self.nested.update(f"{rel}/{n}" for n in nested)
+            for sub in dirs:
+                self._add(f"{rel}/{sub}" if sub else rel)
+
+    def close(self):
+        os.close(self.fd)
+
+
+class _PollBackend:
+    def __init__(self, worktree: str, max_dirs: int, max_files: int):
+        self.worktree = worktree
+        self.max_dirs = max_dirs
+        self.max_files = max_files
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._last = 0.0
+        self.degraded = False
+        self._snapshot = self._scan()
+
+    def _scan(self) -> dict:
+        dirs, self.nested = scan_worktree(self.worktree, self.max_dirs)
+        snapshot = {}
+        for rel in dirs:
+            try:
+                with os.scandir(os.path.join(self.worktree, rel)) as it:
+                    for entry in it:
+                        if entry.name == ".git":
+                            continue
+                        try:
+                            st = entry.stat(follow_symlinks=False)
+                        except OSError:
+                            continue
+                        child = f"{rel}/{entry.name}" if rel else entry.name
+                        snapshot[child] = (st.st_mtime_ns, st.st_size, st.st_ino, st.st_mode)
+            except OSError:
+                continue
+            if len(snapshot) > self.max_files:
+                raise WatchOverflow(f"more than {self.max_files} files")
+        self._last = time.monotonic()
+        return snapshot
+
+    def poll(self):
+        if time.monotonic() - self._last < GIT_MCP_WATCH_POLL:
+            return
+        try:
+            snapshot = self._scan()
+        except WatchOverflow:
+            self.degraded = True
+            return
+        old = self._snapshot
+        changed = {rel for rel, st in snapshot.items() if old.get(rel) != st}
+        changed.update(rel for rel in old if rel not in snapshot)
+        self._snapshot = snapshot
+        with self._lock:
+            self._pending |= changed
+
+    def read(self) -> set:
+        if self.degraded:
+            raise WatchOverflow("too many files to poll")
+        with self._lock:
+            changed, self._pending = self._pending, set()
+        return changed
+
+    def close(self):
+        self._snapshot = {}
+
+
+class _StatusEntry:
+    __slots__ = ("text", "status", "pending")
+
+    def __init__(self, text: str, status: Optional[dict]):
+        self.text = text
+        self.status = status
+        self.pending = set()
+
+
+# Files whose change can alter the status of paths that did not change.
+_STATUS_RULE_FILES = frozenset((".gitignore", ".gitattributes"))
+
+
+class RepoWatch:
+    """Dirty-path tracking and cached status for one worktree."""
+
+    def __init__(self, worktree: str, git_dir: str, backend):
+        self.worktree = worktree
+        self.git_dir = git_dir
+        self.backend = backend
+        self.lock = threading.Lock()
+        self._excludes_file = None
+        self._config_stamp = None
+        self.signature = self._signature()
+        self.entries = {}
+        self.last_used = time.monotonic()
+        self._tracked_dirs = None
+        self.hits = 0
+        self.partial = 0
+        self.full = 0
+
+    def _signature(self) -> tuple:
+        """repo_signature plus the ignore rules kept outside the worktree."""
+        common = _common_dir(self.git_dir)
+        config = _stat_signature(os.path.join(common, "config"))
+        if config != self._config_stamp:
+            try:
+                self._excludes_file = git_output(
+                    ["config", "--path", "--get", "core.excludesFile"], cwd=self.worktree
+                ).decode("utf-8", "surrogateescape").strip()
+            except git.GitCommandError:
+                xdg = os.environ.get("XDG_CONFIG_HOME") or os.path.join(os.path.expanduser("~"), ".config")
+                self._excludes_file = os.path.join(xdg, "git", "ignore")
+            self._config_stamp = config
+        return repo_signature(self.git_dir) + (
+            config,
+            _stat_signature(os.path.join(common, "info", "exclude")),
+            _stat_signature(self._excludes_file),
+        )
+
+    def _collect(self):
+        try:
+            changed = self.backend.read()
+        except WatchOverflow:
+            self.entries.clear()
+            return
+        if len(changed) > GIT_MCP_WATCH_MAX_DIRTY:
+            self.entries.clear()
+            return
+        if not changed:
+            return
+        for key, entry in list(self.entries.items()):
+            entry.pending |= changed
+            if len(entry.pending) > GIT_MCP_WATCH_MAX_DIRTY:
+                del self.entries[key]
+
+    def drain(self):
+        with self.lock:
+            self._collect()
+
+    def _tracked(self) -> set:
+        if self._tracked_dirs is None:
+            out = git_output(["--no-optional-locks", "ls-files", "-z"], cwd=self.worktree)
+            dirs = set()
+            for name in out.split(b"\0"):
+                parent = name.decode("utf-8", "surrogateescape").rpartition("/")[0]
+                while parent and parent not in dirs:
+                    dirs.add(parent)
+                    parent = parent.rpartition("/")[0]
+            self._tracked_dirs = dirs
+        return self._tracked_dirs
+
+    def _pathspecs(self, pending: set, untracked: str) -> List[str]:
+        nested = self.backend.nested
+        tracked = self._tracked() if untracked == "normal" else None
+        specs = set()
+        for rel in pending:
+            parts = rel.split("/")
+            for i in range(1, len(parts)):
+                if "/".join(parts[:i]) in nested:
+                    rel = "/".join(parts[:i])
+                    break
+            if tracked is not None:
+                # Match the full scan's collapsing of wholly untracked directories.
+                parts = rel.split("/")
+                for i in range(1, len(parts)):
+                    if "/".join(parts[:i]) not in tracked:
+                        rel = "/".join(parts[:i])
+                        break
+            if rel:
+                specs.add(rel)
+        return sorted(specs)
+
+    def _run(self, untracked: str, structured: bool, pathspecs: Optional[List[str]] = None) -> bytes:
+        if structured:
+            command = ["--no-optional-locks", "status", "--porcelain=v2", "--branch", "-z"]
+        else:
+            command = ["--no-optional-locks", "status"]
+        command.append(f"--untracked-files={untracked}")
+        if pathspecs is not None:
+            command += ["--", *_literal(pathspecs)]
+        return git_output(command, cwd=self.worktree)
+
+    def status(self, untracked: str, structured: bool, fmt: str = "json") -> Optional[str]:
+        with self.lock:
+            self.last_used = time.monotonic()
+            self._collect()
+            if self.backend.degraded:
+                return None
+            signature = self._signature()
+            if signature != self.signature:
+                self.entries.clear()
+                self._tracked_dirs = None
+                self.signature = signature
+
+            key = (untracked, structured, fmt if structured else None)
+            entry = self.entries.get(key)
+            if entry is not None and not entry.pending:
+                self.hits += 1
+                return entry.text
+
+            if (
+                entry is not None and structured and len(entry.pending) <= _MAX_PARTIAL_PATHS
+                and not any(rel.rpartition("/")[2] in _STATUS_RULE_FILES for rel in entry.pending)
+            ):
+                specs = self._pathspecs(entry.pending, untracked)
+                entry.pending = set()
+                if not specs:
+                    self.hits += 1
+                    return entry.text
+                fresh = parse_status_v2(self._run(untracked, True, specs))
+                status = entry.status
+                status["branch"] = fresh["branch"]
+                for kind in ("staged", "unstaged", "untracked", "conflicted"):
+                    kept = [item for item in status[kind] if not _touched(item, specs)]
+                    kept.extend(fresh[kind])
+                    kept.sort(key=_entry_path)
+                    status[kind] = kept
+                status["clean"] = not (status["staged"] or status["unstaged"] or status["untracked"] or status["conflicted"])
+                entry.text = encode_result(status, fmt)
+                self.partial += 1
+                return entry.text
+
+            out = self._run(untracked, structured)
+            if structured:
+                status = parse_status_v2(out)
+                entry = _StatusEntry(encode_result(status, fmt), status)
+            else:
+                entry = _StatusEntry(out.decode("utf-8", "replace").rstrip("\n"), None)
+            self.entries[key] = entry
+            self.full += 1
+            return entry.text
+
+    def close(self):
+        with self.lock:
+            self.entries.clear()
+            self.backend.close()
+
+
+def _entry_path(item) -> str:
+    return item if isinstance(item, str) else item["path"]
+
+
+def _touched(item, specs: List[str]) -> bool:
+    path = _entry_path(item).rstrip("/")
+    return any(path == spec or path.startswith(spec + "/") for spec in specs)
+
+
+class StatusWatcher:
+    """Keeps watched worktrees' status in memory and re-checks only changed paths.
+
+    Linux uses inotify; elsewhere, or when a tree needs more watches than
+    allowed, a background thread polls file stats every ``GIT_MCP_WATCH_POLL``
+    seconds, so polled answers may lag by up to that interval. Repos unused
+    for ``GIT_MCP_WATCH_IDLE`` seconds are torn down.
+    """
+
+    def __init__(self, max_repos: int = GIT_MCP_WATCH_MAX_REPOS, idle: float = GIT_MCP_WATCH_IDLE,
+                 use_inotify: bool = True):
+        self.max_repos = max_repos
+        self.idle = idle
+        self.use_inotify = use_inotify and _libc() is not None
+        self._repos = collections.OrderedDict()
+        self._unwatchable = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    def _create(self, worktree: str, git_dir: str) -> Optional[RepoWatch]:
+        if self.use_inotify:
+            try:
+                return RepoWatch(worktree, git_dir, _InotifyBackend(worktree, GIT_MCP_WATCH_MAX_DIRS))
+            except (WatchOverflow, OSError):
+                pass
+        try:
+            return RepoWatch(worktree, git_dir, _PollBackend(worktree, GIT_MCP_WATCH_MAX_DIRS, GIT_MCP_WATCH_MAX_FILES))
+        except (WatchOverflow, OSError):
+            return None
+
+    def watch(self, path: str) -> Optional[RepoWatch]:
+        git_dir = find_git_dir(path)
+        worktree = os.path.realpath(path)
+        if worktree == git_dir:
+            return None
+        with self._lock:
+            watch = self._repos.get(git_dir)
+            if watch is not None:
+                self._repos.move_to_end(git_dir)
+                return watch
+            if time.monotonic() - self._unwatchable.get(git_dir, -self.idle) < self.idle:
+                return None
+        watch = self._create(worktree, git_dir)
+        evicted = []
+        with self._lock:
+            if watch is None:
+                self._unwatchable[git_dir] = time.monotonic()
+                return None
+            existing = self._repos.get(git_dir)
+            if existing is not None:
+                evicted.append(watch)
+                watch = existing
+            else:
+                self._repos[git_dir] = watch
+                while len(self._repos) > self.max_repos:
+                    evicted.append(self._repos.popitem(last=False)[1])
+            self._ensure_thread()
+        for old in evicted:
+            old.close()
+        return watch
+
+    def status(self, path: str, untracked: str = "normal", structured: bool = False,
+               fmt: str = "json") -> Optional[str]:
+        """Return the cached or incrementally refreshed status, or None if the repo can't be watched."""
+        watch = self.watch(path)
+        if watch is None:
+            return None
+        text = watch.status(untracked, structured, fmt)
+        if text is None:
+            self.forget(path)
+        return text
+
+    def forget(self, path: str):
+        with self._lock:
+            watch = self._repos.pop(_repo_key(path), None)
+        if watch is not None:
+            watch.close()
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="git-mcp-watcher", daemon=True)
+            self._thread.start()
+
+    def _loop(self):
+        interval = min(GIT_MCP_WATCH_POLL, 1.0)
+        while not self._stop.wait(interval):
+            now = time.monotonic()
+            idle = []
+            with self._lock:
+                for git_dir, watch in list(self._repos.items()):
+                    if now - watch.last_used > self.idle:
+                        idle.append(self._repos.pop(git_dir))
+                watches = list(self._repos.values())
+                if not watches and not idle:
+                    self._thread = None
+                    return
+            for watch in idle:
+                watch.close()
+            for watch in watches:
+                if isinstance(watch.backend, _PollBackend):
+                    watch.backend.poll()
+                # Draining regularly coalesces event storms into the dirty set
+                # and keeps the kernel queue from overflowing.
+                if watch.lock.acquire(blocking=False):
+                    try:
+                        watch._collect()
+                    finally:
+                        watch.lock.release()
+
+    def close(self):
+        self._stop.set()
+        with self._lock:
+            watches = list(self._repos.values())
+            self._repos.clear()
+        for watch in watches:
+            watch.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            watches = list(self._repos.values())
+        return {
+            "repos": len(watches),
+            "backends": collections.Counter(
+                "inotify" if isinstance(w.backend, _InotifyBackend) else "poll" for w in watches
+            ),
+            "hits": sum(w.hits for w in watches),
+            "partial_refreshes": sum(w.partial for w in watches),
+            "full_scans": sum(w.full for w in watches),
+        }
+
+
+status_watcher = StatusWatcher() if GIT_MCP_WATCH else None
+
+
+@tool("git_status", "Get git repository status", GitStatusArgs,
+      write=lambda args: args.untracked_cache is not None or args.fsmonitor is not None)
+def _git_status(args: GitStatusArgs) -> str:
+    settings = configure_status(args.path, args.untracked_cache, args.fsmonitor)
+    untracked = args.untracked_files or "normal"
+    if untracked not in ("no", "normal", "all"):
+        raise ValueError(f"Unknown untracked_files mode: {untracked}")
+    fmt = check_format(args.format)
+
+    if status_watcher is not None:
+        if settings:
+            status_watcher.forget(args.path)
+        else:
+            cached = status_watcher.status(args.path, untracked, bool(args.structured), fmt)
+            if cached is not None:
+                return cached
+
+    if not args.structured:
+        out = git_output(["status", f"--untracked-files={untracked}"], cwd=args.path)
+        return out.decode("utf-8", "replace").rstrip("\n")
+
+    out = git_output(
+        ["status", "--porcelain=v2", "--branch", "-z", f"--untracked-files={untracked}"],
+        cwd=args.path,
+    )
+    status = parse_status_v2(out)
+    if settings:
+        status["settings"] = settings
+    return encode_result(status, fmt)
+
+
+def read_commits(reader: CatFileReader, oids: Iterable[str]) -> Iterator[CommitInfo]:
+    batch = []
+    for oid in oids:
+        batch.append(oid)
+        if len(batch) >= 256:
+            for obj in reader.read_many(batch):
+                if obj is not None and obj[1] == "commit":
+                    yield parse_commit(obj[0], obj[2])
+            batch = []
+    for obj in reader.read_many(batch):
+        if obj is not None and obj[1] == "commit":
+            yield parse_commit(obj[0], obj[2])
+
+
+@contextlib.contextmanager
+def rev_list(git_dir: str, options: List[str], revs: List[str]):
+    """Run ``git rev-list`` with revisions fed on stdin and yield its output lines."""
+    args = ["--git-dir", git_dir, "rev-list", *options, "--stdin"]
+    with git_stream(args, stdin=subprocess.PIPE) as proc:
+        proc.stdin.write("".join(rev + "\n" for rev in revs).encode())
+        proc.stdin.close()
+
+        def lines():
+            for line in proc.stdout:
+                yield line.decode().split()
+            err = proc.stderr.read()
+            if proc.wait():
+                raise git.GitCommandError(["git", *args], proc.returncode, err)
+
+        yield lines()
+
+
+def iter_commits(reader: CatFileReader, revs: List[str]) -> Iterator[CommitInfo]:
+    """Stream commits from ``git rev-list`` through a persistent cat-file reader."""
+    options = [rev for rev in revs if rev.startswith("--")]
+    revs = [rev for rev in revs if not rev.startswith("--")]
+    with rev_list(reader.git_dir, options, revs) as lines:
+        yield from read_commits(reader, (line[0] for line in lines))
+
+
+_OID_RE = re.compile(r"\^?[0-9a-f]{40}([0-9a-f]{24})?")
+
+
+def encode_cursor(state: dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps(state, separators=(",", ":")).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> dict:
+    try:
+        state = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        revs = state["tips"] + state["not"]
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise ValueError("Invalid cursor")
+    if not all(isinstance(rev, str) and _OID_RE.fullmatch(rev) for rev in revs):
+        raise ValueError("Invalid cursor")
+    return state
+
+
+def resolve_revs(git_dir: str, rev: str) -> tuple:
+    """Resolve a revision or range once into (positive oids, negative oids)."""
+    if rev.startswith("-"):
+        raise ValueError(f"Invalid revision: {rev}")
+    tips, exclude = [], []
+    for line in git_output(["--git-dir", git_dir, "rev-parse", rev, "--"]).decode().splitlines():
+        if line == "--":
+            break
+        if line.startswith("^"):
+            exclude.append(line[1:])
+        else:
+            tips.append(line)
+    return tips, exclude
+
+
+class LogPage:
+    """One page of a history walk; ``next_cursor`` is set once ``commits`` is exhausted.
+
+    The cursor stores the walk frontier (commits queued but not yet visited)
+    together with the excluded revisions, so the next page restarts git's
+    date-ordered walk exactly where this one stopped regardless of depth.
+    Clock skew (a parent dated after its child) across a page boundary can
+    repeat a commit on the next page, since the cursor does not carry the
+    set of commits already visited.
+    """
+
+    def __init__(self, reader: CatFileReader, args: GitLogArgs, revs: tuple):
+        tips, self.exclude = revs
+        self.reader = reader
+        self.tips = tips
+        self.limit = args.limit
+        self.walk_options = [f"--since={args.since}"] if args.since else []
+        self.filter_options = []
+        if args.until:
+            self.filter_options.append(f"--until={args.until}")
+        if args.author:
+            self.filter_options.append(f"--author={args.author}")
+        self.next_cursor = None
+
+    @property
+    def revs(self) -> List[str]:
+        return self.tips + ["^" + oid for oid in self.exclude]
+
+    def _matches(self) -> Iterator[str]:
+        options = self.walk_options + self.filter_options
+        if self.limit is None:
+            with rev_list(self.reader.git_dir, options, self.revs) as lines:
+                for line in lines:
+                    yield line[0]
+            return
+
+        options.append(f"--max-count={self.limit + 1}")
+        if not self.filter_options:
+            # Every walked commit is shown, so the frontier falls out of --parents.
+            frontier = dict.fromkeys(self.tips)
+            with rev_list(self.reader.git_dir, options + ["--parents"], self.revs) as lines:
+                for count, line in enumerate(lines):
+                    if count == self.limit:
+                        self.next_cursor = self._cursor(frontier)
+                        break
+                    frontier.pop(line[0], None)
+                    frontier.update(dict.fromkeys(line[1:]))
+                    yield line[0]
+            return
+
+        # Filters hide commits that are still walked, so replay the unfiltered
+        # walk up to the last match to recover the frontier.
+        last = None
+        more = False
+        with rev_list(self.reader.git_dir, options, self.revs) as lines:
+            for count, line in enumerate(lines):
+                if count == self.limit:
+                    more = True
+                    break
+                last = line[0]
+                yield last
+        if more:
+            frontier = dict.fromkeys(self.tips)
+            with rev_list(self.reader.git_dir, self.walk_options + ["--parents"], self.revs) as lines:
+                for line in lines:
+                    frontier.pop(line[0], None)
+                    frontier.update(dict.fromkeys(line[1:]))
+                    if line[0] == last:
+                        break
+            self.next_cursor = self._cursor(frontier)
+
+    def _cursor(self, frontier: dict) -> str:
+        return encode_cursor({"tips": list(frontier), "not": self.exclude})
+
+    @property
+    def commits(self) -> Iterator[CommitInfo]:
+        return read_commits(self.reader, self._matches())
+
+
+def iter_json_array(items: Iterable) -> Iterator[str]:
+    """Serialize items like ``json.dumps(list, indent=2)`` one element at a time."""
+    first = True
+    for item in items:
+        yield "[\n  " if first else ",\n  "
+        yield json.dumps(item, indent=2).replace("\n", "\n  ")
+        first = False
+    yield "[]" if first else "\n]"
+
+
+def log_revs(git_dir: str, args: GitLogArgs) -> tuple:
+    """The (tips, excluded) oids a log request walks: from its cursor, or ``rev`` resolved now."""
+    if args.cursor:
+        state = decode_cursor(args.cursor)
+        return state["tips"], state["not"]
+    return resolve_revs(git_dir, args.rev or "HEAD")
+
+
+def log_page(reader: CatFileReader, args: GitLogArgs, revs: tuple) -> List[str]:
+    fmt = check_format(args.format)
+    page = LogPage(reader, args, revs)
+    records = (
+        {
+            "hash": commit.hexsha,
+            "author": commit.author_name,
+            "date": commit.committed_datetime.isoformat(),
+            "message": commit.message.strip(),
+        }
+        for commit in page.commits
+    )
+    if fmt == "json" and not args.abbrev and args.body is not False:
+        text = "".join(iter_json_array(records))
+    else:
+        records = commit_records(reader.git_dir, list(records), args.abbrev, args.body is not False)
+        text = encode_result(records, fmt)
+    if page.next_cursor:
+        return [text, json.dumps({"next_cursor": page.next_cursor})]
+    return [text]
+
+
+@tool("git_log", "Get git commit history", GitLogArgs)
+def _git_log(args: GitLogArgs) -> List[str]:
+    fmt = check_format(args.format)
+    # An empty page would hand back the cursor it was given.
+    if args.limit is not None and args.limit < 1:
+        raise ValueError("limit must be at least 1")
+    with repo_cache.object_reader(args.path) as reader:
+        revs = log_revs(reader.git_dir, args)
+        # Relative dates ("2 weeks ago") move with the clock and abbreviations
+        # can grow as objects are added, so only the rest is cached.
+        if args.since or args.until or args.abbrev:
+            return log_page(reader, args, revs)
+        key = ResponseCache.key("git_log", reader.git_dir, revs, args.limit, args.author, fmt, args.body)
+        return response_cache.get_or_compute(key, lambda: log_page(reader, args, revs))
+
+
+GIT_MCP_INDEX_DIR = os.environ.get("GIT_MCP_INDEX_DIR")
+
+_INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS commits (
+    id INTEGER PRIMARY KEY,
+    oid TEXT NOT NULL UNIQUE,
+    author_name TEXT NOT NULL,
+    author_email TEXT NOT NULL,
+    author_time INTEGER NOT NULL,
+    committer_time INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    message TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS commits_committer_time ON commits (committer_time);
+CREATE TABLE IF NOT EXISTS paths (id INTEGER PRIMARY KEY, path TEXT NOT NULL UNIQUE);
+CREATE TABLE IF NOT EXISTS commit_paths (
+    path_id INTEGER NOT NULL,
+    commit_id INTEGER NOT NULL,
+    PRIMARY KEY (path_id, commit_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS commit_paths_commit ON commit_paths (commit_id);
+"""
+_INDEX_FTS = """
+CREATE VIRTUAL TABLE IF NOT EXISTS commits_fts USING fts5(message, content='commits', content_rowid='id');
+"""
+_INDEX_LOG_FORMAT = "--format=%x01%H%x00%an%x00%ae%x00%at%x00%ct%x00%cI%x00%B"
+_index_locks = collections.defaultdict(threading.Lock)
+
+
+def _sqlite_has_fts5() -> bool:
+    try:
+        sqlite3.connect(":memory:").execute("CREATE VIRTUAL TABLE t USING fts5(x)")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+class CommitIndex:
+    """On-disk SQLite index of commit metadata, message text and touched paths.
+
+    The index covers everything reachable from HEAD, branches, tags and
+    remote-tracking refs. Updates walk only from the previously indexed tips;
+    commits that dropped out of history (force-pushes, deleted branches) are
+    pruned, and the index is rebuilt if the old tips no longer exist.
+    """
+
+    def __init__(self, git_dir: str, db_path: Optional[str] = None):
+        self.git_dir = git_dir
+        common = _common_dir(git_dir)
+        if db_path is None:
+            if GIT_MCP_INDEX_DIR:
+                digest = hashlib.sha1(common.encode("utf-8", "surrogateescape")).hexdigest()
+                db_path = os.path.join(GIT_MCP_INDEX_DIR, digest + ".sqlite3")
+            else:
+                db_path = os.path.join(common, "git-mcp", "commits.sqlite3")
+        self.db_path = db_path
+        self.fts = _sqlite_has_fts5()
+
+    def _connect(self) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        db = sqlite3.connect(self.db_path, timeout=30)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.executescript(_INDEX_SCHEMA)
+        if self.fts:
+            db.executescript(_INDEX_FTS)
+        return db
+
+    def _tips(self) -> List[str]:
+        out = git_output([
+            "--git-dir", self.git_dir, "for-each-ref",
+            "--format=%(objecttype) %(objectname) %(*objecttype) %(*objectname)",
+            "refs/heads", "refs/tags", "refs/remotes",
+        ])
+        tips = set()
+        for line in out.decode().splitlines():
+            fields = line.split()
+            if fields[0] == "commit":
+                tips.add(fields[1])
+            elif len(fields) == 4 and fields[2] == "commit":
+                tips.add(fields[3])
+        try:
+            tips.add(git_output(["--git-dir", self.git_dir, "rev-parse", "--verify", "-q", "HEAD^{commit}"]).decode().strip())
+        except git.GitCommandError:
+            pass
+        return sorted(tips)
+
+    def _delete(self, db: sqlite3.Connection, oids: List[str]):
+        for start in range(0, len(oids), 500):
+            chunk = oids[start:start + 500]
+            marks = ",".join("?" * len(chunk))
+            rows = db.execute(f"SELECT id, message FROM commits WHERE oid IN ({marks})", chunk).fetchall()
+            if self.fts:
+                db.executemany(
+                    "INSERT INTO commits_fts (commits_fts, rowid, message) VALUES ('delete', ?, ?)", rows
+                )
+            ids = [(row[0],) for row in rows]
+            db.executemany("DELETE FROM commit_paths WHERE commit_id = ?", ids)
+            db.executemany("DELETE FROM commits WHERE id = ?", ids)
+
+    def _insert(self, db: sqlite3.Connection, tips: List[str], exclude: List[str]) -> int:
+        path_ids = {}
+        added = 0
+        with git_stream(
+            ["--git-dir", self.git_dir, "log", "-z", "--name-only", "--no-renames", _INDEX_LOG_FORMAT, "--stdin"],
+            stdin=subprocess.PIPE,
+        ) as proc:
+            proc.stdin.write("".join(f"{oid}\n" for oid in tips).encode())
+            proc.stdin.write("".join(f"^{oid}\n" for oid in exclude).encode())
+            proc.stdin.close()
+
+            def flush(commit, paths):
+                cursor = db.execute(
+                    "INSERT OR IGNORE INTO commits (oid, author_name, author_email, author_time,"
+                    " committer_time, date, message) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    commit,
+                )
+                if not cursor.rowcount:
+                    return 0
+                commit_id = cursor.lastrowid
+                if self.fts:
+                    db.execute("INSERT INTO commits_fts (rowid, message) VALUES (?, ?)", (commit_id, commit[6]))
+                rows = []
+                for path in paths:
+                    path_id = path_ids.get(path)
+                    if path_id is None:
+                        db.execute("INSERT OR IGNORE INTO paths (path) VALUES (?)", (path,))
+                        path_id = db.execute("SELECT id FROM paths WHERE path = ?", (path,)).fetchone()[0]
+                        if len(path_ids) < 100000:
+                            path_ids[path] = path_id
+                    rows.append((path_id, commit_id))
+                db.executemany("INSERT OR IGNORE INTO commit_paths (path_id, commit_id) VALUES (?, ?)", rows)
+                return 1
+
+            def tokens():
+                buffer = b""
+                while True:
+                    chunk = proc.stdout.read(1 << 16)
+                    if not chunk:
+                        break
+                    parts = (buffer + chunk).split(b"\0")
+                    buffer = parts.pop()
+                    yield from parts
+                if buffer:
+                    yield buffer
+
+            commit, paths = None, []
+            stream = tokens()
+            for token in stream:
+                if token.startswith(b"\x01"):
+                    if commit is not None:
+                        added += flush(commit, paths)
+                    oid, name, email, atime, ctime, date, message = [token[1:]] + [next(stream) for _ in range(6)]
+                    commit = (
+                        oid.decode(), name.decode("utf-8", "replace"), email.decode("utf-8", "replace"),
+                        int(atime), int(ctime), date.decode(), message.decode("utf-8", "replace").strip(),
+                    )
+                    paths = []
+                elif token.strip(b"\n"):
+                    paths.append(token.lstrip(b"\n").decode("utf-8", "surrogateescape"))
+            if commit is not None:
+                added += flush(commit, paths)
+            err = proc.stderr.read()
+            if proc.wait():
+                raise git.GitCommandError(["git", "log"], proc.returncode, err)
+        return added
+
+    def update(self) -> dict:
+        """Bring the index up to date with the repository's refs."""
+        with _index_locks[self.db_path]:
+            db = self._connect()
+            try:
+                row = db.execute("SELECT value FROM meta WHERE key = 'tips'").fetchone()
+                old = json.loads(row[0]) if row else []
+                tips = self._tips()
+                result = {"added": 0, "pruned": 0, "rebuilt": False}
+                if old == tips:
+                    return result
+                with db:
+                    if old:
+                        try:
+                            gone = git_output(
+                                ["--git-dir", self.git_dir, "rev-list", "--stdin"],
+                                input="".join([f"{oid}\n" for oid in old] + [f"^{oid}\n" for oid in tips]).encode(),
+                            ).decode().split()
+                        except git.GitCommandError:
+                            gone = None
+                        if gone is None:
+                            db.execute("DELETE FROM commit_paths")
+                            db.execute("DELETE FROM commits")
+                            db.execute("DELETE FROM paths")
+                            if self.fts:
+                                db.execute("INSERT INTO commits_fts (commits_fts) VALUES ('delete-all')")
+                            old = []
+                            result["rebuilt"] = True
+                        elif gone:
+                            self._delete(db, gone)
+                            result["pruned"] = len(gone)
+                    if tips:
+                        result["added"] = self._insert(db, tips, old)
+                    db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('tips', ?)", (json.dumps(tips),))
+                return result
+            finally:
+                db.close()
+
+    def search(self, query: Optional[str] = None, author: Optional[str] = None,
+               since: Optional[str] = None, until: Optional[str] = None,
+               path: Optional[str] = None, limit: int = 20) -> List[dict]:
+        sql = ["SELECT c.oid, c.author_name, c.author_email, c.date, c.message FROM commits c"]
+        where, params = [], []
+        if query:
+            if self.fts:
+                sql.append("JOIN commits_fts f ON f.rowid = c.id")
+                where.append("commits_fts MATCH ?")
+                params.append(query)
+            else:
+                where.append("c.message LIKE ?")
+                params.append(f"%{query}%")
+        if author:
+            where.append("(c.author_name LIKE ? OR c.author_email LIKE ?)")
+            params += [f"%{author}%", f"%{author}%"]
+        for option, value, op in (("--since", since, ">="), ("--until", until, "<=")):
+            if value:
+                age = git_output(["--git-dir", self.git_dir, "rev-parse", f"{option}={value}"]).decode()
+                where.append(f"c.committer_time {op} ?")
+                params.append(int(age.strip().split("=", 1)[1]))
+        if path:
+            path = path.strip("/")
+            where.append(
+                "c.id IN (SELECT cp.commit_id FROM paths p JOIN commit_paths cp ON cp.path_id = p.id"
+                " WHERE p.path = ? OR (p.path > ? AND p.path < ?))"
+            )
+            params += [path, path + "/", path + "0"]
+        if where:
+            sql.append("WHERE " + " AND ".join(where))
+        sql.append("ORDER BY c.committer_time DESC, c.id DESC LIMIT ?")
+        params.append(limit)
+
+        db = self._connect()
+        try:
+            rows = db.execute(" ".join(sql), params).fetchall()
+        finally:
+            db.close()
+        return [
+            {"hash": oid, "author": name, "email": email, "date": date, "message": message}
+            for oid, name, email, date, message in rows
+        ]
+
+
+@tool(
+    "git_search_commits",
+    "Search commit history by message text, author, date range or touched path using an on-disk index",
+    GitSearchCommitsArgs,
+)
+def _git_search_commits(args: GitSearchCommitsArgs) -> str:
+    check_format(args.format)
+    index = CommitIndex(find_git_dir(args.path))
+    if args.update:
+        index.update()
+    commits = index.search(
+        query=args.query,
+        author=args.author,
+        since=args.since,
+        until=args.until,
+        path=args.touched_path,
+        limit=args.limit or 20,
+    )
+    commit_records(index.git_dir, commits, args.abbrev, args.body is not False)
+    return encode_result(commits, args.format)
+
+
+GENERATED_FILES = frozenset((
+    "package-lock.json", "npm-shrinkwrap.json", "yarn.lock", "pnpm-lock.yaml",
+    "Cargo.lock", "poetry.lock", "Pipfile.lock", "Gemfile.lock", "composer.lock", "go.sum",
+))
+GENERATED_SUFFIXES = (".min.js", ".min.css", ".js.map", ".css.map", ".pb.go", "_pb2.py")
+
+_DIFF_OPTIONS = ["diff", "--no-color", "--no-ext-diff"]
+
+
+def _diff_command(args: GitDiffArgs) -> List[str]:
+    command = list(_DIFF_OPTIONS)
+    if args.staged:
+        command.append("--staged")
+    return command
+
+
+def diff_numstat(path: str, args: GitDiffArgs) -> List[dict]:
+    """List changed files with added/deleted line counts (``None`` for binary files)."""
+    out = git_output([*_diff_command(args), "--numstat", "-z", "--", *_literal(args.paths or [])], cwd=path)
+    files = []
+    fields = iter(out.split(b"\0"))
+    for field in fields:
+        if not field:
+            continue
+        added, deleted, name = field.split(b"\t", 2)
+        old_path = None
+        if not name:
+            old_path = next(fields).decode("utf-8", "surrogateescape")
+            name = next(fields)
+        binary = added == b"-"
+        files.append({
+            "path": name.decode("utf-8", "surrogateescape"),
+            "old_path": old_path,
+            "added": None if binary else int(added),
+            "deleted": None if binary else int(deleted),
+            "binary": binary,
+            "generated": False,
+        })
+    return files
+
+
+def mark_generated(path: str, files: List[dict], staged: bool = False):
+    """Flag generated files from gitattributes (linguist-generated) and well-known names."""
+    if not files:
+        return
+    command = ["check-attr", "-z", "--stdin", "linguist-generated"]
+    if staged:
+        command.insert(1, "--cached")
+    out = git_output(command, cwd=path, input=b"".join(f["path"].encode("utf-8", "surrogateescape") + b"\0" for f in files))
+    fields = out.split(b"\0")
+    attrs = {
+        fields[i].decode("utf-8", "surrogateescape"): fields[i + 2].decode()
+        for i in range(0, len(fields) - 2, 3)
+    }
+    for f in files:
+        value = attrs.get(f["path"], "unspecified")
+        if value in ("set", "true"):
+            f["generated"] = True
+        elif value == "unspecified":
+            name = f["path"].rsplit("/", 1)[-1]
+            f["generated"] = name in GENERATED_FILES or name.endswith(GENERATED_SUFFIXES)
+
+
+_SECTION_STARTS = (b"diff --git ", b"diff --cc ", b"diff --combined ", b"* Unmerged path ")
+
+
+def stream_diff_sections(path: str, command: List[str]) -> Iterator[tuple]:
+    """Yield ``(section index, line)`` from a streamed ``git diff``, one file section after another."""
+    with git_stream(command, cwd=path) as proc:
+        index = -1
+        for line in proc.stdout:
+            if line.startswith(_SECTION_STARTS):
+                index += 1
+            yield index, line
+        err = proc.stderr.read()
+        if proc.wait():
+            raise git.GitCommandError(["git", *command], proc.returncode, err)
+
+
+def page_wanted(page: List[dict], include_generated: bool, field: str) -> List[dict]:
+    """Mark the binary and generated files of ``page`` as skipped and return the files whose ``field`` is wanted."""
+    wanted = []
+    for f in page:
+        f["skipped"] = "binary" if f["binary"] else None
+        if f["generated"] and not include_generated and not f["binary"]:
+            f["skipped"] = "generated"
+        f[field] = None
+        f["truncated"] = False
+        if f["skipped"] is None:
+            wanted.append(f)
+    return wanted
+
+
+def section_pathspecs(files: List[dict]) -> List[str]:
+    """Literal pathspecs selecting the diff sections of ``files``, renames included."""
+    pathspecs = []
+    for f in files:
+        pathspecs.append(f["path"])
+        if f["old_path"]:
+            pathspecs.append(f["old_path"])
+    return _literal(pathspecs)
+
+
+def collect_sections(path: str, command: List[str], count: int, budget: Optional[int],
+                     new: Callable[[], dict], add: Callable[[dict, bytes, Optional[int]], Optional[int]]) -> List[dict]:
+    """Gather the first ``count`` file sections of a streamed diff within ``budget`` bytes.
+
+    ``new()`` starts the result of a file and ``add(result, line, room)`` takes
+    one of its lines, returning the bytes charged or None if the line does not
+    fit in ``room``. The first file is then kept, cut short and marked
+    truncated, so paging makes progress; any later file is dropped.
+    """
+    results = []
+    sections = stream_diff_sections(path, command)
+    try:
+        for index, line in sections:
+            if not 0 <= index < count:
+                continue
+            if index == len(results):
+                # Every file has a section, even a pure rename or mode change
+                # without hunks, and it starts with the "diff --git" line.
+                results.append(new())
+            used = add(results[index], line, budget)
+            if used is None:
+                if index == 0:
+                    results[0]["truncated"] = True
+                else:
+                    results.pop()
+                break
+            if budget is not None:
+                budget -= used
+    finally:
+        sections.close()
+    return results
+
+
+def page_end(page: List[dict], offset: int, total: int, wanted: List[dict],
+             results: List[dict]) -> Tuple[List[dict], Optional[int]]:
+    """Cut ``page`` after the last file whose diff was collected; return it with the next page's offset."""
+    next_offset = offset + len(page) if offset + len(page) < total else None
+    positions = {id(f): offset + i for i, f in enumerate(page)}
+    if results and results[-1]["truncated"]:
+        next_offset = positions[id(wanted[len(results) - 1])] + 1
+    elif len(results) < len(wanted):
+        next_offset = positions[id(wanted[len(results)])]
+    if next_offset is not None:
+        page = page[:next_offset - offset]
+    return page, next_offset
+
+
+def _bounded_patch(path: str, args: GitDiffArgs) -> str:
+    names = git_output([*_diff_command(args), "--name-only", "-z", "--", *_literal(args.paths or [])], cwd=path)
+    files = [{"path": name.decode("utf-8", "surrogateescape")} for name in names.split(b"\0") if name]
+    if not args.include_generated:
+        mark_generated(path, files, args.staged)
+    skipped = {i for i, f in enumerate(files) if f.get("generated")}
+
+    chunks, size, truncated = [], 0, False
+    limit = args.max_bytes
+    sections = stream_diff_sections(path, [*_diff_command(args), "--", *_literal(args.paths or [])])
+    try:
+        for index, line in sections:
+            if index in skipped:
+                continue
+            if limit is not None and size + len(line) > limit:
+                truncated = True
+                break
+            chunks.append(line)
+            size += len(line)
+    finally:
+        sections.close()
+
+    text = b"".join(chunks).decode("utf-8", "replace")
+    notes = []
+    if skipped:
+        notes.append(f"[skipped {len(skipped)} generated file(s): " + ", ".join(files[i]["path"] for i in sorted(skipped)[:20]) + "]")
+    if truncated:
+        notes.append(f"[diff truncated at {limit} bytes; use mode='files' to page through {len(files)} changed file(s)]")
+    if notes:
+        text = (text + "\n" if text else "") + "\n".join(notes)
+    return text
+
+
+def _paged_patches(path: str, args: GitDiffArgs) -> str:
+    files = diff_numstat(path, args)
+    mark_generated(path, files, args.staged)
+    offset = max(args.offset or 0, 0)
+    page = files[offset:offset + max(args.max_files or 1, 1)]
+    wanted = page_wanted(page, args.include_generated, "patch")
+
+    def add(result, line, room):
+        if room is not None and len(line) > room:
+            result["chunks"].append(line[:room])
+            return None
+        result["chunks"].append(line)
+        return len(line)
+
+    results = []
+    if wanted:
+        results = collect_sections(
+            path, [*_diff_command(args), "--", *section_pathspecs(wanted)], len(wanted), args.max_bytes,
+            lambda: {"chunks": [], "truncated": False}, add,
+        )
+    for f, result in zip(wanted, results):
+        f["patch"] = b"".join(result["chunks"]).decode("utf-8", "replace")
+        f["truncated"] = result["truncated"]
+    page, next_offset = page_end(page, offset, len(files), wanted, results)
+
+    return encode_result({
+        "files": page,
+        "total_files": len(files),
+        "next_offset": next_offset,
+    }, args.format, records="files")
+
+
+@tool("git_diff", "Show git diff", GitDiffArgs)
+def _git_diff(args: GitDiffArgs) -> str:
+    path = args.path
+    mode = args.mode or "patch"
+    check_format(args.format)
+
+    if mode == "patch":
+        return _bounded_patch(path, args) or "No changes"
+    if mode == "files":
+        return _paged_patches(path, args)
+    if mode == "stat":
+        files = diff_numstat(path, args)
+        mark_generated(path, files, args.staged)
+        return encode_result(files, args.format)
+    if mode == "name-only":
+        names = git_output([*_diff_command(args), "--name-only", "-z", "--", *_literal(args.paths or [])], cwd=path)
+        return "\n".join(name.decode("utf-8", "surrogateescape") for name in names.split(b"\0") if name) or "No changes"
+    raise ValueError(f"Unknown diff mode: {mode}")
+
+
+_TREE_STATUS = {"A": "added", "M": "modified", "D": "deleted", "R": "renamed", "C": "copied", "T": "type-changed"}
+_HUNK_RE = re.compile(rb"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@ ?(.*)$")
+
+
+def _detection_options(args: GitDiffRevsArgs) -> List[str]:
+    options = [f"-M{args.renames}%"] if args.renames else ["--no-renames"]
+    if args.copies:
+        options.append(f"-C{args.copies}%")
+    return options
+
+
+def tree_changes(path: str, base_tree: str, head_tree: str, args: GitDiffRevsArgs) -> List[dict]:
+    """List the files that differ between two trees, with modes, blob oids and line counts.
+
+    ``diff-tree`` descends only into subtrees whose oids differ, so the cost
+    follows the size of the change, not the size of the tree.
+    """
+    out = git_output([
+        "diff-tree", "-r", "-z", "--raw", "--numstat", *_detection_options(args),
+        base_tree, head_tree, "--", *_literal(args.paths or []),
+    ], cwd=path)
+    files, counts = [], []
+    fields = iter(out.split(b"\0"))
+    for field in fields:
+        if field.startswith(b":"):
+            old_mode, new_mode, old_oid, new_oid, status = field[1:].decode().split(" ")
+            name = next(fields).decode("utf-8", "surrogateescape")
+            old_path = None
+            if status[0] in "RC":
+                old_path, name = name, next(fields).decode("utf-8", "surrogateescape")
+            files.append({
+                "path": name,
+                "old_path": old_path,
+                "status": _TREE_STATUS.get(status[0], status[0]),
+                "similarity": int(status[1:]) if status[0] in "RC" else None,
+                "old_mode": None if old_mode == "000000" else old_mode,
+                "new_mode": None if new_mode == "000000" else new_mode,
+                "old_oid": None if set(old_oid) == {"0"} else old_oid,
+                "new_oid": None if set(new_oid) == {"0"} else new_oid,
+            })
+        elif field:
+            added, deleted, name = field.split(b"\t", 2)
+            if not name:
+                next(fields)
+                next(fields)
+            counts.append((added, deleted))
+    for f, (added, deleted) in zip(files, counts):
+        f["binary"] = added == b"-"
+        f["additions"] = None if f["binary"] else int(added)
+        f["deletions"] = None if f["binary"] else int(deleted)
+    return files
+
+
+def tree_hunks(path: str, base_tree: str, head_tree: str, files: List[dict], args: GitDiffRevsArgs,
+               budget: Optional[int]) -> List[dict]:
+    """Structured hunks of ``files`` between two trees, in order, within ``budget`` bytes of lines.
+
+    Returns one ``{"hunks", "truncated"}`` per file until the budget runs out.
+    The first file is always returned, cut short if needed, so paging makes
+    progress.
+    """
+    command = [
+        "diff-tree", "-r", "-p", "--no-color", "--no-ext-diff", f"-U{max(args.context or 0, 0)}",
+        *_detection_options(args), base_tree, head_tree, "--", *section_pathspecs(files),
+    ]
+
+    def add(current, line, room):
+        match = _HUNK_RE.match(line.rstrip(b"\n"))
+        if match is not None:
+            old_start, old_lines, new_start, new_lines, header = match.groups()
+            current["hunks"].append({
+                "old_start": int(old_start),
+                "old_lines": 1 if old_lines is None else int(old_lines),
+                "new_start": int(new_start),
+                "new_lines": 1 if new_lines is None else int(new_lines),
+                "header": header.decode("utf-8", "replace"),
+                "lines": [],
+            })
+            return 0
+        if not current["hunks"] or line[:1] not in (b"+", b"-", b" ", b"\\"):
+            return 0
+        if room is not None and len(line) > room:
+            return None
+        current["hunks"][-1]["lines"].append(line.rstrip(b"\n").decode("utf-8", "replace"))
+        return len(line)
+
+    return collect_sections(path, command, len(files), budget, lambda: {"hunks": [], "truncated": False}, add)
+
+
+def diff_revs(path: str, args: GitDiffRevsArgs) -> dict:
+    git_dir = find_git_dir(path)
+    base = resolve_commit(path, args.base)
+    head = resolve_commit(path, args.head)
+    merge_base = None
+    if args.merge_base:
+        # Fixed by the two commits, but the history walk can be slow, so it is cached too.
+        key = ResponseCache.key("merge-base", git_dir, base, head)
+        try:
+            merge_base = response_cache.get_or_compute(
+                key, lambda: git_output(["merge-base", base, head], cwd=path).decode().strip()
+            )
+        except git.GitCommandError:
+            raise ValueError(f"{args.base} and {args.head or 'HEAD'} have no merge base") from None
+        base = merge_base
+    with repo_cache.object_reader(path, check=True) as reader:
+        base_tree, head_tree = (obj[0] for obj in reader.read_many([f"{base}^{{tree}}", f"{head}^{{tree}}"]))
+
+    files = []
+    if base_tree != head_tree:
+        key = ResponseCache.key("git_diff_revs", git_dir, base_tree, head_tree, args.paths, args.renames, args.copies)
+        files = response_cache.get_or_compute(key, lambda: tree_changes(path, base_tree, head_tree, args))
+    offset = max(args.offset or 0, 0)
+    page = [dict(f) for f in files[offset:offset + max(args.max_files or 1, 1)]]
+    # Generated files are recognized by the worktree's attributes, which can
+    # change, so they are marked outside the cached listing and only per page.
+    mark_generated(path, page)
+    wanted = page_wanted(page, args.include_generated, "hunks")
+
+    results = []
+    if wanted:
+        key = ResponseCache.key(
+            "git_diff_revs:hunks", git_dir, base_tree, head_tree, [(f["path"], f["old_path"]) for f in wanted],
+            args.renames, args.copies, args.context, args.max_bytes,
+        )
+        results = response_cache.get_or_compute(
+            key, lambda: tree_hunks(path, base_tree, head_tree, wanted, args, args.max_bytes)
+        )
+    for f, result in zip(wanted, results):
+        f["hunks"] = result["hunks"]
+        f["truncated"] = result["truncated"]
+    page, next_offset = page_end(page, offset, len(files), wanted, results)
+
+    return {
+        "base": base,
+        "head": head,
+        "merge_base": merge_base,
+        "files": page,
+        "total_files": len(files),
+        "additions": sum(f["additions"] or 0 for f in files),
+        "deletions": sum(f["deletions"] or 0 for f in files),
+        "next_offset": next_offset,
+    }
+
+
+@tool(
+    "git_diff_revs",
+    "Diff two revisions (or a branch against its merge base) with rename detection, returning structured hunks per file",
+    GitDiffRevsArgs,
+)
+def _git_diff_revs(args: GitDiffRevsArgs) -> str:
+    check_format(args.format)
+    return encode_result(diff_revs(args.path, args), args.format, records="files")
+
+
+GIT_MCP_BLAME_CACHE_LINES = int(os.environ.get("GIT_MCP_BLAME_CACHE_LINES", 200000))
+
+
+def resolve_commit(path: str, rev: Optional[str]) -> str:
+    """Resolve ``rev`` to a commit oid through the repo's persistent batch-check reader."""
+    rev = rev or "HEAD"
+    if rev.startswith("-"):
+        raise ValueError(f"Invalid revision: {rev}")
+    with repo_cache.object_reader(path, check=True) as reader:
+        resolved = reader.read(f"{rev}^{{commit}}")
+    if resolved is None:
+        raise ValueError(f"Unknown revision: {rev}")
+    return resolved[0]
+
+
+_C_ESCAPES = {ord("a"): 7, ord("b"): 8, ord("f"): 12, ord("n"): 10, ord("r"): 13, ord("t"): 9, ord("v"): 11}
+
+
+def unquote_path(value: bytes) -> str:
+    """Undo git's C-style quoting of a path (core.quotePath)."""
+    if not value.startswith(b'"'):
+        return value.decode("utf-8", "surrogateescape")
+    out = bytearray()
+    i, end = 1, len(value) - 1
+    while i < end:
+        c = value[i]
+        if c != ord("\\"):
+            out.append(c)
+            i += 1
+        elif value[i + 1:i + 2].isdigit():
+            out.append(int(value[i + 1:i + 4], 8))
+            i += 4
+        else:
+            out.append(_C_ESCAPES.get(value[i + 1], value[i + 1]))
+            i += 2
+    return out.decode("utf-8", "surrogateescape")
+
+
+class _BlameEntry:
+    """Blame of one file at one commit, for the lines computed so far."""
+
+    __slots__ = ("lines", "commits", "total")
+
+    def __init__(self, lines: dict, commits: dict, total: Optional[int]):
+        # final line -> (commit oid, original path, original line)
+        self.lines = lines
+        # commit oid -> author/summary fields
+        self.commits = commits
+        # line count of the file, once a whole-file blame has run
+        self.total = total
+
+
+class BlameCache:
+    """Process-wide LRU of blame results keyed by (commit oid, path).
+
+    A commit oid fixes the whole history behind it, so an entry stays valid
+    forever and is shared by every clone holding that commit. Memory is
+    bounded by the total number of blamed lines held.
+    """
+
+    def __init__(self, max_lines: int = GIT_MCP_BLAME_CACHE_LINES):
+        self.max_lines = max_lines
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.lines = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: tuple) -> Optional[_BlameEntry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def count(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def put(self, key: tuple, entry: _BlameEntry):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.lines -= len(old.lines)
+            if len(entry.lines) > self.max_lines:
+                return
+            self._entries[key] = entry
+            self.lines += len(entry.lines)
+            while self.lines > self.max_lines:
+                _, evicted = self._entries.popitem(last=False)
+                self.lines -= len(evicted.lines)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.lines = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "lines": self.lines,
+                "max_lines": self.max_lines,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+blame_cache = BlameCache()
+
+
+def stream_blame(path: str, oid: str, file: str, line_range: Optional[str]) -> Iterator[tuple]:
+    """Yield ``(commit, orig_line, final_line, count, headers, orig_path)`` from ``git blame --incremental``.
+
+    ``headers`` holds the commit's author and summary fields the first time a
+    commit appears and is empty afterwards.
+    """
+    command = ["blame", "--incremental", *(["-L", line_range] if line_range else []), oid, "--", file]
+    with git_stream(command, cwd=path) as proc:
+        group = None
+        headers = {}
+        for line in proc.stdout:
+            line = line.rstrip(b"\n")
+            if group is None:
+                commit, orig_line, final_line, count = line.split()[:4]
+                group = (commit.decode(), int(orig_line), int(final_line), int(count))
+                headers = {}
+                continue
+            key, _, value = line.partition(b" ")
+            if key == b"filename":
+                yield (*group, headers, unquote_path(value))
+                group = None
+            else:
+                headers[key] = value
+        err = proc.stderr.read()
+        if proc.wait():
+            raise git.GitCommandError(["git", *command], proc.returncode, err)
+
+
+def _blame_commit(headers: dict) -> dict:
+    return {
+        "author": headers.get(b"author", b"").decode("utf-8", "replace"),
+        "author_email": headers.get(b"author-mail", b"").decode("utf-8", "replace").strip("<>"),
+        "author_date": parse_timestamp(headers.get(b"author-time", b"0"), headers.get(b"author-tz", b"")).isoformat(),
+        "summary": headers.get(b"summary", b"").decode("utf-8", "replace"),
+    }
+
+
+def blame_lines(path: str, oid: str, file: str, start: int, end: Optional[int]) -> tuple:
+    """Return (entry, cached) with lines ``start``..``end`` of ``file`` at ``oid`` blamed."""
+    key = (oid, file)
+    entry = blame_cache.get(key)
+    if entry is not None:
+        last = end
+        if entry.total is not None:
+            last = entry.total if end is None else min(end, entry.total)
+        if last is not None and all(n in entry.lines for n in range(start, last + 1)):
+            blame_cache.count(True)
+            return entry, True
+    blame_cache.count(False)
+
+    line_range = None if start == 1 and end is None else f"{start},{end if end is not None else ''}"
+    lines = dict(entry.lines) if entry is not None else {}
+    commits = dict(entry.commits) if entry is not None else {}
+    for commit, orig_line, final_line, count, headers, orig_path in stream_blame(path, oid, file, line_range):
+        if commit not in commits:
+            commits[commit] = _blame_commit(headers)
+        for i in range(count):
+            lines[final_line + i] = (commit, orig_path, orig_line + i)
+    total = entry.total if entry is not None else None
+    if end is None:
+        # Blaming through the end of the file reveals its length.
+        total = max(lines, default=0)
+    entry = _BlameEntry(lines, commits, total)
+    blame_cache.put(key, entry)
+    return entry, False
+
+
+def blame_hunks(entry: _BlameEntry, start: int, end: int) -> List[dict]:
+    """Group lines into runs of consecutive lines from the same commit and original position."""
+    hunks = []
+    previous = None
+    for n in range(start, end + 1):
+        blamed = entry.lines.get(n)
+        if blamed is None:
+            break
+        commit, orig_path, orig_line = blamed
+        if previous is not None and previous[0] == commit and previous[1] == orig_path and previous[2] + 1 == orig_line:
+            hunks[-1]["end"] = n
+        else:
+            hunks.append({
+                "start": n,
+                "end": n,
+                "commit": commit,
+                **entry.commits[commit],
+                "orig_path": orig_path,
+                "orig_start": orig_line,
+            })
+        previous = blamed
+    return hunks
+
+
+@tool(
+    "git_blame",
+    "Show which commit and author last changed each line of a file, optionally for a line range; results are cached per commit",
+    GitBlameArgs,
+)
+def _git_blame(args: GitBlameArgs) -> str:
+    check_format(args.format)
+    start = args.start_line or 1
+    end = args.end_line
+    if start < 1 or (end is not None and end < start):
+        raise ValueError(f"Invalid line range: {start}-{end}")
+    # Resolving through the persistent reader means a fully cached blame
+    # runs no git process at all.
+    oid = resolve_commit(args.path, args.rev)
+
+    entry, cached = blame_lines(args.path, oid, args.file, start, end)
+    last = end
+    if entry.total is not None:
+        if start > max(entry.total, 1):
+            raise ValueError(f"{args.file} has only {entry.total} lines")
+        last = entry.total if end is None else min(end, entry.total)
+    return encode_result({
+        "file": args.file,
+        "commit": oid,
+        "hunks": blame_hunks(entry, start, last),
+        "cached": cached,
+    }, args.format, records="hunks")
+
+
+GIT_MCP_BLOB_INLINE_BYTES = int(os.environ.get("GIT_MCP_BLOB_INLINE_BYTES", 1 << 20))
+
+# git's own binary heuristic: a NUL byte among the first 8000 bytes
+_BINARY_CHECK_BYTES = 8000
+_BLOB_CHUNK = 65536
+
+
+def _stat_stamp(ns: int) -> bytes:
+    return b"%d:%d" % divmod(ns, 1_000_000_000)
+
+
+# Attributes under which the checked-out file can differ from its blob.
+_CONVERSION_ATTRS = ("text", "eol", "crlf", "filter", "ident", "working-tree-encoding")
+
+
+def converted_paths(worktree: str, files: List[str]) -> set:
+    """Files whose checkout may not be byte-identical to the blob: end-of-line or filter conversion."""
+    try:
+        autocrlf = git_output(["config", "--get", "core.autocrlf"], cwd=worktree).strip().lower()
+    except git.GitCommandError:
+        autocrlf = b""
+    if autocrlf not in (b"", b"false", b"no", b"off", b"0"):
+        return set(files)
+    out = git_output(["check-attr", "-z", "--stdin", *_CONVERSION_ATTRS], cwd=worktree,
+                     input=b"".join(file.encode("utf-8", "surrogateescape") + b"\0" for file in files))
+    fields = out.split(b"\0")
+    converted = set()
+    for i in range(0, len(fields) - 2, 3):
+        if fields[i + 2] not in (b"unspecified", b"unset"):
+            converted.add(fields[i].decode("utf-8", "surrogateescape"))
+    return converted
+
+
+def worktree_blobs(worktree: str, git_dir: str, blobs: dict) -> dict:
+    """Map files of ``blobs`` (path -> (blob oid, size)) whose worktree copy is that blob to their stat.
+
+    The index records each file's blob oid with the stat data it had when it
+    was hashed. A file whose stat still matches has not been rewritten since,
+    unless it is racily clean (modified within the same timestamp tick that
+    the index was written), which is treated as a mismatch. The worktree copy
+    also has to be the blob's size and free of end-of-line and filter
+    conversion, since the index hashes the converted content.
+    """
+    try:
+        index_mtime = os.stat(os.path.join(git_dir, "index")).st_mtime_ns
+    except OSError:
+        return {}
+    out = git_output(["ls-files", "--debug", "-s", "-z", "--", *_literal(blobs)], cwd=worktree)
+    found = {}
+    pos = 0
+    while pos < len(out):
+        end = out.index(b"\0", pos)
+        info, _, name = out[pos:end].partition(b"\t")
+        pos = end + 1
+        debug = {}
+        # ctime, mtime, dev/ino, uid/gid and size/flags lines follow each entry
+        for _ in range(5):
+            newline = out.index(b"\n", pos)
+            for field in out[pos:newline].split(b"\t"):
+                key, _, value = field.strip().partition(b": ")
+                debug[key] = value
+            pos = newline + 1
+        file = name.decode("utf-8", "surrogateescape")
+        _, oid, stage = info.decode().split()
+        if stage != "0" or file not in blobs or blobs[file][0] != oid:
+            continue
+        try:
+            st = os.lstat(os.path.join(worktree, file))
+        except OSError:
+            continue
+        if (
+            stat.S_ISREG(st.st_mode)
+            and debug.get(b"mtime") == _stat_stamp(st.st_mtime_ns)
+            and debug.get(b"ctime") == _stat_stamp(st.st_ctime_ns)
+            and debug.get(b"ino") == b"%d" % st.st_ino
+            and debug.get(b"size") == b"%d" % st.st_size
+            and st.st_size == blobs[file][1]
+            and st.st_mtime_ns < index_mtime
+        ):
+            found[file] = st
+    if found:
+        for file in converted_paths(worktree, list(found)):
+            del found[file]
+    return found
+
+
+def read_worktree_range(full_path: str, expected: os.stat_result, offset: int, length: int) -> Optional[tuple]:
+    """Return ``(head, data)`` from a memory map of an unchanged worktree file, or None if it changed."""
+    with open(full_path, "rb") as f:
+        st = os.fstat(f.fileno())
+        if (st.st_ino, st.st_size, st.st_mtime_ns) != (expected.st_ino, expected.st_size, expected.st_mtime_ns):
+            return None
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return mapped[:_BINARY_CHECK_BYTES], mapped[offset:offset + length]
+
+
+def stream_blob_range(git_dir: str, oid: str, offset: int, length: int) -> tuple:
+    """Return ``(head, data)`` from ``git cat-file blob``, reading no further than the range."""
+    with git_stream(["--git-dir", git_dir, "cat-file", "blob", oid], stderr=subprocess.DEVNULL) as proc:
+        head = b""
+        chunks = []
+        pos = 0
+        stop = offset + length
+        while pos < max(stop, _BINARY_CHECK_BYTES):
+            chunk = proc.stdout.read(_BLOB_CHUNK)
+            if not chunk:
+                break
+            if pos < _BINARY_CHECK_BYTES:
+                head += chunk[:_BINARY_CHECK_BYTES - pos]
+            if pos + len(chunk) > offset and pos < stop:
+                chunks.append(chunk[max(offset - pos, 0):stop - pos])
+            pos += len(chunk)
+        return head, b"".join(chunks)
+
+
+def blob_record(file: str, oid: str, size: int, offset: int, head: bytes, data: bytes, source: str) -> dict:
+    binary = b"\0" in head
+    end = offset + len(data)
+    return {
+        "file": file,
+        "oid": oid,
+        "size": size,
+        "offset": offset,
+        "length": len(data),
+        "binary": binary,
+        "encoding": "base64" if binary else "utf-8",
+        "content": base64.b64encode(data).decode() if binary else data.decode("utf-8", "replace"),
+        "source": source,
+        "next_offset": end if end < size else None,
+    }
+
+
+def read_files(path: str, commit: str, files: List[str], offset: int, length: int) -> List[dict]:
+    """Read a byte range of each file at ``commit``.
+
+    Blobs up to GIT_MCP_BLOB_INLINE_BYTES come whole from the persistent
+    cat-file reader in one pipelined exchange. Larger ones are memory-mapped
+    from the worktree when the index proves the worktree copy is that blob,
+    and otherwise streamed from a separate ``git cat-file blob`` only as far
+    as the range needs.
+    """
+    if offset < 0 or length < 0:
+        raise ValueError("offset and length must not be negative")
+    git_dir = find_git_dir(path)
+    with repo_cache.object_reader(path, check=True) as reader:
+        found = list(reader.read_many(f"{commit}:{file}" for file in files))
+
+    records = [None] * len(files)
+    small, large = [], {}
+    for i, (file, obj) in enumerate(zip(files, found)):
+        if obj is None:
+            records[i] = {"file": file, "error": "not found"}
+        elif obj[1] != "blob":
+            records[i] = {"file": file, "error": f"is a {obj[1]}, not a file"}
+        elif obj[2] <= GIT_MCP_BLOB_INLINE_BYTES:
+            small.append(i)
+        else:
+            large[file] = i
+
+    if small:
+        with repo_cache.object_reader(path) as reader:
+            blobs = list(reader.read_many(found[i][0] for i in small))
+        for i, (oid, _, data) in zip(small, blobs):
+            records[i] = blob_record(
+                files[i], oid, len(data), offset, data[:_BINARY_CHECK_BYTES], data[offset:offset + length], "object-reader"
+            )
+
+    if large:
+        worktree = os.path.realpath(path)
+        mapped = {}
+        if git_dir != worktree:
+            mapped = worktree_blobs(worktree, git_dir, {file: (found[i][0], found[i][2]) for file, i in large.items()})
+        for file, i in large.items():
+            oid, _, size = found[i]
+            result = None
+            if file in mapped:
+                result = read_worktree_range(os.path.join(worktree, file), mapped[file], offset, length)
+            source = "worktree"
+            if result is None:
+                result = stream_blob_range(git_dir, oid, offset, length)
+                source = "stream"
+            records[i] = blob_record(file, oid, size, offset, *result, source)
+    return records
+
+
+@tool(
+    "git_show_file",
+    "Read a file as it is at any revision, optionally a byte range, without touching the worktree",
+    GitShowFileArgs,
+)
+def _git_show_file(args: GitShowFileArgs) -> str:
+    check_format(args.format)
+    commit = resolve_commit(args.path, args.rev)
+    offset, length = args.offset or 0, args.length if args.length is not None else 1_000_000
+    key = ResponseCache.key("git_show_file", find_git_dir(args.path), commit, args.file, offset, length)
+    record = response_cache.get_or_compute(key, lambda: read_files(args.path, commit, [args.file], offset, length)[0])
+    if "error" in record:
+        raise ValueError(f"{args.file} at {args.rev or 'HEAD'}: {record['error']}")
+    return encode_result({"commit": commit, **record}, args.format)
+
+
+@tool(
+    "git_show_files",
+    "Read many files as they are at one revision in a single call",
+    GitShowFilesArgs,
+)
+def _git_show_files(args: GitShowFilesArgs) -> str:
+    check_format(args.format)
+    commit = resolve_commit(args.path, args.rev)
+    max_bytes = args.max_bytes if args.max_bytes is not None else 100_000
+    key = ResponseCache.key("git_show_files", find_git_dir(args.path), commit, args.files, max_bytes)
+    return encode_result({
+        "commit": commit,
+        "files": response_cache.get_or_compute(key, lambda: read_files(args.path, commit, args.files, 0, max_bytes)),
+    }, args.format, records="files")
+
+
+GIT_MCP_GREP_THREADS = int(os.environ.get("GIT_MCP_GREP_THREADS", 0))
+
+_GREP_MODES = {"extended": "-E", "basic": "-G", "perl": "-P", "fixed": "-F"}
+# Matched lines are cut to this many characters, so a minified file cannot
+# blow up the response.
+_GREP_LINE_CHARS = 500
+_GREP_FLUSH_MATCHES = 50
+_GREP_FLUSH_SECONDS = 0.1
+
+
+def grep_matches(path: str, args: GitGrepArgs, commit: Optional[str], on_batch: Optional[Callable] = None) -> tuple:
+    """Run ``git grep`` and collect matches, stopping git once ``max_results`` is reached.
+
+    Returns (matches, truncated). ``on_batch`` is called from this thread
+    with each group of new matches as git produces them.
+    """
+    mode = args.mode or "extended"
+    if mode not in _GREP_MODES:
+        raise ValueError(f"Unknown grep mode: {mode}")
+    limit = args.max_results or 0
+    command = ["grep", "--no-color", "-n", "--column", "--null", "-I", _GREP_MODES[mode]]
+    if GIT_MCP_GREP_THREADS:
+        command += ["--threads", str(GIT_MCP_GREP_THREADS)]
+    if args.ignore_case:
+        command.append("-i")
+    if args.max_per_file:
+        command += ["--max-count", str(args.max_per_file)]
+    command += ["-e", args.pattern]
+    if commit is not None:
+        command.append(commit)
+    command += ["--", *(args.paths or [])]
+    prefix = f"{commit}:".encode() if commit is not None else b""
+
+    matches = []
+    pending = []
+    flushed = time.monotonic()
+    truncated = False
+    with git_stream(command, cwd=path) as proc:
+        for line in proc.stdout:
+            name, lineno, column, text = line.rstrip(b"\n").split(b"\0", 3)
+            if prefix and name.startswith(prefix):
+                name = name[len(prefix):]
+            match = {
+                "path": name.decode("utf-8", "surrogateescape"),
+                "line": int(lineno),
+                "column": int(column),
+                "text": text.decode("utf-8", "replace")[:_GREP_LINE_CHARS],
+            }
+            matches.append(match)
+            if on_batch is not None:
+                pending.append(match)
+                if len(pending) >= _GREP_FLUSH_MATCHES or time.monotonic() - flushed >= _GREP_FLUSH_SECONDS:
+                    on_batch(pending)
+                    pending = []
+                    flushed = time.monotonic()
+            if limit and len(matches) >= limit:
+                truncated = True
+                break
+        if not truncated:
+            err = proc.stderr.read()
+            # Exit status 1 only means nothing matched.
+            if proc.wait() not in (0, 1):
+                raise git.GitCommandError(["git", *command], proc.returncode, err)
+    if pending:
+        on_batch(pending)
+    return matches, truncated
+
+
+@tool(
+    "git_grep",
+    "Search file contents in the worktree or at any revision with git grep, stopping at a match limit; matches stream as progress notifications",
+    GitGrepArgs,
+    scheduled=False,
+)
+async def _git_grep(args: GitGrepArgs) -> str:
+    start = time.perf_counter()
+    check_format(args.format)
+    commit = None
+    if args.rev is not None:
+        commit = await scheduler.run(args.path, resolve_commit, args.path, args.rev)
+    report = _progress_reporter()
+    on_batch = None
+    sender = None
+    if report is not None:
+        # Batches are handed from the worker thread to one task on the event
+        # loop, so notifications go out in the order git found the matches.
+        loop = asyncio.get_running_loop()
+        batches = asyncio.Queue()
+        sent = 0
+
+        async def send():
+            nonlocal sent
+            while (batch := await batches.get()) is not None:
+                sent += len(batch)
+                await report(sent, None, json.dumps({"matches": batch}))
+
+        sender = asyncio.create_task(send())
+
+        def on_batch(batch: List[dict]):
+            loop.call_soon_threadsafe(batches.put_nowait, batch)
+
+    try:
+        if commit is None:
+            matches, truncated = await scheduler.run(args.path, grep_matches, args.path, args, commit, on_batch)
+        else:
+            # A tree search never changes; progress is only sent while computing.
+            key = ResponseCache.key("git_grep", find_git_dir(args.path), commit, args.model_dump(exclude={"path", "rev", "format"}))
+            matches, truncated = await scheduler.run(
+                args.path, response_cache.get_or_compute, key, lambda: grep_matches(args.path, args, commit, on_batch)
+            )
+    finally:
+        if sender is not None:
+            batches.put_nowait(None)
+            await sender
+    return encode_result({
+        "commit": commit,
+        "matches": matches,
+        "files": len({match["path"] for match in matches}),
+        "truncated": truncated,
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 3),
+    }, args.format, records="matches")
+
+
+_IDENT_RE = re.compile(r"^([^<>]*?)\s*<([^<>]*)>$")
+_COMMIT_AUTHOR_RE = re.compile(rb"^author (.*) <(.*)> (\d+ [+-]\d{4})$", re.M)
+_COMMIT_PARENT_RE = re.compile(rb"^parent ([0-9a-f]+)$", re.M)
+
+
+def clean_message(message: str) -> str:
+    """Strip trailing spaces and surrounding blank lines and collapse blank runs, like ``git commit -m``."""
+    lines = [line.rstrip() for line in message.splitlines()]
+    message = re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip("\n")
+    if not message:
+        raise ValueError("Aborting commit due to empty commit message")
+    return message + "\n"
+
+
+def commit_env(author: Optional[str], amended: Optional[bytes]) -> dict:
+    """Environment for commit-tree: the author override, or the amended commit's author."""
+    env = dict(os.environ)
+    # git refuses to guess an email without a domain; GitPython used
+    # user@hostname, so keep committing in repositories without user.email.
+    env.setdefault("EMAIL", f"{getpass.getuser()}@{socket.gethostname()}")
+    if author is not None:
+        match = _IDENT_RE.match(author.strip())
+        if match is None:
+            raise ValueError(f"Invalid author, expected 'Name <email>': {author}")
+        env["GIT_AUTHOR_NAME"], env["GIT_AUTHOR_EMAIL"] = match.groups()
+    elif amended is not None:
+        match = _COMMIT_AUTHOR_RE.search(amended.split(b"\n\n", 1)[0])
+        if match is not None:
+            name, email, date = (value.decode("utf-8", "surrogateescape") for value in match.groups())
+            env.update(GIT_AUTHOR_NAME=name, GIT_AUTHOR_EMAIL=email, GIT_AUTHOR_DATE="@" + date)
+    return env
+
+
+def run_hook(path: str, name: str, args: List[str], env: dict):
+    # A failing hook raises GitCommandError carrying the hook's output.
+    git_output(["hook", "run", "--ignore-missing", name, "--", *args], cwd=path, env=env)
+
+
+_UNMATCHED_RE = re.compile(r"pathspec '(.*)' did not match any files")
+
+
+def stage_files(path: str, files: List[str]):
+    """Stage files, directories or globs, deletions included, with one ``git add -A`` call."""
+    data = b"".join(f.encode("utf-8", "surrogateescape") + b"\0" for f in files)
+    try:
+        git_output(["add", "-A", "--pathspec-from-file=-", "--pathspec-file-nul"], cwd=path, input=data)
+    except git.GitCommandError as e:
+        unmatched = _UNMATCHED_RE.search(e.stderr or "")
+        if unmatched is not None:
+            raise ValueError(f"No such file: {unmatched.group(1)}") from None
+        raise
+
+
+def create_commit(path: str, args: GitCommitArgs) -> str:
+    """Commit the index with ``git add`` and plumbing: write-tree, commit-tree, update-ref.
+
+    The index is never parsed in Python, so the cost is git's own, and HEAD
+    only moves if it still points at the commit the new one was built on.
+    """
+    git_dir = find_git_dir(path)
+    if args.all:
+        git_output(["add", "--update"], cwd=path)
+    if args.files:
+        stage_files(path, args.files)
+
+    with repo_cache.object_reader(path) as reader:
+        head = reader.read("HEAD^{commit}")
+    if args.amend and head is None:
+        raise ValueError("Nothing to amend: HEAD has no commits yet")
+    amended = head[2] if args.amend else None
+    env = commit_env(args.author, amended)
+
+    message = clean_message(args.message)
+    if args.hooks:
+        env["GIT_EDITOR"] = ":"
+        run_hook(path, "pre-commit", [], env)
+        message_file = os.path.join(git_dir, "COMMIT_EDITMSG")
+        with open(message_file, "w", encoding="utf-8") as f:
+            f.write(message)
+        run_hook(path, "prepare-commit-msg", [message_file, "message"], env)
+        run_hook(path, "commit-msg", [message_file], env)
+        with open(message_file, encoding="utf-8") as f:
+            message = clean_message(f.read())
+
+    tree = git_output(["write-tree"], cwd=path).decode().strip()
+    if head is None:
+        parents = []
+    elif amended is not None:
+        parents = [oid.decode() for oid in _COMMIT_PARENT_RE.findall(amended.split(b"\n\n", 1)[0])]
+    else:
+        parents = [head[0]]
+    command = ["commit-tree", tree]
+    for parent in parents:
+        command += ["-p", parent]
+    oid = git_output(command, cwd=path, input=message.encode(), env=env).decode().strip()
+
+    kind = "commit (amend)" if amended is not None else "commit (initial)" if head is None else "commit"
+    git_output(["update-ref", "-m", f"{kind}: {message.splitlines()[0]}", "HEAD", oid, head[0] if head else ""], cwd=path)
+    if args.hooks:
+        with contextlib.suppress(git.GitCommandError):
+            run_hook(path, "post-commit", [], env)
+    return oid
+
+
+@tool("git_commit", "Create a git commit", GitCommitArgs, write=True)
+def _git_commit(args: GitCommitArgs) -> str:
+    return f"Commit created: {create_commit(args.path, args)}"
+
+
+_REF_KINDS = (("refs/heads/", "branch"), ("refs/remotes/", "remote"), ("refs/tags/", "tag"))
+# One line per ref. Annotated tags are peeled (%(*...)) so every ref reports
+# the commit it points at; upstream:track is computed by git in the same pass.
+_REF_FORMAT = "%00".join((
+    "%(refname)",
+    "%(symref)",
+    "%(HEAD)",
+    "%(upstream:short)",
+    "{track}",
+    "%(if)%(*objectname)%(then)%(*objectname)%00%(*authorname)%00%(*authoremail:trim)"
+    "%00%(*committerdate:iso-strict)%00%(*subject)"
+    "%(else)%(objectname)%00%(authorname)%00%(authoremail:trim)%00%(committerdate:iso-strict)%00%(subject)%(end)",
+    # A NUL before for-each-ref's newline terminates the record; subjects can
+    # hold characters str.splitlines() treats as line breaks.
+    "",
+))
+_TRACK_RE = re.compile(r"(ahead|behind) (\d+)")
+
+
+def parse_track(track: str) -> tuple:
+    """Turn ``upstream:track,nobracket`` output into (ahead, behind); None for a gone upstream."""
+    if track == "gone":
+        return None, None
+    counts = {"ahead": 0, "behind": 0}
+    counts.update((key, int(value)) for key, value in _TRACK_RE.findall(track))
+    return counts["ahead"], counts["behind"]
+
+
+def list_refs(path: str, args: GitBranchArgs) -> List[dict]:
+    """List branches (and optionally remote branches and tags) with one ``git for-each-ref``."""
+    prefixes = ["refs/heads/"]
+    if args.remotes:
+        prefixes.append("refs/remotes/")
+    if args.tags:
+        prefixes.append("refs/tags/")
+    patterns = [prefix + args.pattern for prefix in prefixes] if args.pattern else [prefix.rstrip("/") for prefix in prefixes]
+    ref_format = _REF_FORMAT.replace("{track}", "%(upstream:track,nobracket)" if args.track else "")
+    command = ["for-each-ref", f"--format={ref_format}", f"--sort={args.sort or 'refname'}", "--", *patterns]
+    out = git_output(command, cwd=path)
+
+    refs = []
+    for record in out.decode("utf-8", "replace").split("\0\n")[:-1]:
+        refname, symref, head, upstream, track, oid, author, email, date, subject = record.split("\0")
+        if symref:
+            # refs/remotes/<remote>/HEAD and other symbolic refs are aliases
+            continue
+        prefix, kind = next((p, k) for p, k in _REF_KINDS if refname.startswith(p))
+        ahead = behind = None
+        if upstream and args.track:
+            ahead, behind = parse_track(track)
+        refs.append({
+            "name": refname[len(prefix):],
+            "type": kind,
+            "current": head == "*",
+            "commit": oid,
+            "date": date,
+            "author": author,
+            "author_email": email,
+            "subject": subject,
+            "upstream": upstream or None,
+            "ahead": ahead,
+            "behind": behind,
+        })
+        if len(refs) == args.limit:
+            break
+    return refs
+
+
+@tool("git_branch", "List branches with tip commit, upstream and ahead/behind; optionally remote branches and tags", GitBranchArgs)
+def _git_branch(args: GitBranchArgs) -> str:
+    check_format(args.format)
+    return encode_result(list_refs(args.path, args), args.format)
+
+
+@tool("git_checkout", "Checkout a git branch", GitCheckoutArgs, write=True)
+def _git_checkout(args: GitCheckoutArgs) -> str:
+    git_output(["checkout", "-q", *(["-b"] if args.create else []), args.branch], cwd=args.path)
+    return f"Checked out branch: {args.branch}"
+
+
+GIT_MCP_WORKTREE_DIR = os.environ.get("GIT_MCP_WORKTREE_DIR")
+GIT_MCP_WORKTREE_MAX = int(os.environ.get("GIT_MCP_WORKTREE_MAX", os.cpu_count() or 1))
+GIT_MCP_WORKTREE_IDLE = float(os.environ.get("GIT_MCP_WORKTREE_IDLE", 600))
+
+_LEASE_REASON = "git-mcp lease pid "
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class _PooledWorktree:
+    __slots__ = ("path", "sparse", "idle_since")
+
+    def __init__(self, path: str, sparse: Optional[tuple]):
+        self.path = path
+        # Directories of the sparse checkout, () for the whole tree, or None
+        # when the worktree's state is unknown (adopted from an earlier run).
+        self.sparse = sparse
+        self.idle_since = time.monotonic()
+
+
+class _RepoPool:
+    __slots__ = ("idle", "leased", "creating")
+
+    def __init__(self):
+        self.idle = []
+        self.leased = 0
+        self.creating = 0
+
+
+class WorktreePool:
+    """Per-repository pools of linked worktrees, each leased to one caller at a time.
+
+    Released worktrees are reset and kept for the next lease, so switching
+    branches only rewrites the files that differ. Leases are also recorded
+    with ``git worktree lock``: another server on the same repository cannot
+    claim a leased worktree and ``git worktree prune`` leaves it alone.
+    Worktrees idle for longer than ``idle_timeout`` are removed by a
+    background timer, and all idle worktrees when the pool is closed.
+    """
+
+    def __init__(self, max_per_repo: int = GIT_MCP_WORKTREE_MAX,
+                 idle_timeout: float = GIT_MCP_WORKTREE_IDLE, root: Optional[str] = GIT_MCP_WORKTREE_DIR):
+        self.max_per_repo = max_per_repo
+        self.idle_timeout = idle_timeout
+        self.root = root
+        self._pools = {}
+        self._leases = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self.created = 0
+        self.reused = 0
+        self.released = 0
+        self.removed = 0
+
+    def pool_dir(self, common: str) -> str:
+        if self.root:
+            digest = hashlib.sha1(common.encode("utf-8", "surrogateescape")).hexdigest()
+            return os.path.join(self.root, digest)
+        return os.path.join(common, "git-mcp", "worktrees")
+
+    def _adopt(self, common: str) -> List[_PooledWorktree]:
+        """Idle worktrees left in the pool directory by an earlier server."""
+        git_output(["--git-dir", common, "worktree", "prune"])
+        out = git_output(["--git-dir", common, "worktree", "list", "--porcelain", "-z"]).decode("utf-8", "surrogateescape")
+        prefix = os.path.realpath(self.pool_dir(common)) + os.sep
+        adopted = []
+        for block in out.split("\0\0"):
+            fields = dict(line.partition(" ")[::2] for line in block.split("\0") if line)
+            path = fields.get("worktree", "")
+            if not path.startswith(prefix):
+                continue
+            if "locked" in fields:
+                reason = fields["locked"]
+                pid = reason[len(_LEASE_REASON):]
+                # Our own pid can only be a leftover: nothing is leased from a
+                # repository before it is adopted.
+                if not reason.startswith(_LEASE_REASON) or not pid.isdigit() or (
+                        int(pid) != os.getpid() and _pid_alive(int(pid))):
+                    continue
+                try:
+                    git_output(["--git-dir", common, "worktree", "unlock", path])
+                except git.GitCommandError:
+                    continue
+            adopted.append(_PooledWorktree(path, None))
+        return adopted
+
+    def _expire(self, pool: _RepoPool) -> List[str]:
+        deadline = time.monotonic() - self.idle_timeout
+        expired = [entry.path for entry in pool.idle if entry.idle_since < deadline]
+        if expired:
+            pool.idle = [entry for entry in pool.idle if entry.idle_since >= deadline]
+        return expired
+
+    def _remove(self, common: str, paths: List[str]):
+        for path in paths:
+            try:
+                git_output(["--git-dir", common, "worktree", "remove", "--force", path])
+            except git.GitCommandError:
+                git_output(["--git-dir", common, "worktree", "prune"])
+            with self._lock:
+                self.removed += 1
+
+    def _take(self, common: str, sparse: tuple) -> Optional[_PooledWorktree]:
+        """Take an idle worktree with the same sparse checkout, or reserve a slot for a new one.
+
+        Changing a worktree's sparse checkout adds or deletes files in bulk,
+        which costs about as much as creating a worktree, so idle worktrees
+        with other patterns are only reused once the pool is full.
+        """
+        with self._lock:
+            pool = self._pools.get(common)
+        if pool is None:
+            adopted = self._adopt(common)
+            with self._lock:
+                if common not in self._pools:
+                    self._pools[common] = _RepoPool()
+                    self._pools[common].idle.extend(adopted)
+                pool = self._pools[common]
+        with self._lock:
+            expired = self._expire(pool)
+            entry = None
+            for candidate in reversed(pool.idle):
+                if candidate.sparse == sparse:
+                    entry = candidate
+                    break
+            full = pool.leased + pool.creating + len(pool.idle) >= self.max_per_repo
+            if entry is None and pool.idle and full:
+                entry = pool.idle[-1]
+            if entry is not None:
+                pool.idle.remove(entry)
+                pool.leased += 1
+            elif not full:
+                pool.creating += 1
+            leased = pool.leased
+            if pool.idle:
+                self._ensure_thread()
+        self._remove(common, expired)
+        if entry is None and full:
+            raise ValueError(f"Worktree pool is full: {leased} of {self.max_per_repo} worktrees are leased; release one first")
+        return entry
+
+    def _put_back(self, common: str, entry: _PooledWorktree):
+        entry.idle_since = time.monotonic()
+        with self._lock:
+            pool = self._pools[common]
+            pool.leased -= 1
+            pool.idle.append(entry)
+            expired = self._expire(pool)
+            self._ensure_thread()
+        self._remove(common, expired)
+
+    def _ensure_thread(self):
+        # Called with self._lock held.
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="git-mcp-worktrees", daemon=True)
+            self._thread.start()
+
+    def _loop(self):
+        while not self._stop.wait(min(max(self.idle_timeout, 0.05), 60.0)):
+            with contextlib.suppress(git.GitCommandError):
+                self.prune()
+            with self._lock:
+                if not any(pool.idle for pool in self._pools.values()):
+                    self._thread = None
+                    return
+
+    def prune(self, everything: bool = False) -> int:
+        """Remove the worktrees idle past ``idle_timeout``, or all idle ones; return how many."""
+        removals = []
+        with self._lock:
+            for common, pool in self._pools.items():
+                if everything:
+                    expired = [entry.path for entry in pool.idle]
+                    pool.idle = []
+                else:
+                    expired = self._expire(pool)
+                if expired:
+                    removals.append((common, expired))
+        for common, paths in removals:
+            self._remove(common, paths)
+        return sum(len(paths) for _, paths in removals)
+
+    def close(self):
+        """Stop the timer and remove the idle worktrees; leased ones stay with their callers."""
+        self._stop.set()
+        with contextlib.suppress(git.GitCommandError):
+            self.prune(everything=True)
+
+    def _create(self, common: str) -> _PooledWorktree:
+        directory = self.pool_dir(common)
+        os.makedirs(directory, exist_ok=True)
+        path = tempfile.mkdtemp(prefix="wt-", dir=os.path.realpath(directory))
+        try:
+            git_output([
+                "--git-dir", common, "worktree", "add", "-q", "--no-checkout", "--detach",
+                "--lock", "--reason", f"{_LEASE_REASON}{os.getpid()}", path, "HEAD",
+            ])
+        except git.GitCommandError:
+            os.rmdir(path)
+            raise
+        return _PooledWorktree(path, ())
+
+    def _checkout(self, entry: _PooledWorktree, commit: Optional[str], args: GitWorktreeLeaseArgs, sparse: tuple):
+        path = entry.path
+        if entry.sparse != sparse:
+            if sparse:
+                git_output(["-C", path, "sparse-checkout", "set", "--cone", "--", *sparse])
+            else:
+                git_output(["-C", path, "sparse-checkout", "disable"])
+        if args.create:
+            target = ["-b", args.branch, commit]
+        elif args.branch:
+            target = [args.branch]
+        else:
+            target = ["--detach", commit]
+        unknown = entry.sparse is None
+        entry.sparse = None
+        git_output(["-C", path, "checkout", "-q", "--force", *target, "--"])
+        if unknown:
+            git_output(["-C", path, "clean", "-fdq"])
+        entry.sparse = sparse
+
+    def lease(self, path: str, args: GitWorktreeLeaseArgs) -> dict:
+        if args.create and not args.branch:
+            raise ValueError("create requires a branch")
+        if args.branch and args.rev and not args.create:
+            raise ValueError("rev only applies to detached leases or together with create")
+        if args.branch and args.branch.startswith("-"):
+            raise ValueError(f"Invalid branch name: {args.branch}")
+        common = _common_dir(find_git_dir(path))
+        commit = None if args.branch and not args.create else resolve_commit(path, args.rev)
+        sparse = tuple(args.sparse) if args.sparse else ()
+        while True:
+            entry = self._take(common, sparse)
+            if entry is None:
+                try:
+                    entry = self._create(common)
+                finally:
+                    with self._lock:
+                        pool = self._pools[common]
+                        pool.creating -= 1
+                        if entry is not None:
+                            pool.leased += 1
+                            self.created += 1
+                reused = False
+                break
+            try:
+                git_output(["--git-dir", common, "worktree", "lock", "--reason", f"{_LEASE_REASON}{os.getpid()}", entry.path])
+            except git.GitCommandError:
+                # Claimed by another server since we adopted it; forget it.
+                with self._lock:
+                    self._pools[common].leased -= 1
+                continue
+            with self._lock:
+                self.reused += 1
+            reused = True
+            break
+
+        try:
+            self._checkout(entry, commit, args, sparse)
+            head = git_output(["-C", entry.path, "rev-parse", "HEAD"]).decode().strip()
+        except BaseException:
+            with contextlib.suppress(git.GitCommandError):
+                git_output(["--git-dir", common, "worktree", "unlock", entry.path])
+            self._put_back(common, entry)
+            raise
+        with self._lock:
+            self._leases[entry.path] = (common, entry)
+        return {
+            "worktree": entry.path,
+            "branch": args.branch,
+            "commit": head,
+            "sparse": list(sparse) or None,
+            "reused": reused,
+        }
+
+    def release(self, path: str, remove: bool = False):
+        path = os.path.realpath(path)
+        with self._lock:
+            leased = self._leases.pop(path, None)
+        if leased is None:
+            raise ValueError(f"Not a leased worktree: {path}")
+        common, entry = leased
+        if not remove:
+            try:
+                # Both only touch what differs from HEAD, so a worktree with
+                # a few edits is reset in milliseconds however large it is.
+                git_output(["-C", path, "checkout", "-q", "--force", "--detach"])
+                git_output(["-C", path, "clean", "-fdq"])
+                git_output(["--git-dir", common, "worktree", "unlock", path])
+            except git.GitCommandError:
+                remove = True
+        with self._lock:
+            self.released += 1
+        if remove:
+            with self._lock:
+                pool = self._pools[common]
+                pool.leased -= 1
+                expired = self._expire(pool)
+            with contextlib.suppress(git.GitCommandError):
+                git_output(["--git-dir", common, "worktree", "unlock", path])
+            self._remove(common, [path, *expired])
+        else:
+            self._put_back(common, entry)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "repos": len(self._pools),
+                "max_per_repo": self.max_per_repo,
+                "leased": sum(pool.leased for pool in self._pools.values()),
+                "idle": sum(len(pool.idle) for pool in self._pools.values()),
+                "created": self.created,
+                "reused": self.reused,
+                "released": self.released,
+                "removed": self.removed,
+            }
+
+
+worktree_pool = WorktreePool()
+
+
+@tool(
+    "git_worktree_lease",
+    "Lease a private worktree of the repository checked out at a branch or commit, optionally sparse; "
+    "work there in parallel with other leases and release it when done",
+    GitWorktreeLeaseArgs,
+)
+def _git_worktree_lease(args: GitWorktreeLeaseArgs) -> str:
+    check_format(args.format)
+    start = time.perf_counter()
+    result = worktree_pool.lease(args.path, args)
+    result["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 3)
+    return encode_result(result, args.format)
+
+
+# Scheduled as a write on the worktree itself, so calls still running there
+# finish before it is reset.
+@tool(
+    "git_worktree_release",
+    "Release a leased worktree: discard its uncommitted changes and return it to the pool",
+    GitWorktreeReleaseArgs,
+    write=True,
+)
+def _git_worktree_release(args: GitWorktreeReleaseArgs) -> str:
+    worktree_pool.release(args.path, args.remove)
+    return f"Released worktree: {args.path}"
+
+
+GIT_MCP_MAINTENANCE = os.environ.get("GIT_MCP_MAINTENANCE", "").lower() in ("1", "true", "yes", "on")
+GIT_MCP_MAINTENANCE_IDLE = float(os.environ.get("GIT_MCP_MAINTENANCE_IDLE", 30))
+GIT_MCP_MAINTENANCE_MIN_CALLS = int(os.environ.get("GIT_MCP_MAINTENANCE_MIN_CALLS", 100))
+GIT_MCP_MAINTENANCE_JOBS = int(os.environ.get("GIT_MCP_MAINTENANCE_JOBS", 1))
+GIT_MCP_MAINTENANCE_CPU = float(os.environ.get("GIT_MCP_MAINTENANCE_CPU", 0.25))
+GIT_MCP_MAINTENANCE_THREADS = int(os.environ.get("GIT_MCP_MAINTENANCE_THREADS", 1))
+GIT_MCP_MAINTENANCE_NICE = int(os.environ.get("GIT_MCP_MAINTENANCE_NICE", 10))
+GIT_MCP_MAINTENANCE_LOOSE = int(os.environ.get("GIT_MCP_MAINTENANCE_LOOSE", 100))
+
+# Runs kept per repository for git_maintenance_status.
+_MAINTENANCE_HISTORY = 8
+
+
+def run_measured(args: List[str], nice: int = 0) -> tuple:
+    """Run a git command, optionally at lower priority; return its wall and CPU seconds.
+
+    The CPU time includes the processes git starts itself, such as
+    pack-objects. Without ``os.wait4`` the wall time stands in for it.
+    """
+    started = time.perf_counter()
+    proc = git_popen(args, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    if nice and hasattr(os, "setpriority"):
+        with contextlib.suppress(OSError):
+            os.setpriority(os.PRIO_PROCESS, proc.pid, nice)
+    err = proc.stderr.read()
+    proc.stderr.close()
+    if hasattr(os, "wait4"):
+        _, status, usage = os.wait4(proc.pid, 0)
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        cpu = usage.ru_utime + usage.ru_stime
+    else:
+        proc.wait()
+        cpu = time.perf_counter() - started
+    if proc.returncode:
+        raise git.GitCommandError(["git", *args], proc.returncode, err)
+    return time.perf_counter() - started, cpu
+
+
+def count_objects(common: str) -> dict:
+    out = git_output(["--git-dir", common, "count-objects", "-v"]).decode()
+    fields = dict(line.partition(": ")[::2] for line in out.splitlines())
+    return {"loose_objects": int(fields.get("count", 0)), "packs": int(fields.get("packs", 0))}
+
+
+class _MaintainedRepo:
+    __slots__ = ("common", "keys", "calls", "total_calls", "last_call", "running", "runs", "history")
+
+    def __init__(self, common: str):
+        self.common = common
+        # Repo keys (git dirs) the calls came in on; a linked worktree has its own.
+        self.keys = set()
+        # Calls since the last run started.
+        self.calls = 0
+        self.total_calls = 0
+        self.last_call = time.monotonic()
+        self.running = False
+        self.runs = 0
+        self.history = collections.deque(maxlen=_MAINTENANCE_HISTORY)
+
+
+class RepoMaintenance:
+    """Opt-in background maintenance for the repositories the server is busy with.
+
+    Every scheduled call counts against its repository. Once a repository has
+    taken ``min_calls`` calls and then none for ``idle`` seconds, its
+    commit-graph (with changed-path Bloom filters), loose objects and
+    multi-pack-index are brought up to date. Each step holds the repository
+    like a read tool, so maintenance waits for running writes, and a write
+    waits for at most one step. git runs niced, on at most ``jobs``
+    repositories at a time, and after each run the scheduler pauses long
+    enough to keep its CPU time under ``cpu_share`` of one core. A fixed
+    history walk is timed before and after each run to report the speedup.
+    """
+
+    def __init__(self, idle: float = GIT_MCP_MAINTENANCE_IDLE, min_calls: int = GIT_MCP_MAINTENANCE_MIN_CALLS,
+                 jobs: int = GIT_MCP_MAINTENANCE_JOBS, cpu_share: float = GIT_MCP_MAINTENANCE_CPU,
+                 threads: int = GIT_MCP_MAINTENANCE_THREADS, nice: int = GIT_MCP_MAINTENANCE_NICE,
+                 loose_objects: int = GIT_MCP_MAINTENANCE_LOOSE):
+        self.idle = idle
+        self.min_calls = min_calls
+        self.jobs = max(1, jobs)
+        self.cpu_share = cpu_share
+        self.threads = threads
+        self.nice = nice
+        self.loose_objects = loose_objects
+        self._repos = {}
+        self._keys = {}
+        self._lock = threading.Lock()
+        self._executor = None
+        self._task = None
+        self._runs = set()
+        self._resume_at = 0.0
+        self.runs = 0
+        self.failed = 0
+        self.cpu_time = 0.0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.jobs, thread_name_prefix="git-mcp-maintenance")
+        return self._executor
+
+    def _track(self, key: str) -> Optional[_MaintainedRepo]:
+        repo = self._keys.get(key)
+        if repo is None:
+            common = _common_dir(key)
+            if not os.path.isdir(os.path.join(common, "objects")):
+                return None
+            repo = self._repos.get(common)
+            if repo is None:
+                repo = self._repos[common] = _MaintainedRepo(common)
+            repo.keys.add(key)
+            self._keys[key] = repo
+        return repo
+
+    def note(self, key: str):
+        """Count a call against the repository of ``key``; called on the event loop."""
+        with self._lock:
+            repo = self._track(key)
+            if repo is None:
+                return
+            repo.calls += 1
+            repo.total_calls += 1
+            repo.last_call = time.monotonic()
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._loop())
+
+    def due(self, now: float) -> List[_MaintainedRepo]:
+        """Busy repositories that have gone idle, marked as running, as many as free jobs allow."""
+        with self._lock:
+            if now < self._resume_at:
+                return []
+            slots = self.jobs - sum(repo.running for repo in self._repos.values())
+            ready = sorted(
+                (repo for repo in self._repos.values()
+                 if not repo.running and repo.calls >= self.min_calls and now - repo.last_call >= self.idle),
+                key=lambda repo: -repo.calls,
+            )[:max(slots, 0)]
+            for repo in ready:
+                repo.running = True
+        return ready
+
+    async def _loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(min(self.idle, 5.0) or 0.1)
+            for repo in self.due(time.monotonic()):
+                run = loop.create_task(self._maintain(repo))
+                self._runs.add(run)
+                run.add_done_callback(self._runs.discard)
+
+    async def maintain(self, path: str) -> Optional[dict]:
+        """Maintain the repository at ``path`` now; None if it is already being maintained."""
+        key = _repo_key(path)
+        with self._lock:
+            repo = self._track(key)
+            if repo is None:
+                raise git.InvalidGitRepositoryError(path)
+            if repo.running:
+                return None
+            repo.running = True
+        return await self._maintain(repo)
+
+    def _probe(self, common: str, target: Optional[dict]) -> tuple:
+        """Time a full history walk and a path-limited one; returns (target, ms, cpu seconds)."""
+        if target is None:
+            try:
+                head = git_output(["--git-dir", common, "rev-parse", "-q", "--verify", "HEAD^{commit}"]).decode().strip()
+            except git.GitCommandError:
+                return None, None, 0.0
+            names = git_output(["--git-dir", common, "diff-tree", "--no-commit-id", "--name-only", "-r", "-z", head])
+            path = names.split(b"\0", 1)[0].decode("utf-8", "surrogateescape")
+            target = {"rev": head, "path": path or None}
+        wall = cpu = 0.0
+        commands = [["rev-list", "--count", target["rev"]]]
+        if target["path"]:
+            commands.append(["rev-list", "--count", target["rev"], "--", *_literal([target["path"]])])
+        for command in commands:
+            elapsed, used = run_measured(["--git-dir", common, *command])
+            wall += elapsed
+            cpu += used
+        return target, round(wall * 1000, 3), cpu
+
+    def _inspect(self, common: str, target: Optional[dict] = None) -> tuple:
+        state = count_objects(common)
+        target, state["probe_ms"], cpu = self._probe(common, target)
+        return state, target, cpu
+
+    def _run_step(self, common: str, name: str, *commands: List[str]) -> dict:
+        entry = {"task": name, "status": "ok"}
+        elapsed = cpu = 0.0
+        try:
+            for args in commands:
+                wall, used = run_measured(
+                    ["--git-dir", common, "-c", f"pack.threads={self.threads}", *args], self.nice
+                )
+                elapsed += wall
+                cpu += used
+        except git.GitCommandError as e:
+            entry["status"] = "failed"
+            entry["error"] = str(e)
+        entry.update(elapsed_ms=round(elapsed * 1000, 3), cpu_ms=round(cpu * 1000, 3))
+        return entry
+
+    async def _maintain(self, repo: _MaintainedRepo) -> dict:
+        record = {"started": datetime.now(timezone.utc).isoformat(timespec="seconds"), "tasks": []}
+        started = time.perf_counter()
+        cpu = 0.0
+        with self._lock:
+            repo.calls = 0
+            keys = list(repo.keys)
+        executor = self._get_executor()
+
+        def run(fn, *args):
+            return scheduler.run_locked(keys, executor, fn, *args)
+
+        async def task(name: str, *commands: List[str]):
+            nonlocal cpu
+            entry = await run(self._run_step, repo.common, name, *commands)
+            cpu += entry.get("cpu_ms", 0) / 1000
+            record["tasks"].append(entry)
+
+        try:
+            before, target, used = await run(self._inspect, repo.common)
+            cpu += used
+            record["before"] = before
+            await task("commit-graph", ["commit-graph", "write", "--reachable", "--changed-paths", "--split", "--no-progress"])
+            counts = before
+            if before["loose_objects"] >= self.loose_objects:
+                # The task prunes what is already packed before packing the
+                # rest, so the objects it packs stay loose until prune-packed.
+                await task("loose-objects", ["maintenance", "run", "--task=loose-objects", "--quiet"],
+                           ["prune-packed", "--quiet"])
+                counts = await run(count_objects, repo.common)
+            else:
+                record["tasks"].append({"task": "loose-objects", "status": "skipped",
+                                        "reason": f"{before['loose_objects']} loose objects, below {self.loose_objects}"})
+            # incremental-repack writes the multi-pack-index, drops packs it
+            # has made redundant and merges small ones in batches.
+            if counts["packs"] > 1:
+                await task("multi-pack-index", ["maintenance", "run", "--task=incremental-repack", "--quiet"])
+            else:
+                record["tasks"].append({"task": "multi-pack-index", "status": "skipped",
+                                        "reason": "at most one pack"})
+            after, _, used = await run(self._inspect, repo.common, target)
+            cpu += used
+            record["after"] = after
+            record["probe"] = target
+            if before["probe_ms"] and after["probe_ms"]:
+                record["speedup"] = round(before["probe_ms"] / after["probe_ms"], 2)
+        except Exception as e:
+            record["error"] = str(e)
+        finally:
+            record["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 3)
+            record["cpu_ms"] = round(cpu * 1000, 3)
+            failed = "error" in record or any(entry["status"] == "failed" for entry in record["tasks"])
+            with self._lock:
+                repo.running = False
+                repo.runs += 1
+                repo.history.append(record)
+                self.runs += 1
+                self.failed += failed
+                self.cpu_time += cpu
+                if self.cpu_share < 1:
+                    pause = cpu / max(self.cpu_share, 0.01) - cpu
+                    self._resume_at = max(self._resume_at, time.monotonic() + pause)
+        return record
+
+    def status(self, path: Optional[str] = None) -> dict:
+        with self._lock:
+            if path is None:
+                repos = list(self._repos.values())
+            else:
+                repo = self._keys.get(_repo_key(path)) or self._repos.get(_common_dir(_repo_key(path)))
+                repos = [repo] if repo is not None else []
+            now = time.monotonic()
+            return {
+                "enabled": True,
+                "idle": self.idle,
+                "min_calls": self.min_calls,
+                "jobs": self.jobs,
+                "cpu_share": self.cpu_share,
+                "paused_seconds": round(max(self._resume_at - now, 0.0), 3),
+                "repos": [
+                    {
+                        "repo": repo.common,
+                        "calls": repo.calls,
+                        "total_calls": repo.total_calls,
+                        "idle_seconds": round(now - repo.last_call, 3),
+                        "running": repo.running,
+                        "runs": repo.runs,
+                        "history": list(repo.history),
+                    }
+                    for repo in repos
+                ],
+            }
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "repos": len(self._repos),
+                "running": sum(repo.running for repo in self._repos.values()),
+                "runs": self.runs,
+                "failed": self.failed,
+                "cpu_time": self.cpu_time,
+            }
+
+
+maintenance = RepoMaintenance() if GIT_MCP_MAINTENANCE else None
+
+
+@tool(
+    "git_maintenance_status",
+    "Report background repository maintenance: request volume per repository, the commit-graph, "
+    "loose-object and multi-pack-index work done, and the measured history-walk speedup",
+    GitMaintenanceStatusArgs,
+    scheduled=False,
+)
+def _git_maintenance_status(args: GitMaintenanceStatusArgs) -> str:
+    check_format(args.format)
+    if maintenance is None:
+        return encode_result({"enabled": False, "repos": []}, args.format, records="repos")
+    return encode_result(maintenance.status(args.path), args.format, records="repos")
+
+
+server = Server("git-mcp")
+
+
+@functools.lru_cache(maxsize=None)
+def tool_definitions() -> tuple:
+    """Tool definitions with their JSON schemas, generated once per process."""
+    return tuple(
+        types.Tool(name=spec.name, description=spec.description, inputSchema=spec.args.model_json_schema())
+        for spec in TOOLS.values()
+    )
+
+
+@server.list_tools()
+async def handle_list_tools() -> List[types.Tool]:
+    return list(tool_definitions())
+
+
+async def run_tool(name: str, arguments: dict) -> List[str]:
+    """Validate arguments and run one tool, returning its text items."""
+    spec = TOOLS.get(name)
+    if spec is None:
+        raise ValueError(f"Unknown tool: {name}")
+    args = spec.args(**arguments)
+    if spec.scheduled:
+        result = await scheduler.run(args.path, spec.handler, args, write=spec.writes(args))
+    else:
+        result = spec.handler(args)
+        if asyncio.iscoroutine(result):
+            result = await result
+    if isinstance(result, str):
+        result = [result]
+    return result
+
+
+async def _run_batch_op(op: GitBatchOperation, path: str) -> dict:
+    arguments = {"path": path, **op.arguments}
+    start = time.perf_counter()
+    entry = {"tool": op.tool, "ok": True}
+    try:
+        if op.tool == "git_batch":
+            raise ValueError("git_batch cannot be nested")
+        entry["content"] = await run_tool(op.tool, arguments)
+    except Exception as e:
+        entry["ok"] = False
+        entry["error"] = str(e)
+    entry["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 3)
+    return entry
+
+
+def _batch_barrier(op: GitBatchOperation, path: str) -> bool:
+    """Whether ``op`` writes, judged on its own arguments the way the scheduler judges a call."""
+    spec = TOOLS.get(op.tool)
+    if spec is None or spec.write is False:
+        return False
+    try:
+        return spec.writes(spec.args(**{"path": path, **op.arguments}))
+    except ValidationError:
+        # Fails the same way when it runs, without touching the repo.
+        return False
+
+
+@tool(
+    "git_batch",
+    "Run several git tools against one repository in a single call and return all results with per-operation timing",
+    GitBatchArgs,
+    scheduled=False,
+)
+async def _git_batch(args: GitBatchArgs) -> str:
+    check_format(args.format)
+    start = time.perf_counter()
+    results = []
+    reads = []
+    for op in args.operations:
+        if _batch_barrier(op, args.path):
+            # Writes are barriers: everything before them finishes first and
+            # everything after them sees their effect.
+            results += await asyncio.gather(*(_run_batch_op(read, args.path) for read in reads))
+            reads = []
+            results.append(await _run_batch_op(op, args.path))
+        else:
+            reads.append(op)
+    results += await asyncio.gather(*(_run_batch_op(read, args.path) for read in reads))
+    return encode_result({
+        "results": results,
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 3),
+    }, args.format, records="results")
+
+
+GIT_MCP_WORKSPACE_JOBS = int(os.environ.get("GIT_MCP_WORKSPACE_JOBS", max(1, GIT_MCP_WORKERS // 2)))
+_WORKSPACE_IGNORE = ["node_modules"]
+
+
+def find_repositories(root: str, max_depth: int, ignore: List[str], limit: int) -> tuple:
+    """Walk root breadth-first for worktrees, not descending into repos or symlinks.
+
+    Returns (relative paths, truncated).
+    """
+    root = os.path.realpath(root)
+    if not os.path.isdir(root):
+        raise git.NoSuchPathError(root)
+    found = []
+    level = [""]
+    for depth in range(max_depth + 1):
+        below = []
+        for rel in level:
+            full = os.path.join(root, rel)
+            if os.path.lexists(os.path.join(full, ".git")):
+                if len(found) == limit:
+                    return found, True
+                found.append(rel or ".")
+                continue
+            if depth == max_depth:
+                continue
+            try:
+                entries = sorted(os.scandir(full), key=lambda e: e.name)
+            except OSError:
+                continue
+            for entry in entries:
+                if entry.name == ".git" or not entry.is_dir(follow_symlinks=False):
+                    continue
+                child = f"{rel}/{entry.name}" if rel else entry.name
+                if any(fnmatch.fnmatch(entry.name, pattern) or fnmatch.fnmatch(child, pattern) for pattern in ignore):
+                    continue
+                below.append(child)
+        level = below
+    return found, False
+
+
+def workspace_repo_status(path: str, untracked: str, timeout: float) -> dict:
+    """One porcelain v2 status call reduced to counts and branch state."""
+    start = time.perf_counter()
+    entry = {"ok": True}
+    try:
+        out = git_output(
+            ["--no-optional-locks", "status", "--porcelain=v2", "--branch", "-z", f"--untracked-files={untracked}"],
+            cwd=path,
+            timeout=timeout,
+        )
+        status = parse_status_v2(out)
+        entry.update(status["branch"])
+        for key in ("staged", "unstaged", "untracked", "conflicted"):
+            entry[key] = len(status[key])
+        entry["clean"] = status["clean"]
+    except subprocess.TimeoutExpired:
+        entry.update(ok=False, timed_out=True, error=f"timed out after {timeout:g}s")
+    except git.GitCommandError as e:
+        entry.update(ok=False, error=(e.stderr or str(e)).strip())
+    entry["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 3)
+    return entry
+
+
+def _progress_reporter():
+    """Return an async callback sending MCP progress notifications, or None."""
+    try:
+        ctx = server.request_context
+    except LookupError:
+        return None
+    token = ctx.meta.progressToken if ctx.meta is not None else None
+    if token is None:
+        return None
+
+    async def report(progress: int, total: int, message: str):
+        await ctx.session.send_progress_notification(
+            token, progress, total, message, related_request_id=str(ctx.request_id)
+        )
+    return report
+
+
+@tool(
+    "git_workspace_status",
+    "Find git repositories under a directory and report which are dirty, ahead or behind, checking them in parallel",
+    GitWorkspaceStatusArgs,
+    scheduled=False,
+)
+async def _git_workspace_status(args: GitWorkspaceStatusArgs) -> str:
+    start = time.perf_counter()
+    if args.untracked_files not in ("no", "normal", "all"):
+        raise ValueError(f"Invalid untracked_files: {args.untracked_files}")
+    check_format(args.format)
+    root = os.path.realpath(args.path)
+    ignore = _WORKSPACE_IGNORE if args.ignore is None else args.ignore
+    repos, truncated = await scheduler.run(
+        root, find_repositories, root, args.max_depth or 0, ignore, args.max_repos or 0
+    )
+    report = _progress_reporter()
+    jobs = asyncio.Semaphore(GIT_MCP_WORKSPACE_JOBS)
+    timeout = args.timeout or None
+    results = []
+
+    async def check(rel: str) -> dict:
+        async with jobs:
+            entry = await scheduler.run(
+                os.path.join(root, rel), workspace_repo_status,
+                os.path.join(root, rel), args.untracked_files, timeout,
+            )
+        return {"path": rel, **entry}
+
+    # Results are streamed as progress notifications in completion order so a
+    # slow repository does not hold back the rest.
+    for done in asyncio.as_completed([check(rel) for rel in repos]):
+        entry = await done
+        results.append(entry)
+        if report is not None:
+            await report(len(results), len(repos), json.dumps(entry))
+
+    results.sort(key=lambda entry: entry["path"])
+    return encode_result({
+        "root": root,
+        "repos": results,
+        "summary": {
+            "total": len(results),
+            "dirty": sum(1 for entry in results if entry["ok"] and not entry["clean"]),
+            "ahead": sum(1 for entry in results if entry.get("ahead")),
+            "behind": sum(1 for entry in results if entry.get("behind")),
+            "errors": sum(1 for entry in results if not entry["ok"]),
+            "truncated": truncated,
+        },
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 3),
+    }, args.format, records="repos")
+
+
+def server_stats() -> dict:
+    stats = {
+        "scheduler": scheduler.stats(),
+        "repo_cache": repo_cache.stats(),
+        "blame_cache": blame_cache.stats(),
+        "response_cache": response_cache.stats(),
+        "worktree_pool": worktree_pool.stats(),
+    }
+    if status_watcher is not None:
+        stats["watcher"] = status_watcher.stats()
+    if maintenance is not None:
+        stats["maintenance"] = maintenance.stats()
+    return stats
+
+
+def openmetrics_text() -> str:
+    return metrics.openmetrics(server_stats())
+
+
+@tool(
+    "git_server_stats",
+    "Report server metrics: per-tool latency, output sizes, errors, git subprocess counts, queueing and cache statistics",
+    GitServerStatsArgs,
+    scheduled=False,
+)
+def _git_server_stats(args: GitServerStatsArgs) -> str:
+    if args.openmetrics:
+        return openmetrics_text()
+    return encode_result({**metrics.snapshot(), **server_stats()}, args.format)
+
+
+# Arguments are validated by the pydantic models the schemas are generated
+# from; the SDK's extra jsonschema pass rebuilds a validator on every call.
+@server.call_tool(validate_input=False)
+async def handle_call_tool(
+    name: str, arguments: dict
+) -> List[Union[types.TextContent, types.ImageContent, types.EmbeddedResource]]:
+    timing = CallTiming()
+    token = _call_timing.set(timing)
+    started = time.perf_counter()
+    error = None
+    try:
+        result = await run_tool(name, arguments)
+    except Exception as e:
+        error = type(e).__name__
+        result = [f"Error: {str(e)}"]
+    finally:
+        _call_timing.reset(token)
+    metrics.record(
+        name if name in TOOLS else "unknown",
+        time.perf_counter() - started,
+        sum(len(text.encode("utf-8", "surrogateescape")) for text in result),
+        timing,
+        error,
+    )
+    return [types.TextContent(type="text", text=text) for text in result]
+
+
+def _initialization_options() -> InitializationOptions:
+    return InitializationOptions(
+        server_name="git-mcp",
+        server_version="0.1.0",
+        capabilities=server.get_capabilities(
+            notification_options=NotificationOptions(),
+            experimental_capabilities={},
+        ),
+    )
+
+
+class _ASGIEndpoint:
+    """Starlette routes treat callable instances as raw ASGI apps."""
+
+    def __init__(self, handler):
+        self.handler = handler
+
+    async def __call__(self, scope, receive, send):
+        await self.handler(scope, receive, send)
+
+
+_LOOPBACK_HOSTS = ("127.0.0.1", "localhost", "[::1]")
+
+
+def http_security(host: str, port: int, allowed_hosts: Optional[List[str]] = None,
+                  allowed_origins: Optional[List[str]] = None):
+    """Host and Origin checks for the HTTP transports, against DNS rebinding.
+
+    By default only the address the server listens on is accepted (all
+    loopback names for a loopback address), and only browser pages served
+    from it.
+    """
+    from mcp.server.transport_security import TransportSecuritySettings
+
+    if allowed_hosts is None:
+        name = f"[{host}]" if ":" in host else host
+        names = _LOOPBACK_HOSTS if name in _LOOPBACK_HOSTS else (name,)
+        allowed_hosts = [f"{name}:{port}" for name in names]
+    if allowed_origins is None:
+        allowed_origins = [f"http://{allowed}" for allowed in allowed_hosts]
+    return TransportSecuritySettings(
+        enable_dns_rebinding_protection=True, allowed_hosts=allowed_hosts, allowed_origins=allowed_origins,
+    )
+
+
+def create_http_app(json_response: bool = False, host: str = "127.0.0.1", port: int = 8000,
+                    allowed_hosts: Optional[List[str]] = None, allowed_origins: Optional[List[str]] = None):
+    """Build a Starlette app serving streamable HTTP on /mcp, legacy SSE on /sse and OpenMetrics on /metrics."""
+    from starlette.applications import Starlette
+    from starlette.responses import PlainTextResponse
+    from starlette.routing import Mount, Route
+    from mcp.server.sse import SseServerTransport
+    from mcp.server.streamable_http_manager import StreamableHTTPSessionManager
+
+    security = http_security(host, port, allowed_hosts, allowed_origins)
+    manager = StreamableHTTPSessionManager(app=server, json_response=json_response, security_settings=security)
+    sse = SseServerTransport("/messages/", security_settings=security)
+
+    async def handle_sse(scope, receive, send):
+        async with sse.connect_sse(scope, receive, send) as (read_stream, write_stream):
+            await server.run(read_stream, write_stream, _initialization_options())
+
+    async def handle_metrics(request):
+        return PlainTextResponse(
+            openmetrics_text(), media_type="application/openmetrics-text; version=1.0.0; charset=utf-8"
+        )
+
+    @contextlib.asynccontextmanager
+    async def lifespan(app):
+        async with manager.run():
+            yield
+
+    return Starlette(
+        routes=[
+            Route("/mcp", endpoint=_ASGIEndpoint(manager.handle_request)),
+            Route("/sse", endpoint=_ASGIEndpoint(handle_sse)),
+            Route("/metrics", endpoint=handle_metrics),
+            Mount("/messages/", app=sse.handle_post_message),
+        ],
+        lifespan=lifespan,
+    )
+
+
+async def main(transport: str = "stdio", host: str = "127.0.0.1", port: int = 8000,
+               allowed_hosts: Optional[List[str]] = None, allowed_origins: Optional[List[str]] = None):
+    try:
+        if transport == "stdio":
+            async with mcp.server.stdio.stdio_server() as (read_stream, write_stream):
+                await server.run(read_stream, write_stream, _initialization_options())
+        elif transport == "http":
+            import uvicorn
+
+            app = create_http_app(host=host, port=port, allowed_hosts=allowed_hosts, allowed_origins=allowed_origins)
+            config = uvicorn.Config(app, host=host, port=port, log_level="warning")
+            await uvicorn.Server(config).serve()
+        else:
+            raise ValueError(f"Unknown transport: {transport}")
+    finally:
+        if status_watcher is not None:
+            status_watcher.close()
+        worktree_pool.close()
+        repo_cache.clear()
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="MCP server for Git operations")
+    parser.add_argument(
+        "--transport", choices=("stdio", "http"), default=os.environ.get("GIT_MCP_TRANSPORT", "stdio"),
+        help="stdio for a single client, or http to serve streamable HTTP (/mcp) and SSE (/sse) to many clients",
+    )
+    parser.add_argument("--host", default=os.environ.get("GIT_MCP_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("GIT_MCP_PORT", 8000)))
+    parser.add_argument(
+        "--allowed-host", dest="allowed_hosts", action="append", default=_env_list("GIT_MCP_ALLOWED_HOSTS"),
+        help="Host header value (host:port, or host:* for any port) accepted over HTTP; repeatable. "
+             "Defaults to the --host/--port address",
+    )
+    parser.add_argument(
+        "--allowed-origin", dest="allowed_origins", action="append", default=_env_list("GIT_MCP_ALLOWED_ORIGINS"),
+        help="Origin header value accepted over HTTP; repeatable. Defaults to http:// plus each allowed host",
+    )
+    return parser.parse_args(argv)
+
+
+def _env_list(name: str) -> Optional[List[str]]:
+    value = os.environ.get(name)
+    return [item.strip() for item in value.split(",") if item.strip()] if value else None
+
+
+def run(argv: Optional[List[str]] = None):
+    """Console script entry point."""
+    options = parse_args(argv)
+    asyncio.run(main(options.transport, options.host, options.port, options.allowed_hosts, options.allowed_origins))
+
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    run()
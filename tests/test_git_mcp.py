@@ -1,18 +1,26 @@
 #!/usr/bin/env python3
 
 import pytest
+import asyncio
 import json
+import threading
+import time
 import tempfile
 import os
 import shutil
-from git import Repo
+import subprocess
+from pathlib import Path
+from git import Actor, Repo
 import sys
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from git_mcp import (
     GitStatusArgs, GitLogArgs, GitDiffArgs, GitCommitArgs,
-    GitBranchArgs, GitCheckoutArgs, handle_list_tools, handle_call_tool
+    GitBranchArgs, GitCheckoutArgs, handle_list_tools, handle_call_tool,
+    RepoScheduler, RepoCache, find_git_dir, parse_commit, parse_status_v2,
+    StatusWatcher
 )
+import git_mcp
 
 
 class TestGitMCP:
@@ -54,13 +62,40 @@ class TestGitMCP:
     async def test_handle_list_tools(self):
         """Test listing available tools"""
         tools = await handle_list_tools()
-        assert len(tools) == 6
+        assert len(tools) == 18
         
         tool_names = [tool.name for tool in tools]
-        expected_tools = ["git_status", "git_log", "git_diff", "git_commit", "git_branch", "git_checkout"]
+        expected_tools = ["git_status", "git_log", "git_diff", "git_search_commits", "git_diff_revs", "git_workspace_status", "git_server_stats", "git_batch", "git_blame", "git_show_file", "git_show_files", "git_grep", "git_commit", "git_branch", "git_checkout", "git_worktree_lease", "git_worktree_release", "git_maintenance_status"]
         for expected in expected_tools:
             assert expected in tool_names
-    
+        assert tool_names == list(git_mcp.TOOLS)
+        assert (await handle_list_tools())[0] is tools[0]
+
+    def test_lazy_gitpython_import(self):
+        """Importing the server does not import GitPython"""
+        code = "import sys, git_mcp; print('git.repo' in sys.modules)"
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, cwd=root, check=True)
+        assert result.stdout.strip() == "False"
+
+        # The first use may come from several worker threads at once.
+        code = (
+            "import threading, git_mcp\n"
+            "barrier, errors = threading.Barrier(16), []\n"
+            "def touch():\n"
+            "    barrier.wait()\n"
+            "    try:\n"
+            "        git_mcp.git.GitCommandError\n"
+            "    except Exception as e:\n"
+            "        errors.append(e)\n"
+            "threads = [threading.Thread(target=touch) for _ in range(16)]\n"
+            "[t.start() for t in threads]\n"
+            "[t.join() for t in threads]\n"
+            "print(errors)\n"
+        )
+        result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, cwd=root, check=True)
+        assert result.stdout.strip() == "[]"
+
     @pytest.mark.asyncio
     async def test_git_status(self):
         """Test git status functionality"""
@@ -69,6 +104,38 @@ class TestGitMCP:
         assert result[0].type == "text"
         assert "nothing to commit" in result[0].text.lower()
     
+    @pytest.mark.asyncio
+    async def test_git_status_structured(self):
+        """Test porcelain v2 status parsing and status accelerations"""
+        with open(os.path.join(self.test_dir, "test.txt"), "a") as f:
+            f.write("\nchanged")
+        with open(os.path.join(self.test_dir, "new file.txt"), "w") as f:
+            f.write("new")
+        with open(os.path.join(self.test_dir, "untracked.txt"), "w") as f:
+            f.write("untracked")
+        self.repo.index.add(["new file.txt"])
+        self.repo.git.mv("test.txt", "moved.txt")
+
+        result = await handle_call_tool("git_status", {
+            "path": self.test_dir, "structured": True, "untracked_cache": True,
+        })
+        status = json.loads(result[0].text)
+        assert status["branch"]["head"] == self.repo.active_branch.name
+        assert status["branch"]["oid"] == self.repo.head.commit.hexsha
+        assert {"path": "new file.txt", "status": "added"} in status["staged"]
+        renamed = [e for e in status["staged"] if e["status"] == "renamed"]
+        assert renamed[0]["path"] == "moved.txt" and renamed[0]["orig_path"] == "test.txt"
+        assert status["unstaged"][0]["path"] == "moved.txt"
+        assert status["untracked"] == ["untracked.txt"]
+        assert status["clean"] is False
+        assert status["settings"] == {"untracked_cache": True}
+        assert self.repo.config_reader().get_value("core", "untrackedCache") is True
+
+        result = await handle_call_tool("git_status", {
+            "path": self.test_dir, "structured": True, "untracked_files": "no",
+        })
+        assert json.loads(result[0].text)["untracked"] == []
+
     @pytest.mark.asyncio
     async def test_git_log(self):
         """Test git log functionality"""
@@ -79,6 +146,289 @@ class TestGitMCP:
         assert len(commits) == 1
         assert commits[0]["message"] == "Initial commit"
     
+    @pytest.mark.asyncio
+    async def test_git_log_matches_gitpython(self):
+        """Test that the cat-file reader path returns what GitPython reports"""
+        for i in range(3):
+            with open(os.path.join(self.test_dir, "test.txt"), "a") as f:
+                f.write(f"\nline {i}")
+            self.repo.index.add(["test.txt"])
+            self.repo.index.commit(f"Commit {i}\n\nBody {i}")
+
+        result = await handle_call_tool("git_log", {"path": self.test_dir, "limit": 3})
+        commits = json.loads(result[0].text)
+        expected = list(self.repo.iter_commits(max_count=3))
+        assert [c["hash"] for c in commits] == [c.hexsha for c in expected]
+        assert [c["author"] for c in commits] == [str(c.author) for c in expected]
+        assert [c["date"] for c in commits] == [c.committed_datetime.isoformat() for c in expected]
+        assert commits[0]["message"] == "Commit 2\n\nBody 2"
+
+    async def _walk_pages(self, **arguments):
+        messages, cursor, pages = [], None, 0
+        while True:
+            result = await handle_call_tool(
+                "git_log", {"path": self.test_dir, "cursor": cursor, **arguments}
+            )
+            messages += [c["message"] for c in json.loads(result[0].text)]
+            pages += 1
+            if len(result) == 1:
+                return messages, pages
+            cursor = json.loads(result[1].text)["next_cursor"]
+
+    @pytest.mark.asyncio
+    async def test_git_log_pagination(self):
+        """Test cursor pagination and filters over a merged history"""
+        base = self.repo.head.commit
+        alice, bob = Actor("Alice", "a@example.com"), Actor("Bob", "b@example.com")
+
+        def commit(message, parents, author, day):
+            date = f"2099-01-0{day}T00:00:00"
+            return self.repo.index.commit(
+                message, parent_commits=parents, head=False, author=author,
+                committer=author, author_date=date, commit_date=date,
+            )
+
+        s1 = commit("s1", [base], alice, 2)
+        s2 = commit("s2", [s1], alice, 4)
+        m1 = commit("m1", [base], alice, 3)
+        merge = commit("merge", [m1, s2], bob, 5)
+        self.repo.head.reference.set_commit(merge)
+
+        full, _ = await self._walk_pages(limit=None)
+        assert full == ["merge", "s2", "m1", "s1", "Initial commit"]
+        for limit in (1, 2):
+            assert await self._walk_pages(limit=limit) == (full, -(-len(full) // limit))
+
+        alice_only, _ = await self._walk_pages(limit=None, author="Alice")
+        assert alice_only == ["s2", "m1", "s1"]
+        assert (await self._walk_pages(limit=1, author="Alice"))[0] == alice_only
+
+        ranged, _ = await self._walk_pages(limit=1, rev=f"{s1.hexsha}..{merge.hexsha}")
+        assert ranged == ["merge", "s2", "m1"]
+
+        result = await handle_call_tool("git_log", {"path": self.test_dir, "cursor": "bogus"})
+        assert "Error:" in result[0].text
+        result = await handle_call_tool("git_log", {"path": self.test_dir, "limit": 0})
+        assert result[0].text == "Error: limit must be at least 1"
+
+    @pytest.mark.asyncio
+    async def test_git_search_commits(self):
+        """Test the commit index: search filters, incremental updates and rewrites"""
+        os.makedirs(os.path.join(self.test_dir, "src"))
+        alice = Actor("Alice", "a@example.com")
+        for i, (name, message) in enumerate([("src/app.py", "Fix login crash"), ("docs.md", "Document login flow")]):
+            with open(os.path.join(self.test_dir, name), "w") as f:
+                f.write(message)
+            self.repo.index.add([name])
+            date = f"2099-01-0{i + 2}T00:00:00"
+            self.repo.index.commit(message, author=alice, committer=alice, author_date=date, commit_date=date)
+
+        async def search(**kwargs):
+            result = await handle_call_tool("git_search_commits", {"path": self.test_dir, **kwargs})
+            return [c["message"] for c in json.loads(result[0].text)]
+
+        assert await search(query="login") == ["Document login flow", "Fix login crash"]
+        assert await search(query="login", touched_path="src") == ["Fix login crash"]
+        assert await search(author="alice", since="2099-01-02T12:00:00") == ["Document login flow"]
+        assert await search(until="2099-01-01T12:00:00") == ["Initial commit"]
+        assert os.path.exists(os.path.join(self.test_dir, ".git", "git-mcp", "commits.sqlite3"))
+
+        self.repo.head.reset("HEAD~1", index=True, working_tree=True)
+        assert await search(query="login") == ["Fix login crash"]
+        date = "2099-01-05T00:00:00"
+        self.repo.index.commit("Rewrite login docs", author=alice, committer=alice, author_date=date, commit_date=date)
+        assert await search(query="login", limit=1) == ["Rewrite login docs"]
+
+    @pytest.mark.asyncio
+    async def test_output_formats(self):
+        """Test compact, ndjson and columnar encodings plus hash/body options"""
+        self.repo.index.commit("Subject line\n\nLonger body text")
+        base = {"path": self.test_dir, "limit": 5}
+        full = json.loads((await handle_call_tool("git_log", base))[0].text)
+
+        compact = await handle_call_tool("git_log", {**base, "format": "compact"})
+        assert "\n" not in compact[0].text.replace("\\n", "")
+        assert json.loads(compact[0].text) == full
+
+        lines = (await handle_call_tool("git_log", {**base, "format": "ndjson"}))[0].text.split("\n")
+        assert [json.loads(line) for line in lines] == full
+
+        table = json.loads((await handle_call_tool("git_log", {
+            **base, "format": "columnar", "abbrev": 7, "body": False,
+        }))[0].text)
+        assert table["fields"] == ["hash", "author", "date", "message"]
+        assert [row[0] for row in table["rows"]] == [self.repo.git.rev_parse(c["hash"], short=7) for c in full]
+        assert table["rows"][0][3] == "Subject line"
+
+        branches = json.loads((await handle_call_tool("git_branch", {"path": self.test_dir, "format": "columnar"}))[0].text)
+        assert branches["fields"][:3] == ["name", "type", "current"] and branches["rows"][0][2] is True
+
+        batch = (await handle_call_tool("git_batch", {
+            "path": self.test_dir, "format": "ndjson", "operations": [{"tool": "git_branch"}, {"tool": "git_status"}],
+        }))[0].text.split("\n")
+        assert list(json.loads(batch[0])) == ["elapsed_ms"]
+        assert [json.loads(line)["tool"] for line in batch[1:]] == ["git_branch", "git_status"]
+
+        result = await handle_call_tool("git_log", {**base, "format": "yaml"})
+        assert "Unknown format" in result[0].text
+
+    @pytest.mark.asyncio
+    async def test_git_blame(self):
+        """Test blame hunks, line ranges and the (commit, path) cache"""
+        def commit(content, message, author):
+            with open(os.path.join(self.test_dir, "test.txt"), "w") as f:
+                f.write(content)
+            self.repo.index.add(["test.txt"])
+            return self.repo.index.commit(message, author=author, committer=author).hexsha
+
+        first = commit("first\n", "Start file", Actor("Alice", "a@example.com"))
+        second = commit("first\nsecond\nthird\n", "Add lines", Actor("Bob", "b@example.com"))
+
+        async def blame(**kwargs):
+            result = await handle_call_tool("git_blame", {"path": self.test_dir, "file": "test.txt", **kwargs})
+            return json.loads(result[0].text)
+
+        before = git_mcp.blame_cache.stats()
+        result = await blame(start_line=2, end_line=3)
+        assert result["commit"] == second and result["cached"] is False
+        assert [(h["start"], h["end"], h["commit"], h["author"]) for h in result["hunks"]] == [(2, 3, second, "Bob")]
+
+        result = await blame()
+        assert result["cached"] is False
+        assert [(h["start"], h["end"], h["commit"]) for h in result["hunks"]] == [(1, 1, first), (2, 3, second)]
+        assert (await blame(start_line=1, end_line=2))["cached"] is True
+        assert (await blame(rev=first))["hunks"][0]["summary"] == "Start file"
+        stats = git_mcp.blame_cache.stats()
+        assert stats["hits"] == before["hits"] + 1 and stats["misses"] == before["misses"] + 3
+
+        result = await handle_call_tool("git_blame", {"path": self.test_dir, "file": "test.txt", "start_line": 9})
+        assert "has only 3 lines" in result[0].text
+
+    @pytest.mark.asyncio
+    async def test_git_show_file(self, monkeypatch):
+        """Test blob reads: ranges, binary content, worktree mmap and the batched variant"""
+        big = os.path.join(self.test_dir, "big.txt")
+        with open(big, "w") as f:
+            f.write("".join(f"line {i}\n" for i in range(1000)))
+        with open(os.path.join(self.test_dir, "blob.bin"), "wb") as f:
+            f.write(b"\0\1\2")
+        os.utime(big, (time.time() - 60, time.time() - 60))
+        self.repo.git.add("big.txt", "blob.bin")
+        self.repo.index.commit("Add files")
+
+        async def show(**kwargs):
+            result = await handle_call_tool("git_show_file", {"path": self.test_dir, **kwargs})
+            return json.loads(result[0].text)
+
+        result = await show(file="test.txt", rev="HEAD~1")
+        assert result["content"] == "Initial content" and result["source"] == "object-reader"
+        assert result["next_offset"] is None
+        result = await show(file="blob.bin")
+        assert result["binary"] is True and result["content"] == "AAEC"
+
+        monkeypatch.setattr(git_mcp, "GIT_MCP_BLOB_INLINE_BYTES", 100)
+        # Cached answers keep the source that first computed them.
+        monkeypatch.setattr(git_mcp, "response_cache", git_mcp.ResponseCache(max_bytes=0, directory=None))
+        result = await show(file="big.txt", offset=7, length=14)
+        assert result["source"] == "worktree"
+        assert result["content"] == "line 1\nline 2\n" and result["next_offset"] == 21
+        with open(big, "a") as f:
+            f.write("changed\n")
+        result = await show(file="big.txt", offset=7, length=14)
+        assert result["source"] == "stream" and result["content"] == "line 1\nline 2\n"
+
+        result = await handle_call_tool("git_show_files", {
+            "path": self.test_dir, "files": ["test.txt", "big.txt", "missing.txt"], "max_bytes": 4,
+        })
+        files = json.loads(result[0].text)["files"]
+        assert [f.get("content") for f in files] == ["Init", "line", None]
+        assert files[2]["error"] == "not found"
+        result = await handle_call_tool("git_show_file", {"path": self.test_dir, "file": "missing.txt"})
+        assert "not found" in result[0].text
+        result = await handle_call_tool("git_show_file", {"path": self.test_dir, "file": "no such file.txt"})
+        assert "not found" in result[0].text
+
+    @pytest.mark.asyncio
+    async def test_git_show_file_eol_conversion(self, monkeypatch):
+        """Test that a worktree copy converted on checkout is never served as the blob"""
+        Path(self.test_dir, ".gitattributes").write_text("* text eol=crlf\n")
+        Path(self.test_dir, "big.txt").write_text("".join(f"line {i}\n" for i in range(300)))
+        # No line endings to convert, so only the attribute rules it out.
+        Path(self.test_dir, "flat.txt").write_text("x" * 200)
+        self.repo.git.add(".gitattributes", "big.txt", "flat.txt")
+        self.repo.index.commit("Add big.txt")
+        os.remove(os.path.join(self.test_dir, "big.txt"))
+        self.repo.git.checkout("--", "big.txt")
+        past = time.time() - 60
+        for name in ("big.txt", "flat.txt"):
+            os.utime(os.path.join(self.test_dir, name), (past, past))
+        self.repo.git.update_index("--refresh")
+        assert b"\r\n" in Path(self.test_dir, "big.txt").read_bytes()
+        monkeypatch.setattr(git_mcp, "GIT_MCP_BLOB_INLINE_BYTES", 100)
+        monkeypatch.setattr(git_mcp, "response_cache", git_mcp.ResponseCache(max_bytes=0, directory=None))
+
+        result = await handle_call_tool("git_show_file", {"path": self.test_dir, "file": "big.txt"})
+        record = json.loads(result[0].text)
+        assert record["source"] == "stream"
+        assert "\r" not in record["content"] and record["length"] == record["size"] == 2590
+        result = await handle_call_tool("git_show_file", {"path": self.test_dir, "file": "flat.txt"})
+        assert json.loads(result[0].text)["source"] == "stream"
+
+    @pytest.mark.asyncio
+    async def test_git_grep(self, monkeypatch):
+        """Test git grep over the worktree and a revision, with caps and streamed batches"""
+        os.makedirs(os.path.join(self.test_dir, "src"))
+        with open(os.path.join(self.test_dir, "src", "app.py"), "w") as f:
+            f.write("".join(f"value = {i}  # TODO\n" for i in range(100)))
+        self.repo.index.add(["src/app.py"])
+        first = self.repo.index.commit("Add app").hexsha
+        with open(os.path.join(self.test_dir, "test.txt"), "w") as f:
+            f.write("todo later\n")
+
+        async def grep(**kwargs):
+            result = await handle_call_tool("git_grep", {"path": self.test_dir, **kwargs})
+            return json.loads(result[0].text)
+
+        result = await grep(pattern="todo", ignore_case=True, paths=["*.txt"])
+        assert result["matches"] == [{"path": "test.txt", "line": 1, "column": 1, "text": "todo later"}]
+        assert result["commit"] is None and result["truncated"] is False
+        assert (await grep(pattern="todo", rev="HEAD", paths=["*.txt"]))["matches"] == []
+
+        result = await grep(pattern="TODO", rev=first, mode="fixed", max_results=10)
+        assert len(result["matches"]) == 10 and result["truncated"] is True
+        assert result["matches"][3] == {"path": "src/app.py", "line": 4, "column": 14, "text": "value = 3  # TODO"}
+        result = await grep(pattern="value = [0-9]+", max_per_file=2, max_results=None)
+        assert [m["line"] for m in result["matches"]] == [1, 2] and result["files"] == 1
+
+        batches = []
+
+        async def report(progress, total, message):
+            batches.append((progress, json.loads(message)["matches"]))
+
+        monkeypatch.setattr(git_mcp, "_progress_reporter", lambda: report)
+        result = await grep(pattern="TODO", max_results=None)
+        assert [m for _, batch in batches for m in batch] == result["matches"]
+        assert batches[-1][0] == 100
+
+        result = await handle_call_tool("git_grep", {"path": self.test_dir, "pattern": "(", "mode": "basic"})
+        assert result[0].text.startswith("Error:") is False
+        result = await handle_call_tool("git_grep", {"path": self.test_dir, "pattern": "(", "mode": "extended"})
+        assert result[0].text.startswith("Error:")
+
+    def test_blame_cache_eviction(self):
+        """Test that the blame cache evicts least recently used entries by line count"""
+        cache = git_mcp.BlameCache(max_lines=4)
+        entry = lambda n: git_mcp._BlameEntry({i: ("c", "f", i) for i in range(1, n + 1)}, {}, n)
+        cache.put(("a", "f"), entry(2))
+        cache.put(("b", "f"), entry(2))
+        cache.get(("a", "f"))
+        cache.put(("c", "f"), entry(2))
+        assert cache.get(("b", "f")) is None
+        assert cache.get(("a", "f")) is not None
+        cache.put(("d", "f"), entry(5))
+        assert cache.get(("d", "f")) is None
+        assert cache.stats()["lines"] == 4 and cache.stats()["evictions"] == 1
+
     @pytest.mark.asyncio
     async def test_git_branch(self):
         """Test git branch functionality"""
@@ -88,6 +438,39 @@ class TestGitMCP:
         branches = json.loads(result[0].text)
         assert any(b["name"] == "master" or b["name"] == "main" for b in branches)
         assert any(b["current"] for b in branches)
+
+    @pytest.mark.asyncio
+    async def test_git_branch_refs(self, tmp_path):
+        """Test tip info, upstream tracking, tags, pattern/sort/limit and detached HEAD"""
+        head = self.repo.head.commit
+        self.repo.create_head("feature/a")
+        with self.repo.config_writer() as config:
+            config.set_value("user", "name", "Test User").set_value("user", "email", "test@example.com")
+        self.repo.create_tag("v1", message="Release one")
+        clone = Repo.clone_from(self.test_dir, tmp_path / "clone")
+        clone.index.commit("Local work")
+        odd = clone.index.commit("Odd \x1c\x85\u2028\f subject")
+
+        async def branches(path, **kwargs):
+            result = await handle_call_tool("git_branch", {"path": str(path), **kwargs})
+            return json.loads(result[0].text)
+
+        local = (await branches(tmp_path / "clone"))[0]
+        assert local["current"] and local["commit"] == odd.hexsha
+        assert local["subject"] == "Odd \x1c\x85\u2028\f subject"
+        assert (local["ahead"], local["behind"]) == (2, 0)
+        assert local["upstream"].startswith("origin/")
+        assert (await branches(tmp_path / "clone", track=False))[0]["ahead"] is None
+        names = [(b["name"], b["type"]) for b in await branches(tmp_path / "clone", remotes=True)]
+        assert ("origin/feature/a", "remote") in names and not any(n.endswith("/HEAD") for n, _ in names)
+
+        refs = await branches(self.test_dir, tags=True, pattern="v*")
+        assert [(r["name"], r["type"], r["commit"]) for r in refs] == [("v1", "tag", head.hexsha)]
+        assert [b["name"] for b in await branches(self.test_dir, pattern="feature/*")] == ["feature/a"]
+        assert len(await branches(self.test_dir, sort="-refname", limit=1)) == 1
+
+        self.repo.git.checkout("--detach")
+        assert not any(b["current"] for b in await branches(self.test_dir))
     
     @pytest.mark.asyncio
     async def test_git_diff(self):
@@ -101,6 +484,232 @@ class TestGitMCP:
         assert len(result) == 1
         assert "Modified content" in result[0].text
     
+    @pytest.mark.asyncio
+    async def test_git_diff_modes(self):
+        """Test bounded, paged, stat and name-only diffs"""
+        for name in ("a.txt", "b.txt", "yarn.lock"):
+            with open(os.path.join(self.test_dir, name), "w") as f:
+                f.write("\n".join(str(i) for i in range(200)))
+        with open(os.path.join(self.test_dir, "blob.bin"), "wb") as f:
+            f.write(b"\x00\x01\x02")
+        self.repo.index.add(["a.txt", "b.txt", "yarn.lock", "blob.bin"])
+
+        result = await handle_call_tool("git_diff", {"path": self.test_dir, "staged": True, "max_bytes": 200})
+        assert "[diff truncated at 200 bytes" in result[0].text
+        assert "yarn.lock" in result[0].text.splitlines()[-2]
+
+        result = await handle_call_tool("git_diff", {"path": self.test_dir, "staged": True, "mode": "stat"})
+        stat = {f["path"]: f for f in json.loads(result[0].text)}
+        assert stat["a.txt"]["added"] == 200
+        assert stat["blob.bin"]["binary"] is True
+        assert stat["yarn.lock"]["generated"] is True
+
+        result = await handle_call_tool("git_diff", {"path": self.test_dir, "staged": True, "mode": "name-only"})
+        assert result[0].text.split("\n") == ["a.txt", "b.txt", "blob.bin", "yarn.lock"]
+
+        seen, offset = [], 0
+        while offset is not None:
+            result = await handle_call_tool("git_diff", {
+                "path": self.test_dir, "staged": True, "mode": "files",
+                "offset": offset, "max_files": 2, "max_bytes": 1000,
+            })
+            page = json.loads(result[0].text)
+            assert page["total_files"] == 4
+            seen += page["files"]
+            offset = page["next_offset"]
+        assert [f["path"] for f in seen] == ["a.txt", "b.txt", "blob.bin", "yarn.lock"]
+        assert seen[0]["truncated"] and len(seen[0]["patch"]) == 1000
+        assert seen[2]["skipped"] == "binary" and seen[3]["skipped"] == "generated"
+
+    @pytest.mark.asyncio
+    async def test_git_diff_revs(self):
+        """Test revision diffs: renames, structured hunks, merge base, paging and identical trees"""
+        Path(self.test_dir, "a.txt").write_text("".join(f"line {i}\n" for i in range(30)))
+        self.repo.index.add(["a.txt"])
+        base = self.repo.index.commit("Base")
+        self.repo.create_head("topic")
+        self.repo.git.mv("a.txt", "moved.txt")
+        Path(self.test_dir, "moved.txt").write_text("".join(f"line {i}\n" for i in range(30)).replace("line 15", "LINE 15"))
+        Path(self.test_dir, "new.txt").write_text("new\n")
+        self.repo.git.add("moved.txt", "new.txt")
+        head = self.repo.index.commit("Move and edit")
+
+        async def diff(**kwargs):
+            result = await handle_call_tool("git_diff_revs", {"path": self.test_dir, **kwargs})
+            return json.loads(result[0].text)
+
+        result = await diff(base=base.hexsha)
+        assert (result["base"], result["head"], result["total_files"]) == (base.hexsha, head.hexsha, 2)
+        moved, new = result["files"]
+        assert (moved["status"], moved["old_path"], moved["path"]) == ("renamed", "a.txt", "moved.txt")
+        assert moved["similarity"] >= 90 and (moved["additions"], moved["deletions"]) == (1, 1)
+        hunk = moved["hunks"][0]
+        assert (hunk["old_start"], hunk["new_start"]) == (13, 13)
+        assert "-line 15" in hunk["lines"] and "+LINE 15" in hunk["lines"]
+        assert new["status"] == "added" and new["old_oid"] is None and new["hunks"][0]["lines"] == ["+new"]
+
+        no_renames = await diff(base=base.hexsha, renames=0, context=0)
+        assert sorted(f["status"] for f in no_renames["files"]) == ["added", "added", "deleted"]
+
+        page = await diff(base=base.hexsha, max_bytes=10)
+        assert len(page["files"]) == 1 and page["files"][0]["truncated"] and page["next_offset"] == 1
+        assert (await diff(base=base.hexsha, offset=1))["files"][0]["path"] == "new.txt"
+
+        # topic is still at base; the merge base hides changes made only on topic
+        self.repo.git.checkout("topic")
+        Path(self.test_dir, "topic.txt").write_text("topic\n")
+        self.repo.index.add(["topic.txt"])
+        self.repo.index.commit("Topic work")
+        direct = await diff(base="topic", head=head.hexsha)
+        assert "topic.txt" in [f["path"] for f in direct["files"]]
+        merged = await diff(base="topic", head=head.hexsha, merge_base=True)
+        assert merged["merge_base"] == base.hexsha and [f["path"] for f in merged["files"]] == ["moved.txt", "new.txt"]
+
+        empty = await diff(base="HEAD", head="HEAD")
+        assert empty["files"] == [] and empty["total_files"] == 0
+
+    @pytest.mark.asyncio
+    async def test_git_batch(self):
+        """Test running several operations in one call"""
+        with open(os.path.join(self.test_dir, "new.txt"), "w") as f:
+            f.write("new")
+        result = await handle_call_tool("git_batch", {
+            "path": self.test_dir,
+            "operations": [
+                {"tool": "git_status", "arguments": {"structured": True}},
+                {"tool": "git_branch"},
+                {"tool": "git_commit", "arguments": {"message": "Batch commit", "files": ["new.txt"]}},
+                {"tool": "git_log", "arguments": {"limit": 1}},
+                {"tool": "git_nope"},
+            ],
+        })
+        assert len(result) == 1
+        batch = json.loads(result[0].text)
+        ops = batch["results"]
+        assert [op["tool"] for op in ops] == ["git_status", "git_branch", "git_commit", "git_log", "git_nope"]
+        assert json.loads(ops[0]["content"][0])["untracked"] == ["new.txt"]
+        assert any(b["current"] for b in json.loads(ops[1]["content"][0]))
+        assert ops[2]["ok"]
+        assert json.loads(ops[3]["content"][0])[0]["message"] == "Batch commit"
+        assert not ops[4]["ok"] and "Unknown tool" in ops[4]["error"]
+        assert all(op["elapsed_ms"] >= 0 for op in ops)
+
+        # A tool that writes only for some arguments is a barrier exactly then.
+        barrier = git_mcp._batch_barrier
+        op = git_mcp.GitBatchOperation
+        assert barrier(op(tool="git_status", arguments={"untracked_cache": True}), self.test_dir)
+        assert not barrier(op(tool="git_status", arguments={"structured": True}), self.test_dir)
+        assert not barrier(op(tool="git_status", arguments={"untracked_cache": "nope"}), self.test_dir)
+        assert barrier(op(tool="git_commit", arguments={"message": "m"}), self.test_dir)
+        assert not barrier(op(tool="git_nope"), self.test_dir)
+
+    @pytest.mark.asyncio
+    async def test_git_workspace_status(self, tmp_path):
+        """Test repository discovery and parallel status across a workspace"""
+        Repo.clone_from(self.test_dir, tmp_path / "clean")
+        ahead = Repo.clone_from(self.test_dir, tmp_path / "group" / "ahead")
+        ahead.index.commit("Local work")
+        (tmp_path / "group" / "ahead" / "scratch.txt").write_text("x")
+        Repo.init(tmp_path / "node_modules" / "dep")
+        Repo.init(tmp_path / "a" / "b" / "c" / "deep")
+        (tmp_path / "broken").mkdir()
+        (tmp_path / "broken" / ".git").write_text("gitdir: /nonexistent\n")
+
+        result = await handle_call_tool("git_workspace_status", {"path": str(tmp_path), "max_depth": 2})
+        workspace = json.loads(result[0].text)
+        repos = {entry["path"]: entry for entry in workspace["repos"]}
+        assert list(repos) == ["broken", "clean", "group/ahead"]
+        assert repos["clean"]["clean"] and repos["clean"]["behind"] == 0
+        assert repos["group/ahead"]["ahead"] == 1 and repos["group/ahead"]["untracked"] == 1
+        assert not repos["broken"]["ok"] and repos["broken"]["error"]
+        assert workspace["summary"] == {
+            "total": 3, "dirty": 1, "ahead": 1, "behind": 0, "errors": 1, "truncated": False,
+        }
+
+        result = await handle_call_tool("git_workspace_status", {
+            "path": str(tmp_path), "ignore": ["group", "broken"], "max_repos": 1,
+        })
+        workspace = json.loads(result[0].text)
+        assert [entry["path"] for entry in workspace["repos"]] == ["clean"]
+        assert workspace["summary"]["truncated"]
+
+    @pytest.mark.asyncio
+    async def test_http_transport(self):
+        """Test concurrent sessions against the streamable HTTP app"""
+        import socket
+        import uvicorn
+        from mcp import ClientSession
+        from mcp.client.streamable_http import streamable_http_client
+
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        http = uvicorn.Server(uvicorn.Config(
+            git_mcp.create_http_app(port=port), host="127.0.0.1", port=port, log_level="warning"
+        ))
+        serving = asyncio.create_task(http.serve())
+        while not http.started:
+            await asyncio.sleep(0.01)
+
+        async def client():
+            async with streamable_http_client(f"http://127.0.0.1:{port}/mcp") as (read, write, _):
+                async with ClientSession(read, write) as session:
+                    await session.initialize()
+                    result = await session.call_tool("git_branch", {"path": self.test_dir})
+                    return json.loads(result.content[0].text)
+
+        try:
+            results = await asyncio.gather(*(client() for _ in range(3)))
+            assert all(any(b["current"] for b in branches) for branches in results)
+
+            # A page on another site, or reached through a rebound DNS name, is refused.
+            import httpx
+            request = {"jsonrpc": "2.0", "id": 1, "method": "tools/list"}
+            headers = {"Accept": "application/json, text/event-stream"}
+            async with httpx.AsyncClient() as http_client:
+                for extra in ({"Origin": "http://evil.example"}, {"Host": f"evil.example:{port}"}):
+                    response = await http_client.post(
+                        f"http://127.0.0.1:{port}/mcp", json=request, headers={**headers, **extra}
+                    )
+                    assert response.status_code in (403, 421)
+                    response = await http_client.get(f"http://127.0.0.1:{port}/sse", headers=extra)
+                    assert response.status_code in (403, 421)
+        finally:
+            http.should_exit = True
+            await serving
+
+    @pytest.mark.asyncio
+    async def test_git_server_stats(self):
+        """Test per-tool metrics and the OpenMetrics dump"""
+        before = json.loads((await handle_call_tool("git_server_stats", {}))[0].text)
+        await handle_call_tool("git_diff", {"path": self.test_dir, "mode": "stat"})
+        await handle_call_tool("git_status", {"path": self.test_dir})
+        await handle_call_tool("git_checkout", {"path": self.test_dir, "branch": "stats", "create": True})
+        await handle_call_tool("git_log", {"path": self.test_dir, "cursor": "bogus"})
+        await handle_call_tool("git_nope", {})
+
+        stats = json.loads((await handle_call_tool("git_server_stats", {}))[0].text)
+        assert set(stats) >= {"uptime", "tools", "git_subprocesses", "scheduler", "repo_cache"}
+        diff = stats["tools"]["git_diff"]
+        previous = before["tools"].get("git_diff", {"calls": 0, "git_subprocesses": 0})
+        assert diff["calls"] == previous["calls"] + 1
+        assert diff["git_subprocesses"] > previous["git_subprocesses"]
+        assert diff["run_time_total"] > 0 and diff["output_bytes_total"] > 0
+        assert stats["tools"]["git_log"]["errors"]["ValueError"] >= 1
+        assert stats["tools"]["unknown"]["errors"]["ValueError"] >= 1
+        assert stats["git_subprocesses"]["diff"] >= 1
+        # Text status and checkout spawn git themselves too, so they are counted.
+        for tool, command in (("git_status", "status"), ("git_checkout", "checkout")):
+            previous = before["tools"].get(tool, {"git_subprocesses": 0})["git_subprocesses"]
+            assert stats["tools"][tool]["git_subprocesses"] == previous + 1
+            assert stats["git_subprocesses"][command] > before["git_subprocesses"].get(command, 0)
+
+        text = (await handle_call_tool("git_server_stats", {"openmetrics": True}))[0].text
+        assert text.endswith("# EOF\n")
+        assert 'git_mcp_tool_calls_total{tool="git_diff"}' in text
+        assert 'git_mcp_tool_latency_seconds_bucket{tool="git_diff",le="+Inf"}' in text
+        assert "git_mcp_scheduler_queue_depth" in text
+
     @pytest.mark.asyncio
     async def test_git_commit(self):
         """Test git commit functionality"""
@@ -124,6 +733,62 @@ class TestGitMCP:
         assert len(commits) == 2
         assert commits[0].message.strip() == "Test commit from unit test"
     
+    @pytest.mark.asyncio
+    async def test_git_commit_options(self, tmp_path):
+        """Test staging files and deletions, all-tracked, amend, author override and hooks"""
+        async def commit(**kwargs):
+            result = await handle_call_tool("git_commit", {"path": self.test_dir, **kwargs})
+            assert "Commit created:" in result[0].text, result[0].text
+            return self.repo.commit(result[0].text.split()[-1])
+
+        Path(self.test_dir, "a.txt").write_text("a\n")
+        os.remove(os.path.join(self.test_dir, "test.txt"))
+        first = await commit(message="Add a, drop test  \n\n\n\nBody\n", files=["a.txt", "test.txt"])
+        assert sorted(first.stats.files) == ["a.txt", "test.txt"] and first.message == "Add a, drop test\n\nBody\n"
+        assert self.repo.head.commit == first and not self.repo.is_dirty()
+        error = await handle_call_tool("git_commit", {"path": self.test_dir, "message": "x", "files": ["nope.txt"]})
+        assert "No such file: nope.txt" in error[0].text
+
+        Path(self.test_dir, "a.txt").write_text("a2\n")
+        Path(self.test_dir, "untracked.txt").write_text("u\n")
+        second = await commit(message="Update a", all=True, author="Jane Doe <jane@example.com>")
+        assert list(second.stats.files) == ["a.txt"] and "untracked.txt" in self.repo.untracked_files
+        assert (second.author.name, second.author.email) == ("Jane Doe", "jane@example.com")
+        assert second.parents == (first,)
+
+        amended = await commit(message="Update a (amended)", amend=True)
+        assert amended.parents == (first,) and amended.author.email == "jane@example.com"
+        assert amended.authored_date == second.authored_date
+        assert self.repo.head.commit == amended and "commit (amend)" in self.repo.git.reflog("-1")
+
+        hooks = Path(self.test_dir, ".git", "hooks")
+        hooks.mkdir(exist_ok=True)
+        (hooks / "commit-msg").write_text('#!/bin/sh\necho "Signed-off-by: Hook" >> "$1"\n')
+        (hooks / "commit-msg").chmod(0o755)
+        hooked = await commit(message="With hooks", hooks=True)
+        assert hooked.message == "With hooks\nSigned-off-by: Hook\n"
+        assert (await commit(message="Without hooks")).message == "Without hooks\n"
+        (hooks / "pre-commit").write_text("#!/bin/sh\necho rejected >&2\nexit 1\n")
+        (hooks / "pre-commit").chmod(0o755)
+        error = await handle_call_tool("git_commit", {"path": self.test_dir, "message": "x", "hooks": True})
+        assert "Error:" in error[0].text and "rejected" in error[0].text
+
+        fresh = Repo.init(tmp_path / "fresh")
+        Path(tmp_path, "fresh", "f.txt").write_text("f\n")
+        result = await handle_call_tool("git_commit", {"path": str(tmp_path / "fresh"), "message": "Root", "files": ["f.txt"]})
+        assert fresh.head.commit.hexsha == result[0].text.split()[-1] and not fresh.head.commit.parents
+
+        # Directories and globs are staged as git add stages them.
+        os.makedirs(os.path.join(self.test_dir, "src", "deep"))
+        for name in ("src/one.py", "src/two.py", "src/notes.txt", "src/deep/three.py"):
+            Path(self.test_dir, name).write_text(name + "\n")
+        staged = await commit(message="Add py", files=["src/*.py"])
+        assert sorted(staged.stats.files) == ["src/deep/three.py", "src/one.py", "src/two.py"]
+        os.remove(os.path.join(self.test_dir, "src", "one.py"))
+        staged = await commit(message="Add src", files=["src"])
+        assert sorted(staged.stats.files) == ["src/notes.txt", "src/one.py"]
+        assert not os.path.lexists(os.path.join(self.test_dir, "src", "one.py")) and not self.repo.is_dirty()
+
     @pytest.mark.asyncio
     async def test_git_checkout(self):
         """Test git checkout functionality"""
@@ -140,6 +805,110 @@ class TestGitMCP:
         # Verify branch was created and checked out
         assert self.repo.active_branch.name == "test-branch"
     
+    @pytest.mark.asyncio
+    async def test_git_worktree_pool(self, monkeypatch):
+        """Test leasing, sparse checkout, reuse after release, the cap and idle pruning"""
+        pool = git_mcp.WorktreePool(max_per_repo=2, idle_timeout=600)
+        monkeypatch.setattr(git_mcp, "worktree_pool", pool)
+        os.makedirs(os.path.join(self.test_dir, "src"))
+        Path(self.test_dir, "src", "app.py").write_text("app\n")
+        self.repo.index.add(["src/app.py"])
+        head = self.repo.index.commit("Add src").hexsha
+
+        async def lease(**kwargs):
+            result = await handle_call_tool("git_worktree_lease", {"path": self.test_dir, **kwargs})
+            return json.loads(result[0].text)
+
+        first = await lease(sparse=["src"])
+        assert first["commit"] == head and not first["reused"]
+        assert sorted(os.listdir(first["worktree"])) == [".git", "src", "test.txt"]
+        second = await lease(branch="topic", create=True, rev="HEAD~1")
+        assert second["branch"] == "topic" and second["commit"] == self.repo.commit("HEAD~1").hexsha
+        assert "Error:" in (await handle_call_tool("git_worktree_lease", {"path": self.test_dir}))[0].text
+        assert "locked" in self.repo.git.worktree("list", "--porcelain")
+
+        Path(first["worktree"], "src", "app.py").write_text("edited\n")
+        Path(first["worktree"], "scratch.txt").write_text("scratch\n")
+        await handle_call_tool("git_worktree_release", {"path": first["worktree"]})
+        await handle_call_tool("git_worktree_release", {"path": second["worktree"]})
+        assert "Error:" in (await handle_call_tool("git_worktree_release", {"path": first["worktree"]}))[0].text
+
+        again = await lease(sparse=["src"])
+        assert again["worktree"] == first["worktree"] and again["reused"]
+        assert Path(again["worktree"], "src", "app.py").read_text() == "app\n"
+        assert not os.path.exists(os.path.join(again["worktree"], "scratch.txt"))
+        # The branch was freed on release, so another worktree can check it out.
+        assert (await lease(branch="topic"))["worktree"] == second["worktree"]
+        assert self.repo.active_branch.name in ("master", "main") and not self.repo.is_dirty()
+
+        await handle_call_tool("git_worktree_release", {"path": again["worktree"]})
+        pool.idle_timeout = 0
+        await handle_call_tool("git_worktree_release", {"path": second["worktree"], "remove": True})
+        assert not os.path.exists(first["worktree"]) and not os.path.exists(second["worktree"])
+        assert pool.stats()["removed"] == 2 and pool.stats()["idle"] == 0
+
+        # A quiet pool is pruned by its timer, and closing it removes the rest.
+        pool.close()
+        pool = git_mcp.WorktreePool(max_per_repo=2, idle_timeout=0.1)
+        monkeypatch.setattr(git_mcp, "worktree_pool", pool)
+        third = await lease()
+        await handle_call_tool("git_worktree_release", {"path": third["worktree"]})
+        for _ in range(50):
+            if not os.path.exists(third["worktree"]):
+                break
+            await asyncio.sleep(0.1)
+        assert not os.path.exists(third["worktree"]) and pool.stats()["idle"] == 0
+        pool.idle_timeout = 600
+        fourth = await lease()
+        await handle_call_tool("git_worktree_release", {"path": fourth["worktree"]})
+        assert pool.stats()["idle"] == 1
+        pool.close()
+        assert not os.path.exists(fourth["worktree"]) and pool.stats()["idle"] == 0
+
+    @pytest.mark.asyncio
+    async def test_git_maintenance(self, monkeypatch):
+        """Test call tracking, that maintenance waits for writes, and the status report"""
+        monitor = git_mcp.RepoMaintenance(idle=3600, min_calls=3, loose_objects=1, nice=0)
+        monkeypatch.setattr(git_mcp, "maintenance", monitor)
+        git_dir = self.repo.git_dir
+        self.repo.git.repack("-q")
+        Path(self.test_dir, "test.txt").write_text("Second content")
+        self.repo.index.add(["test.txt"])
+        self.repo.index.commit("Second commit")
+
+        for _ in range(3):
+            await handle_call_tool("git_log", {"path": self.test_dir})
+        assert monitor.due(time.monotonic()) == []
+
+        key = git_mcp._repo_key(self.test_dir)
+        lock = git_mcp.scheduler._lock_for(key)
+        await lock.acquire(True)
+        run = asyncio.create_task(monitor.maintain(self.test_dir))
+        await asyncio.sleep(0.2)
+        assert not run.done()
+        assert not os.path.exists(os.path.join(git_dir, "objects", "info", "commit-graphs"))
+        git_mcp.scheduler._release(key, lock, True)
+        record = await run
+
+        assert [(task["task"], task["status"]) for task in record["tasks"]] == [
+            ("commit-graph", "ok"), ("loose-objects", "ok"), ("multi-pack-index", "ok")
+        ]
+        assert record["before"]["loose_objects"] > 0 and record["after"]["loose_objects"] == 0
+        assert record["probe"]["rev"] == self.repo.head.commit.hexsha and record["probe"]["path"] == "test.txt"
+        assert record["speedup"] > 0
+        assert os.path.exists(os.path.join(git_dir, "objects", "info", "commit-graphs", "commit-graph-chain"))
+        assert os.path.exists(os.path.join(git_dir, "objects", "pack", "multi-pack-index"))
+
+        status = json.loads((await handle_call_tool("git_maintenance_status", {"path": self.test_dir}))[0].text)
+        [repo] = status["repos"]
+        assert repo["calls"] == 0 and repo["total_calls"] == 3 and repo["runs"] == 1
+        assert repo["history"] == [record]
+        for _ in range(3):
+            await handle_call_tool("git_status", {"path": self.test_dir})
+        assert monitor.due(time.monotonic()) == []
+        assert [repo.common for repo in monitor.due(time.monotonic() + 3600)] == [os.path.realpath(git_dir)]
+        assert monitor.stats()["running"] == 1
+
     @pytest.mark.asyncio
     async def test_error_handling(self):
         """Test error handling for invalid operations"""
@@ -151,4 +920,340 @@ class TestGitMCP:
         # Test unknown tool
         result = await handle_call_tool("unknown_tool", {})
         assert len(result) == 1
-        assert "Error:" in result[0].text
\ No newline at end of file
+        assert "Error:" in result[0].text
+
+
+class TestRepoScheduler:
+    @staticmethod
+    def _tracker():
+        state = {"active": 0, "peak": 0}
+        lock = threading.Lock()
+
+        def work(delay):
+            with lock:
+                state["active"] += 1
+                state["peak"] = max(state["peak"], state["active"])
+            time.sleep(delay)
+            with lock:
+                state["active"] -= 1
+            return delay
+
+        return state, work
+
+    @pytest.mark.asyncio
+    async def test_reads_run_concurrently(self, tmp_path):
+        """Test that reads on the same repo share it"""
+        scheduler = RepoScheduler(max_workers=4)
+        state, work = self._tracker()
+        results = await asyncio.gather(
+            *(scheduler.run(str(tmp_path), work, 0.05) for _ in range(4))
+        )
+        assert results == [0.05] * 4
+        assert state["peak"] > 1
+
+    @pytest.mark.asyncio
+    async def test_writes_are_exclusive(self, tmp_path):
+        """Test that writes never overlap other work on the same repo"""
+        scheduler = RepoScheduler(max_workers=4)
+        state, work = self._tracker()
+        await asyncio.gather(
+            scheduler.run(str(tmp_path), work, 0.02),
+            scheduler.run(str(tmp_path), work, 0.02, write=True),
+            scheduler.run(str(tmp_path), work, 0.02, write=True),
+            scheduler.run(str(tmp_path), work, 0.02),
+        )
+        assert state["peak"] == 1
+        assert scheduler._locks == {}
+
+        state, work = self._tracker()
+        await asyncio.gather(
+            *(scheduler.run(str(tmp_path), work, 0.02, write=True) for _ in range(3))
+        )
+        assert state["peak"] == 1
+
+    @pytest.mark.asyncio
+    async def test_stats(self, tmp_path):
+        """Test queue-depth and wait-time counters"""
+        scheduler = RepoScheduler(max_workers=1)
+
+        def fail():
+            raise RuntimeError("boom")
+
+        await asyncio.gather(
+            *(scheduler.run(str(tmp_path / str(i)), time.sleep, 0.01) for i in range(3))
+        )
+        with pytest.raises(RuntimeError):
+            await scheduler.run(str(tmp_path), fail)
+
+        stats = scheduler.stats()
+        assert stats["submitted"] == 4
+        assert stats["completed"] == 3
+        assert stats["failed"] == 1
+        assert stats["queue_depth"] == 0
+        assert stats["max_queue_depth"] >= 2
+        assert stats["wait_time_max"] > 0
+
+
+def test_parse_commit():
+    """Test the commit header parser"""
+    data = (
+        b"tree 4b825dc642cb6eb9a060e54bf8d69288fbee4904\n"
+        b"parent 1111111111111111111111111111111111111111\n"
+        b"parent 2222222222222222222222222222222222222222\n"
+        b"author Ada Lovelace <ada@example.com> 1700000000 +0530\n"
+        b"committer Bob <bob@example.com> 1700003600 -0800\n"
+        b"gpgsig -----BEGIN PGP SIGNATURE-----\n"
+        b" \n"
+        b" abc\n"
+        b" -----END PGP SIGNATURE-----\n"
+        b"\n"
+        b"Merge things\n\nDetails\n"
+    )
+    commit = parse_commit("a" * 40, data)
+    assert commit.tree == "4b825dc642cb6eb9a060e54bf8d69288fbee4904"
+    assert commit.parents == ["1" * 40, "2" * 40]
+    assert commit.author_name == "Ada Lovelace"
+    assert commit.author_email == "ada@example.com"
+    assert commit.authored_datetime.isoformat() == "2023-11-15T03:43:20+05:30"
+    assert commit.committed_datetime.isoformat() == "2023-11-14T15:13:20-08:00"
+    assert commit.message == "Merge things\n\nDetails\n"
+
+
+class TestRepoCache:
+    @pytest.fixture(autouse=True)
+    def setup_and_teardown(self, tmp_path):
+        self.paths = []
+        for name in ("a", "b"):
+            path = tmp_path / name
+            repo = Repo.init(path)
+            (path / "f.txt").write_text(name)
+            repo.index.add(["f.txt"])
+            repo.index.commit("init")
+            repo.close()
+            self.paths.append(str(path))
+        self.cache = RepoCache(max_size=1)
+        yield
+        self.cache.clear()
+
+    def test_find_git_dir(self, tmp_path):
+        """Test git dir discovery without spawning git"""
+        assert find_git_dir(self.paths[0]) == os.path.join(self.paths[0], ".git")
+        with pytest.raises(Exception):
+            find_git_dir(str(tmp_path))
+        with pytest.raises(Exception):
+            find_git_dir(str(tmp_path / "missing"))
+
+    def test_hits_and_evictions(self):
+        """Test reader reuse and LRU eviction"""
+        with self.cache.object_reader(self.paths[0]) as first:
+            pass
+        with self.cache.object_reader(self.paths[0]) as second:
+            assert second is first
+        stats = self.cache.stats()
+        assert (stats["hits"], stats["misses"], stats["readers"]) == (1, 1, 1)
+
+        with self.cache.object_reader(self.paths[1]):
+            pass
+        stats = self.cache.stats()
+        assert stats["evictions"] == 1
+        assert stats["size"] == 1 and stats["readers"] == 1
+        assert not first.alive
+
+    def test_invalidated_on_change(self):
+        """Test that ref or index changes restart the cached readers"""
+        with self.cache.object_reader(self.paths[0]) as reader:
+            pass
+        repo = Repo(self.paths[0])
+        (Path(self.paths[0]) / "g.txt").write_text("g")
+        repo.index.add(["g.txt"])
+        repo.index.commit("second")
+        repo.close()
+        with self.cache.object_reader(self.paths[0]) as again:
+            assert again is not reader
+            assert again.read("HEAD:g.txt")[1:] == ("blob", b"g")
+        assert self.cache.stats()["invalidations"] == 1
+
+    def test_object_reader(self):
+        """Test pipelined reads through the pooled cat-file readers"""
+        head = Repo(self.paths[0]).head.commit.hexsha
+        with self.cache.object_reader(self.paths[0]) as reader:
+            results = list(reader.read_many([head, "0" * 40, "HEAD:f.txt"] * 300))
+        assert results[0][:2] == (head, "commit")
+        assert results[1] is None
+        assert results[2][1:] == ("blob", b"a")
+        assert len(results) == 900
+
+        with self.cache.object_reader(self.paths[0]) as again:
+            assert again is reader
+        with self.cache.object_reader(self.paths[0], check=True) as checker:
+            assert checker.read("HEAD:f.txt")[1:] == ("blob", 1)
+
+
+class TestResponseCache:
+    def test_memory_lru_and_disk_tier(self, tmp_path):
+        """Test hits, byte-bounded eviction and reuse of the disk tier by a new cache"""
+        cache = git_mcp.ResponseCache(max_bytes=20, directory=str(tmp_path / "cache"))
+        calls = []
+
+        def compute(value):
+            calls.append(value)
+            return value
+
+        assert cache.get_or_compute("a", lambda: compute("x" * 8)) == "x" * 8
+        assert cache.get_or_compute("a", lambda: compute("other")) == "x" * 8
+        cache.get_or_compute("b", lambda: compute(["y" * 8]))
+        stats = cache.stats()
+        assert (stats["hits"], stats["misses"], stats["evictions"], stats["entries"]) == (1, 2, 1, 1)
+        assert cache.get_or_compute("a", lambda: compute("other")) == "x" * 8
+        assert cache.stats()["disk_hits"] == 1 and len(calls) == 2
+
+        restarted = git_mcp.ResponseCache(max_bytes=20, directory=str(tmp_path / "cache"))
+        assert restarted.get_or_compute("b", lambda: compute("other")) == ["y" * 8]
+        assert len(calls) == 2
+
+    def test_single_flight(self):
+        """Test that concurrent identical requests share one computation and its errors"""
+        cache = git_mcp.ResponseCache(directory=None)
+        started, release = threading.Event(), threading.Event()
+        calls = []
+
+        def slow():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return {"answer": 42}
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute("k", slow))) for _ in range(4)]
+        threads[0].start()
+        started.wait(5)
+        for thread in threads[1:]:
+            thread.start()
+        while cache.stats()["shared"] < 3:
+            time.sleep(0.01)
+        release.set()
+        for thread in threads:
+            thread.join()
+        assert results == [{"answer": 42}] * 4 and len(calls) == 1
+
+        with pytest.raises(ValueError):
+            cache.get_or_compute("bad", lambda: (_ for _ in ()).throw(ValueError("boom")))
+        assert cache.get_or_compute("bad", lambda: "ok") == "ok"
+
+    @pytest.mark.asyncio
+    async def test_log_keyed_on_resolved_oids(self, tmp_path, monkeypatch):
+        """Test that git_log answers from the cache until HEAD moves"""
+        cache = git_mcp.ResponseCache(directory=None)
+        monkeypatch.setattr(git_mcp, "response_cache", cache)
+        repo = Repo.init(tmp_path)
+        (tmp_path / "f.txt").write_text("f")
+        repo.index.add(["f.txt"])
+        repo.index.commit("first")
+
+        async def log():
+            return json.loads((await handle_call_tool("git_log", {"path": str(tmp_path)}))[0].text)
+
+        assert [c["message"] for c in await log()] == ["first"]
+        assert [c["message"] for c in await log()] == ["first"]
+        assert cache.stats()["hits"] == 1
+        repo.index.commit("second")
+        assert [c["message"] for c in await log()] == ["second", "first"]
+        assert cache.stats()["misses"] == 2
+
+
+class TestStatusWatcher:
+    @pytest.fixture(autouse=True)
+    def setup_and_teardown(self, tmp_path):
+        self.path = str(tmp_path)
+        self.repo = Repo.init(tmp_path)
+        for i in range(3):
+            (tmp_path / "src").mkdir(exist_ok=True)
+            (tmp_path / "src" / f"f{i}.txt").write_text(str(i))
+        (tmp_path / ".gitignore").write_text("build/\n")
+        self.repo.index.add(["src/f0.txt", "src/f1.txt", "src/f2.txt", ".gitignore"])
+        self.repo.index.commit("init")
+        yield
+        self.repo.close()
+
+    def _expected(self, untracked):
+        out = git_mcp.git_output(
+            ["--no-optional-locks", "status", "--porcelain=v2", "--branch", "-z",
+             f"--untracked-files={untracked}"],
+            cwd=self.path,
+        )
+        return parse_status_v2(out)
+
+    def _check(self, watcher, poll=False):
+        for untracked in ("normal", "all"):
+            watch = watcher.watch(self.path)
+            if poll:
+                watch.backend._last = 0
+                watch.backend.poll()
+            got = json.loads(watcher.status(self.path, untracked, structured=True))
+            expected = self._expected(untracked)
+            for key in ("staged", "unstaged", "untracked", "conflicted", "clean"):
+                assert got[key] == expected[key], key
+
+    def _exercise(self, watcher, poll=False):
+        tmp = Path(self.path)
+        self._check(watcher, poll)
+        before = watcher.stats()["hits"]
+        self._check(watcher, poll)
+        assert watcher.stats()["hits"] == before + 2
+
+        (tmp / "src" / "f0.txt").write_text("changed")
+        self._check(watcher, poll)
+        (tmp / "newdir" / "deep").mkdir(parents=True)
+        (tmp / "newdir" / "deep" / "x.txt").write_text("x")
+        (tmp / "build").mkdir()
+        (tmp / "build" / "out.o").write_text("ignored")
+        self._check(watcher, poll)
+        (tmp / "src" / "f1.txt").unlink()
+        shutil.rmtree(tmp / "newdir")
+        self._check(watcher, poll)
+        assert watcher.stats()["partial_refreshes"] > 0
+
+        self.repo.index.add(["src/f0.txt"])
+        self._check(watcher, poll)
+
+        # Ignore rules change the status of paths that did not change.
+        (tmp / "dist").mkdir()
+        (tmp / "dist" / "app.js").write_text("js")
+        (tmp / "src" / "extra.txt").write_text("extra")
+        self._check(watcher, poll)
+        (tmp / ".gitignore").write_text("build/\ndist/\n")
+        self._check(watcher, poll)
+        (tmp / ".git" / "info").mkdir(exist_ok=True)
+        (tmp / ".git" / "info" / "exclude").write_text("src/extra.txt\n")
+        self._check(watcher, poll)
+
+    @pytest.mark.skipif(not git_mcp._libc(), reason="inotify is Linux-only")
+    def test_inotify_incremental_status(self):
+        """Test that inotify-tracked changes keep the cached status exact"""
+        watcher = StatusWatcher()
+        try:
+            self._exercise(watcher)
+            assert watcher.stats()["backends"] == {"inotify": 1}
+        finally:
+            watcher.close()
+
+    def test_poll_incremental_status(self):
+        """Test the stat-polling fallback"""
+        watcher = StatusWatcher(use_inotify=False)
+        try:
+            self._exercise(watcher, poll=True)
+            assert watcher.stats()["backends"] == {"poll": 1}
+        finally:
+            watcher.close()
+
+    def test_idle_teardown(self):
+        """Test that idle repos are closed by the background thread"""
+        watcher = StatusWatcher(idle=0)
+        try:
+            watcher.status(self.path, structured=True)
+            deadline = time.monotonic() + 5
+            while watcher.stats()["repos"] and time.monotonic() < deadline:
+                time.sleep(0.1)
+            assert watcher.stats()["repos"] == 0
+        finally:
+            watcher.close()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+
+import pytest
+import asyncio
+import json
+import os
+import signal
+import sys
+import time
+from git import Repo
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "examples"))
+
+from session_pool import BackgroundSessionPool, MCPSessionPool
+
+
+def child_pids():
+    pids = []
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    fields = f.read().rsplit(")", 1)[1].split()
+            except OSError:
+                continue
+            if int(fields[1]) == os.getpid():
+                pids.append(int(entry))
+    return pids
+
+
+@pytest.fixture
+def repo_path(tmp_path):
+    repo = Repo.init(tmp_path)
+    (tmp_path / "a.txt").write_text("a")
+    repo.index.add(["a.txt"])
+    repo.index.commit("Initial commit")
+    return str(tmp_path)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_warm_sessions(repo_path):
+    async with MCPSessionPool(size=2) as pool:
+        results = await asyncio.gather(*(
+            pool.call_tool("git_branch", {"path": repo_path}) for _ in range(6)
+        ))
+        assert all(json.loads(r.content[0].text)[0]["current"] for r in results)
+        assert pool.stats() == {"size": 2, "idle": 2, "live": 2, "restarts": 0}
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc"), reason="needs /proc to find server processes")
+@pytest.mark.asyncio
+async def test_crashed_server_is_restarted(repo_path):
+    async with MCPSessionPool(size=1, call_timeout=30) as pool:
+        for pid in child_pids():
+            os.kill(pid, signal.SIGKILL)
+        result = await pool.call_tool("git_log", {"path": repo_path, "limit": 1})
+        assert json.loads(result.content[0].text)[0]["message"] == "Initial commit"
+        assert pool.restarts == 1
+
+
+def test_background_pool(repo_path):
+    pool = BackgroundSessionPool(size=1)
+    try:
+        result = pool.call_tool("git_status", {"path": repo_path})
+        assert "nothing to commit" in result.content[0].text
+    finally:
+        pool.close()
+
+
+def test_server_that_cannot_start():
+    started = time.monotonic()
+    with pytest.raises(RuntimeError, match="failed to start 2 times"):
+        BackgroundSessionPool(size=2, server_command=["false"], max_failures=2)
+    assert time.monotonic() - started < 10
+
+
+@pytest.mark.asyncio
+async def test_timeout_covers_waiting_for_a_session(repo_path, monkeypatch):
+    async with MCPSessionPool(size=1, call_timeout=0.5) as pool:
+        async with pool.session():
+            with pytest.raises(asyncio.TimeoutError):
+                await pool.call_tool("git_status", {"path": repo_path})
+
+        # A write that timed out may have been applied, so it is not retried.
+        calls = []
+        session = pool._slots[0].session
+
+        async def slow_call(name, arguments):
+            calls.append(name)
+            await asyncio.sleep(1)
+
+        monkeypatch.setattr(session, "call_tool", slow_call)
+        with pytest.raises(asyncio.TimeoutError):
+            await pool.call_tool("git_commit", {"path": repo_path, "message": "m"})
+        assert calls == ["git_commit"]
+
+
+@pytest.mark.asyncio
+async def test_sent_write_is_not_retried(repo_path, monkeypatch):
+    async with MCPSessionPool(size=1, call_timeout=30) as pool:
+        calls = []
+
+        async def broken_call(session, name, arguments):
+            calls.append(name)
+            raise ConnectionResetError("server went away")
+
+        # Patched on the class, so a restarted session fails the same way.
+        monkeypatch.setattr(type(pool._slots[0].session), "call_tool", broken_call)
+        with pytest.raises(ConnectionResetError):
+            await pool.call_tool("git_commit", {"path": repo_path, "message": "m"})
+        assert calls == ["git_commit"]